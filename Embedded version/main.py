@@ -2,6 +2,21 @@ from trajectoryPlanner import TrajectoryPlanner
 from lineTrajectoryPlanner import LineTrajectoryPlanner
 from barretwam4 import BarretWAM_4
 from point import Point
+import sys
+
+
+
+################## RUN A PLAN SHIPPED FROM THE WORKSTATION (python3 main.py plan.ktcf) ##################
+
+if len(sys.argv) > 1:
+    planner = TrajectoryPlanner(BarretWAM_4())
+    ret, coeffs, durations = planner.trajectoryFromPlan(sys.argv[1])
+    print(coeffs)
+    for sample in planner.curvesSamples(coeffs, durations): ### One time step at a time, in constant memory
+        print(" ".join(str(value) for value in sample))
+    sys.exit(0)
+
+
 
 ############################### INSTANCIATE DESIRED MANIPULATOR ####################################
 
@@ -86,6 +101,6 @@ while not ret:
         print(e)
 
     if ret:
-        values, time = planner.curvesValues(coeffs, durations)
         print(coeffs)
-        print(values)
\ No newline at end of file
+        for sample in planner.curvesSamples(coeffs, durations): ### One time step at a time, in constant memory
+            print(" ".join(str(value) for value in sample))
\ No newline at end of file
@@ -0,0 +1,217 @@
+"""
+SplinePlanner
+-------------
+
+The planning steps shared by the planners of the workstation and of the embedded board: the joint values at the points,
+the durations from the end-effector's speed, the curves from backend.py, the plans shipped with coeffsWire and the
+samples one time step at a time. Each tree's TrajectoryPlanner derives from SplinePlanner and only adds what its target
+has (numpy sampling, joint rate limits, memory budgets and drawing on the workstation; linalg arrays on the board), and
+LineTrajectoryPlanner derives from TrajectoryPlanner the same way in both.
+
+Like backend.py, it needs nothing but the standard library. This file is the source; the copy in "Embedded version" is
+made by tools/syncEmbedded.py.
+"""
+
+import backend
+
+class _NoSpan:
+    # Stands for a span of the instrumentation where there is none (the board)
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        return False
+
+_noSpan = _NoSpan()
+
+class SplinePlanner:
+    """
+    The base of the trajectory planners: calculates the trajectory of the end-effector of given manipulator as cubic
+    curves through points
+
+    ...
+
+    Attributes
+    ----------
+    manip : Manipulator
+        manipulator for which the trajectory will be calculated
+    verbose : bool
+        whether trajectoryThroughPoints prints when the trajectory goes outside the workspace
+
+    Methods
+    -------
+    trajectoryThroughPoints(pathPoints):
+        Calculates a trajectory for the end-effector through all the points in pathPoints.
+    trajectoryFromPlan(fileName):
+        Loads a trajectory planned on the workstation and packed by coeffsWire.
+    curvesSamples(allCoeffs, times):
+        Yields the values in time of joint values curve one time step at a time (constant memory).
+    """
+
+    _trajectoryDescription = "Curved trajectory through points"
+    _numberOfPointsPerStepForCurveDrawing = 100
+
+    def __init__(self, manip, verbose = True):
+        self._manip = manip
+        self._verbose = verbose
+
+    @property
+    def verbose(self):
+        return self._verbose
+
+    def trajectoryThroughPoints(self, pathPoints):
+        """
+        Calculates a trajectory for the end-effector through all the points in pathPoints.
+        Defines a 3rd degree polynomial trajectory between the 2 points in each pair of points.
+        Every trajectory is defined to have continuous acceleration and speed curves.
+        By joining all of the curves, the total trajectory through all points is defined to have initial and final speeds of zero.
+
+        Parameters
+        ----------
+        pathPoints:tuple[Point]
+            points to create end-effector's trajectory.
+
+        Returns
+        -------
+        succeeded : bool
+            Whether the operation succeeded (fails when desired trajectory goes out of workspace).
+        coeffs : tuple[tuple[tuple[float]]]
+            Polynomial coefficients for each curve of each joint.
+        times : tuple[float]
+            Duration of each curve.
+        """
+
+        if len(pathPoints) < 2:
+            raise ValueError("Needs at least 2 points to calculate trajectory")
+
+        return self._planTrajectory(pathPoints)
+
+    def trajectoryFromPlan(self, fileName):
+        """
+        Loads a trajectory planned on the workstation and packed by coeffsWire (e.g. by batch.py --wire).
+        Nothing is solved: the loaded coefficients go straight to curvesValues or curvesSamples.
+
+        Parameters
+        ----------
+        fileName:str
+            file with the packed plan
+
+        Returns
+        -------
+        succeeded : bool
+            Whether the operation succeeded (always True, errors are raised).
+        coeffs : tuple[tuple[tuple[float]]]
+            Polynomial coefficients for each curve of each joint.
+        times : tuple[float]
+            Duration of each curve.
+        """
+
+        # Imported here: planning from points does not need it (nor struct and binascii) at startup
+        import coeffsWire
+
+        coeffs, times = coeffsWire.loadPlan(fileName)
+        if len(coeffs) != self._manip.dof:
+            raise ValueError("Plan has " + str(len(coeffs)) + " joints, but the manipulator has " + str(self._manip.dof) + "!")
+
+        return True, coeffs, times
+
+    def curvesSamples(self, allCoeffs, times):
+        """
+        Yields the values in time of joint values curve one time step at a time, straight from the polynomial coefficients.
+        The time steps are the same as in curvesValues, but nothing is stored, so consumers (a serial port, a socket,
+        a file) run in constant memory whatever the length of the trajectory.
+
+        Parameters
+        ----------
+        allCoeffs:tuple[tuple[tuple[float]]]
+            curves coefficients to create values in time of joint values
+        times:tuple[float]
+            duration of each curve
+
+        Yields
+        ------
+        sample : tuple[float]
+            Time followed by the value of each joint (t, q1, q2, ...).
+        """
+
+        numberOfPoints = SplinePlanner._numberOfPointsPerStepForCurveDrawing
+        dof = len(allCoeffs)
+        startTime = 0.0
+        for curveIndex in range(len(times)):
+            step = times[curveIndex]/numberOfPoints
+            numberOfSamples = numberOfPoints + 1 if curveIndex == len(times) - 1 else numberOfPoints
+
+            values = [0.0] * dof
+            deltas1 = [0.0] * dof
+            deltas2 = [0.0] * dof
+            deltas3 = [0.0] * dof
+            for jointIndex in range(dof):
+                values[jointIndex], deltas1[jointIndex], deltas2[jointIndex], deltas3[jointIndex] = self._forwardDifferences(allCoeffs[jointIndex][curveIndex], step)
+
+            for sampleIndex in range(numberOfSamples):
+                yield (startTime + step*sampleIndex, *values)
+                for jointIndex in range(dof):
+                    values[jointIndex] += deltas1[jointIndex]
+                    deltas1[jointIndex] += deltas2[jointIndex]
+                    deltas2[jointIndex] += deltas3[jointIndex]
+
+            startTime += times[curveIndex]
+
+    def _planTrajectory(self, pathPoints, solver="banded"):
+        coeffs = [None] * self._manip.dof
+        times = [0] * (len(pathPoints) - 1)
+
+        with self._span("trajectoryThroughPoints", points=len(pathPoints)):
+            # Same check as the manipulator's isInWorkspace, without solving the inverse kinematics twice
+            try:
+                formattedPathJointVals = self._calculateJointValuesOnPathPoints(pathPoints)
+            except ValueError:
+                self._count("outsideWorkspace")
+                if self._verbose:
+                    print("Trajectory goes OUTSIDE the Workspace!!")
+                return False, coeffs, times
+
+            with self._span("durations"):
+                times = self._estimateTrajectoryStepsDuration(pathPoints, formattedPathJointVals, solver)
+
+            coeffs = list(self._polynomialCurvesThroughJointValues(formattedPathJointVals, times, solver))
+
+        return True, coeffs, times
+
+    def _span(self, name, **fields):
+        # Planners with instrumentation time their steps here
+        return _noSpan
+
+    def _count(self, name, amount=1):
+        pass
+
+    def _forwardDifferences(self, coeffs, step):
+        # Forward differences: the samples of a cubic at uniform steps are produced with three additions each, instead
+        # of evaluating the polynomial (and its powers) at every sample. The differences are seeded again from the
+        # coefficients at the start of every curve, so the rounding error accumulated in one curve never reaches the next
+        c0, c1, c2, c3 = coeffs[0], coeffs[1], coeffs[2], coeffs[3]
+        h2 = step*step
+        h3 = h2*step
+
+        return c0, c1*step + c2*h2 + c3*h3, 2*c2*h2 + 6*c3*h3, 6*c3*h3
+
+    def _calculateJointValuesOnPathPoints(self, pathPoints):
+        pathJointVals = self._manip.ikine(pathPoints)
+        formattedPathJointVals = [None] * self._manip.dof
+        for jointIndex in range(self._manip.dof):
+            formattedPathJointVals[jointIndex] = [jointVals[jointIndex] for jointVals in pathJointVals]
+
+        return formattedPathJointVals
+
+    def _estimateTrajectoryStepsDuration(self, pathPoints, formattedPathJointVals=None, solver="banded"):
+        times = [0] * (len(pathPoints) - 1)
+        for pointIndex in range(len(pathPoints) - 1):
+            distance = (pathPoints[pointIndex + 1] - pathPoints[pointIndex]).dist()
+            times[pointIndex] = max((distance/self._manip.speed, 0.1))
+
+        return times
+
+    def _polynomialCurvesThroughJointValues(self, values, times, solver="banded"):
+        # The joints share the durations, so backend.py solves them together (tridiagonal system of the velocities at
+        # the points, O(n) time and memory, same curves as the 4n x 4n system)
+        return backend.splineCoefficients(values, times)
@@ -0,0 +1,177 @@
+"""
+Backend
+-------
+
+Numerical kernels shared by the planners of the workstation and of the embedded board, so that both trees solve the
+spline the same way instead of keeping one numpy version and one linalg.py version of it.
+
+The implementation is chosen once, when the module is imported: numpy if it can be imported, plain Python otherwise
+(the board). The environment variable KT_BACKEND ("numpy" or "python") forces one of them, e.g. to check on the
+workstation what the board computes:
+
+    KT_BACKEND=python python main.py
+
+The module itself needs nothing but the standard library. This file is the source; the copy in "Embedded version" is
+made by tools/syncEmbedded.py.
+
+Spline: the curves through the joint values of a route, one cubic per curve, with continuous velocity and acceleration
+and zero velocity at the ends, are the solution of a 4n x 4n linear system (the dense system of the planners). Written
+in terms of the velocities v at the points it is tridiagonal: v[0] = v[n] = 0 and, at each inner point i,
+    v[i-1]/T[i-1] + 2*(1/T[i-1] + 1/T[i])*v[i] + v[i+1]/T[i] = 3*(dq[i-1]/T[i-1]^2 + dq[i]/T[i]^2)
+which is solved in O(n) time and memory. Plain Python uses the Thomas algorithm, on Python floats: the elimination only
+depends on the durations, so it is done once for all the joints. numpy uses cyclic reduction instead, whose steps are
+whole-array operations on all the joints (log2(n) of them instead of a sequential sweep); the matrix is diagonally
+dominant, so it is as accurate as the sweep. Below _cyclicReductionCurves curves the calls cost more than the sweep, so
+short routes take the sweep there too.
+"""
+
+import os
+
+try:
+    if os.environ.get("KT_BACKEND", "numpy") != "numpy":
+        raise ImportError("numpy backend not wanted")
+    import numpy as np
+    name = "numpy"
+except ImportError:
+    if os.environ.get("KT_BACKEND") == "numpy":
+        raise
+    np = None
+    name = "python"
+
+_cyclicReductionCurves = 50
+
+def splineCoefficients(jointValues, times):
+    """
+    Calculates the coefficients of the cubic curves through the values of each joint, with continuous velocity and
+    acceleration and zero velocity at the first and last values (same curves as the planners' dense linear system).
+
+    Parameters
+    ----------
+    jointValues : tuple[tuple[float]]
+        values of each joint at the points of the route (numberOfCurves + 1 values per joint)
+    times : tuple[float]
+        duration of each curve
+
+    Returns
+    -------
+    coeffs : numpy.ndarray | list[list[list[float]]]
+        Coefficients (c0 to c3, in powers of the time since the start of the curve) of each curve of each joint:
+        a joints x numberOfCurves x 4 array with numpy, nested lists otherwise.
+    """
+
+    if np is not None:
+        return _splineCoefficientsNumpy(jointValues, times)
+
+    times = [float(time) for time in times]
+    numberOfCurves = len(times)
+    jointValues = [[float(value) for value in values] for values in jointValues]
+    for values in jointValues:
+        if len(values) != numberOfCurves + 1:
+            raise ValueError("Needs one value more than the number of curves!")
+
+    elimination = _eliminateDurations(times)
+    velocities = [_velocities(values, times, elimination) for values in jointValues]
+    return [_hermiteCoefficients(values, jointVelocities, times) for values, jointVelocities in zip(jointValues, velocities)]
+
+def _eliminateDurations(times):
+    # Forward elimination of the tridiagonal matrix (it only depends on the durations): the factor applied to each
+    # right-hand side and the diagonal left after the elimination
+    numberOfCurves = len(times)
+    factors = [0.0] * max(numberOfCurves - 1, 0)
+    diagonal = [2*(1/times[index] + 1/times[index + 1]) for index in range(numberOfCurves - 1)]
+    for index in range(1, numberOfCurves - 1):
+        factors[index] = (1/times[index])/diagonal[index - 1]
+        diagonal[index] -= factors[index]/times[index]
+    return factors, diagonal
+
+def _velocities(values, times, elimination):
+    factors, diagonal = elimination
+    numberOfCurves = len(times)
+    velocities = [0.0] * (numberOfCurves + 1)
+    if numberOfCurves < 2:
+        return velocities
+
+    rhs = [3*((values[index + 1] - values[index])/times[index]**2 + (values[index + 2] - values[index + 1])/times[index + 1]**2)
+           for index in range(numberOfCurves - 1)]
+    for index in range(1, numberOfCurves - 1):
+        rhs[index] -= factors[index]*rhs[index - 1]
+    velocity = rhs[-1]/diagonal[-1]
+    velocities[numberOfCurves - 1] = velocity
+    for index in range(numberOfCurves - 3, -1, -1):
+        velocity = (rhs[index] - velocity/times[index + 1])/diagonal[index]
+        velocities[index + 1] = velocity
+    return velocities
+
+def _hermiteCoefficients(values, velocities, times):
+    # Cubic of each curve from the values and velocities at its ends
+    coeffs = [None] * len(times)
+    for index, T in enumerate(times):
+        slope = (values[index + 1] - values[index])/T
+        v0, v1 = velocities[index], velocities[index + 1]
+        coeffs[index] = [values[index], v0, (3*slope - 2*v0 - v1)/T, (-2*slope + v0 + v1)/(T*T)]
+    return coeffs
+
+def _splineCoefficientsNumpy(jointValues, times):
+    T = np.asarray(times, dtype=float).ravel()
+    values = np.asarray(jointValues, dtype=float)
+    if values.ndim != 2 or values.shape[1] != len(T) + 1:
+        raise ValueError("Needs one value more than the number of curves!")
+
+    velocities = np.zeros(values.shape)
+    if 2 <= len(T) < _cyclicReductionCurves:
+        times = T.tolist()
+        elimination = _eliminateDurations(times)
+        velocities[:] = [_velocities(jointValues, times, elimination) for jointValues in values.tolist()]
+    elif len(T) >= 2:
+        inverse = 1/T
+        weightedSteps = np.diff(values, axis=1)*inverse**2
+        rhs = 3*(weightedSteps[:, :-1] + weightedSteps[:, 1:])
+        coupling = np.zeros(len(T) - 1)
+        coupling[1:] = inverse[1:-1]
+        velocities[:, 1:-1] = _cyclicReduction(coupling, 2*(inverse[:-1] + inverse[1:]), np.roll(coupling, -1), rhs.T).T
+    return _hermiteCoefficientsNumpy(values, velocities, T)
+
+def _cyclicReduction(lower, diagonal, upper, rhs):
+    # Tridiagonal system (lower[0] and upper[-1] are 0) with one column of rhs per joint. Each odd equation gives its
+    # unknown from the even ones next to it; putting that into the even equations leaves a tridiagonal system of half
+    # the size, of the even unknowns only, solved the same way
+    if len(diagonal) == 1:
+        return rhs/diagonal[:, None]
+
+    oddLower, oddDiagonal, oddUpper, oddRhs = lower[1::2], diagonal[1::2], upper[1::2], rhs[1::2]
+    numberOfOdd = len(oddDiagonal)
+    numberOfEven = len(diagonal) - numberOfOdd
+
+    # Multiples of the odd equation before (and after) each even one that cancel its odd unknowns
+    before = -lower[2::2]/oddDiagonal[:numberOfEven - 1]
+    after = -upper[0::2][:numberOfOdd]/oddDiagonal
+
+    evenLower = np.zeros(numberOfEven)
+    evenLower[1:] = before*oddLower[:numberOfEven - 1]
+    evenUpper = np.zeros(numberOfEven)
+    evenUpper[:numberOfOdd] = after*oddUpper
+    evenDiagonal = diagonal[0::2].copy()
+    evenDiagonal[1:] += before*oddUpper[:numberOfEven - 1]
+    evenDiagonal[:numberOfOdd] += after*oddLower
+    evenRhs = rhs[0::2].copy()
+    evenRhs[1:] += before[:, None]*oddRhs[:numberOfEven - 1]
+    evenRhs[:numberOfOdd] += after[:, None]*oddRhs
+
+    even = _cyclicReduction(evenLower, evenDiagonal, evenUpper, evenRhs)
+    nextEven = np.zeros(oddRhs.shape)
+    nextEven[:numberOfEven - 1] = even[1:]
+    solution = np.empty(rhs.shape)
+    solution[0::2] = even
+    solution[1::2] = (oddRhs - oddLower[:, None]*even[:numberOfOdd] - oddUpper[:, None]*nextEven)/oddDiagonal[:, None]
+    return solution
+
+def _hermiteCoefficientsNumpy(values, velocities, T):
+    slope = np.diff(values, axis=1)/T
+    v0, v1 = velocities[:, :-1], velocities[:, 1:]
+
+    coeffs = np.empty(values.shape[:1] + (len(T), 4))
+    coeffs[:, :, 0] = values[:, :-1]
+    coeffs[:, :, 1] = v0
+    coeffs[:, :, 2] = (3*slope - 2*v0 - v1)/T
+    coeffs[:, :, 3] = (-2*slope + v0 + v1)/T**2
+    return coeffs
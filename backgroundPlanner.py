@@ -0,0 +1,171 @@
+"""
+BackgroundPlanner
+-----------------
+
+Plans the route typed so far in a worker thread while the operator is still entering points, so that the trajectory
+is ready (or nearly) when the route is finished.
+
+Every time the route changes, update is called with the whole route. The spline, the durations and the choice of inverse
+kinematics solutions depend on every point, so a new point means planning the whole route again: the worker always
+plans the latest route only. A plan whose route changes while it runs is not interrupted (numpy and the planners cannot
+be stopped halfway), but nobody waits for it. The plans of the last few routes are kept, so going back to an earlier
+route (e.g. undoing a point) does not plan it again.
+
+The worker plans with its own planner instance, which does not print: the outcome is reported by result, in the
+thread that asks for it.
+"""
+
+import threading
+from collections import OrderedDict
+from point import Point
+
+class BackgroundPlanner:
+    """
+    A class to plan a route in a worker thread while it is being entered
+
+    ...
+
+    Attributes
+    ----------
+    plansStarted : int
+        number of plans started by the worker
+    plansStale : int
+        number of plans whose route had changed when they finished
+    plansReused : int
+        number of results returned without planning (already planned, or planned in the background)
+
+    Methods
+    -------
+    update(pathPoints):
+        Tells the route entered so far; the worker starts planning it as soon as it is free.
+    result(pathPoints):
+        Returns the trajectory through the route (waiting for the worker if it is not ready).
+    close():
+        Stops the worker.
+    """
+
+    _keptResults = 8
+
+    def __init__(self, manip, plannerClass):
+        self._planner = plannerClass(manip, verbose=False)
+        self._condition = threading.Condition()
+        self._wanted = None
+        self._results = OrderedDict()
+        self._closed = False
+        self._plansStarted = 0
+        self._plansStale = 0
+        self._plansReused = 0
+        self._thread = threading.Thread(target=self._work, daemon=True)
+        self._thread.start()
+
+    @property
+    def plansStarted(self):
+        return self._plansStarted
+
+    @property
+    def plansStale(self):
+        return self._plansStale
+
+    @property
+    def plansReused(self):
+        return self._plansReused
+
+    def update(self, pathPoints):
+        """
+        Tells the route entered so far; the worker starts planning it as soon as it is free.
+
+        Parameters
+        ----------
+        pathPoints : tuple[Point]
+            points of the route (nothing is planned for less than 2 points)
+
+        Returns
+        -------
+        None
+        """
+
+        route = _routeKey(pathPoints)
+        with self._condition:
+            self._wanted = route if len(route) >= 2 else None
+            self._condition.notify_all()
+
+    def result(self, pathPoints):
+        """
+        Returns the trajectory through the route, like the planner's trajectoryThroughPoints (waiting for the worker if
+        it is not ready, and raising what trajectoryThroughPoints raised).
+        If it goes outside the workspace, the planner's message is printed here.
+
+        Parameters
+        ----------
+        pathPoints : tuple[Point]
+            points of the route
+
+        Returns
+        -------
+        succeeded : bool
+            Whether the operation succeeded (fails when desired trajectory goes out of workspace).
+        coeffs : tuple[tuple[tuple[float]]]
+            Polynomial coefficients for each curve of each joint.
+        times : tuple[float]
+            Duration of each curve.
+        """
+
+        if len(pathPoints) < 2:
+            raise ValueError("Needs at least 2 points to calculate trajectory")
+
+        route = _routeKey(pathPoints)
+        with self._condition:
+            if route in self._results:
+                self._plansReused += 1
+            else:
+                self._wanted = route
+                self._condition.notify_all()
+                while route not in self._results:
+                    self._condition.wait()
+            outcome = self._results[route]
+
+        if isinstance(outcome, Exception):
+            raise outcome
+        if not outcome[0]:
+            print("Trajectory goes OUTSIDE the Workspace!!")
+        return outcome
+
+    def close(self):
+        """
+        Stops the worker (after the plan in progress, if any).
+
+        Returns
+        -------
+        None
+        """
+
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self._thread.join()
+
+    def _work(self):
+        while True:
+            with self._condition:
+                while not self._closed and (self._wanted is None or self._wanted in self._results):
+                    self._condition.wait()
+                if self._closed:
+                    return
+                route = self._wanted
+                self._plansStarted += 1
+
+            try:
+                outcome = self._planner.trajectoryThroughPoints([Point(*coordinates) for coordinates in route])
+            except Exception as e:
+                outcome = e
+
+            with self._condition:
+                if route != self._wanted:
+                    self._plansStale += 1
+                self._results[route] = outcome
+                while len(self._results) > BackgroundPlanner._keptResults:
+                    self._results.popitem(last=False)
+                self._condition.notify_all()
+
+def _routeKey(pathPoints):
+    return tuple((point.x, point.y, point.z) for point in pathPoints)
@@ -1,4 +1,5 @@
-from math import radians, degrees, cos, sin, asin, atan2
+import numpy as np
+from math import radians, degrees, cos, sin, asin, atan2, pi, ceil, floor
 from point import Point
 from joints import Joints_
 from manipulator import Manipulator
@@ -19,20 +20,34 @@ class BarretWAM_4(Manipulator):
         indicates the type of the joints ; True = rotative, False = prismatic (RRRR)
     jointLims : tuple[tuple[float]]
         indicates the limits of the joints ((-150, 150), (-113, 113), (-157, 157), (-140, 90))
+    jointVelLims : tuple[float] | None
+        indicates the maximum absolute velocity of each joint in rad/s, if given to the constructor (None by default)
+    jointAccLims : tuple[float] | None
+        indicates the maximum absolute acceleration of each joint in rad/s², if given to the constructor (None by default)
     speed : float
         avarage speed of the Barret-WAM's end-effector
     
     Methods
     -------
     isInWorkspace(point):
-        Verify if the given point is inside of the Barret-WAM's workspace.
+        Verify if the given point is inside of the Barret-WAM's workspace (reachable by any inverse kinematics solution).
         If argument is a iterable, verify all points.
     fkine(jointVals):
         Calculates the Barret-WAM's end-effector position in the space for given joint values - forward kinematics.
         If argument is a iterable, apply method to all values.
+    fkineBatch(jointVals):
+        Calculates the Barret-WAM's end-effector positions for an (N x 4) array of joint values.
+    framePositions(jointVals):
+        Calculates the position of the Barret-WAM's base, elbow and end-effector for an (N x 4) array of joint values.
     ikine(point):
         Calculates the Barret-WAM's joint values for given end-effector position in the space - inverse kinematics.
         If argument is a iterable, apply method to all points.
+    ikinePath(pathPoints):
+        Calculates the Barret-WAM's joint values for the points of a path, choosing among all inverse kinematics solutions the ones that move the joints the least.
+    jacobian(jointVals):
+        Calculates the Barret-WAM's end-effector linear velocity jacobian for an (N x 4) array of joint values.
+    jacobianDot(jointVals, jointVels):
+        Calculates the time derivative of the Barret-WAM's end-effector linear velocity jacobian for (N x 4) arrays of joint values and velocities.
 
     Inner Class
     -----------
@@ -53,8 +68,11 @@ class BarretWAM_4(Manipulator):
                        (radians(-157), radians(157)),
                        (radians(-140), radians(90)))
 
-    def __init__(self):
-        super().__init__(BarretWAM_4._manipName, BarretWAM_4._manipDOF, BarretWAM_4._manipJointTypes, BarretWAM_4._manipJointLims)
+    def __init__(self, jointVelLims = None, jointAccLims = None):
+        # No joint rate limits by default: the curve durations come from the end-effector's speed, unless the limits of
+        # the arm at hand (they depend on its controller and payload), in rad/s and rad/s², are given
+        super().__init__(BarretWAM_4._manipName, BarretWAM_4._manipDOF, BarretWAM_4._manipJointTypes, BarretWAM_4._manipJointLims,
+                         jointVelLims=jointVelLims, jointAccLims=jointAccLims)
 
     class Joints(Joints_):
         """ 
@@ -113,7 +131,7 @@ class BarretWAM_4(Manipulator):
 
     def isInWorkspace(self, point:Point | tuple[Point]):
         """
-        Verifies if the given point is inside of the Barret-WAM's workspace.
+        Verifies if the given point is inside of the Barret-WAM's workspace (reachable by any inverse kinematics solution).
         If argument is a iterable, verify all points.
         
         Parameters
@@ -128,7 +146,7 @@ class BarretWAM_4(Manipulator):
         """
 
         try:
-            self.ikine(point)
+            self.ikinePath([point] if type(point) == Point else point)
             return True
         except ValueError:
             return False
@@ -165,6 +183,53 @@ class BarretWAM_4(Manipulator):
         else:
             raise TypeError("fkine can only operate on Joints, tuple[Joints] or list[Joints]")
 
+    def fkineBatch(self, jointVals):
+        """
+        Calculates the Barret-WAM's end-effector positions for an (N x 4) array of joint values.
+        Same expressions as fkine, evaluated for all rows at once (rows are not checked against the joint limits).
+
+        Parameters
+        ----------
+        jointVals : array_like (N x 4)
+            Barret-WAM's joint values, one row per configuration.
+
+        Returns
+        -------
+        positions : numpy.ndarray (N x 3)
+            x, y and z coordinates of the end-effector for each configuration.
+        """
+
+        q = np.atleast_2d(np.asarray(jointVals, dtype=float))
+        s1, s2, s3, s4 = np.sin(q).T
+        c1, c2, c3, c4 = np.cos(q).T
+        la, lc = BarretWAM_4._la, BarretWAM_4._lc
+
+        A = la*s2 - lc*s2*s4 + lc*c2*c3*c4
+        B = lc*c4*s3
+        return np.stack((c1*A - s1*B, s1*A + c1*B, la*c2 - lc*c2*s4 - lc*c3*c4*s2), axis=1)
+
+    def framePositions(self, jointVals):
+        """
+        Calculates the position of the Barret-WAM's base, elbow and end-effector for an (N x 4) array of joint values.
+        The shoulder joints (q1, q2 and q3) are all at the base, and the elbow joint (q4) is at the end of the upper arm (la).
+
+        Parameters
+        ----------
+        jointVals : array_like (N x 4)
+            Barret-WAM's joint values, one row per configuration.
+
+        Returns
+        -------
+        positions : numpy.ndarray (N x 3 x 3)
+            x, y and z coordinates of the base, elbow and end-effector for each configuration.
+        """
+
+        q = np.atleast_2d(np.asarray(jointVals, dtype=float))
+        s2 = np.sin(q[:, 1])
+        upperArm = BarretWAM_4._la*np.stack((np.cos(q[:, 0])*s2, np.sin(q[:, 0])*s2, np.cos(q[:, 1])), axis=1)
+
+        return np.stack((np.zeros_like(upperArm), upperArm, self.fkineBatch(q)), axis=1)
+
     def ikine(self, point:Point | tuple[Point]):
         """
         Calculates the Barret-WAM's joint values for given end-effector position in the space - inverse kinematics.
@@ -198,4 +263,181 @@ class BarretWAM_4(Manipulator):
             return jointValsVec
 
         else:
-            raise TypeError("ikine can only operate on Point, tuple[Point] or list[Point]")
\ No newline at end of file
+            raise TypeError("ikine can only operate on Point, tuple[Point] or list[Point]")
+
+    def ikinePath(self, pathPoints:tuple[Point]):
+        """
+        Calculates the Barret-WAM's joint values for the points of a path, choosing among all inverse kinematics solutions the ones that move the joints the least.
+        Besides the solution of ikine, q1 can be turned by ±π (reaching the point from the other side, so that paths can cross
+        the ±π azimuth without a jump), or by 2π if the limits allow it, and the elbow (q4) can bend the other way.
+        The solutions that respect the joint limits are compared along the whole path, and the ones with the least
+        total joint travel are kept.
+
+        Parameters
+        ----------
+        pathPoints : Iterable[Point]
+            x, y and z coordinates of the points of the path.
+
+        Returns
+        -------
+        jointVals : list[BarretWAM_4.Joints]
+            Barret-WAM's joint values for each point of the path.
+        """
+
+        if len(pathPoints) == 0:
+            return []
+
+        candidates = self._ikineCandidates(np.array([[point.x, point.y, point.z] for point in pathPoints], dtype=float))
+        valid = ~np.isnan(candidates).any(axis=2)
+        if not valid.any(axis=1).all():
+            raise ValueError("Joint values are outside of workspace!")
+
+        # Joint travel between every solution of a point and every solution of the next one, then the cheapest
+        # chain of solutions through the whole path (dynamic programming, one step per point)
+        travel = np.abs(candidates[1:, None, :, :] - candidates[:-1, :, None, :]).sum(axis=3)
+        travel[np.isnan(travel)] = np.inf
+        cost = np.where(valid[0], 0, np.inf)
+        choices = np.empty(travel.shape[:2], dtype=int)
+        for pointIndex in range(len(travel)):
+            total = cost[:, None] + travel[pointIndex]
+            choices[pointIndex] = np.argmin(total, axis=0)
+            cost = total[choices[pointIndex], np.arange(len(cost))]
+
+        selected = np.empty(len(candidates), dtype=int)
+        selected[-1] = np.argmin(cost)
+        for pointIndex in range(len(choices) - 1, -1, -1):
+            selected[pointIndex] = choices[pointIndex, selected[pointIndex + 1]]
+
+        return [BarretWAM_4.Joints(*jointVals) for jointVals in candidates[np.arange(len(candidates)), selected].tolist()]
+
+    def _ikineCandidates(self, positions):
+        x, y, z = positions[:, 0, None, None], positions[:, 1, None, None], positions[:, 2, None, None]
+        la, lc = BarretWAM_4._la, BarretWAM_4._lc
+        q1Lims = BarretWAM_4._manipJointLims[0]
+
+        # q1 = atan2(y, x) + kπ for every k that can fall within the limits (odd k reach the point from behind)
+        turns = np.arange(ceil((q1Lims[0] - pi)/pi), floor((q1Lims[1] + pi)/pi) + 1)
+        q1 = np.arctan2(y, x) + turns[None, :, None]*pi
+        radial = x*np.cos(q1) + y*np.sin(q1)
+
+        # Same elbow equation as ikine, whose solutions are asin(.), π - asin(.) and -π - asin(.)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            elbow = np.arcsin((radial**2 + z**2 - lc**2 - la**2)/(-2*la*lc))
+            q4 = np.concatenate((elbow, pi - elbow, -pi - elbow), axis=2)
+            m, n = la - lc*np.sin(q4), lc*np.cos(q4)
+            sin_q2 = (m*radial/n - z)/(m**2/n + n)
+            cos_q2 = (radial - m*sin_q2)/n
+            q2 = np.arctan2(sin_q2, cos_q2)
+
+        q1, q2, q4 = np.broadcast_arrays(q1, q2, q4)
+        candidates = np.stack((q1, q2, np.zeros_like(q1), q4), axis=3).reshape(len(positions), -1, BarretWAM_4._manipDOF)
+
+        jointLims = np.array(BarretWAM_4._manipJointLims)
+        with np.errstate(invalid="ignore"):
+            inLims = ((candidates >= jointLims[:, 0]) & (candidates <= jointLims[:, 1])).all(axis=2)
+        candidates[~inLims] = np.nan
+
+        return candidates
+
+    def jacobian(self, jointVals):
+        """
+        Calculates the Barret-WAM's end-effector linear velocity jacobian for an (N x 4) array of joint values.
+        The end-effector velocity is v = J @ qd.
+
+        Parameters
+        ----------
+        jointVals : array_like (N x 4)
+            Barret-WAM's joint values, one row per configuration.
+
+        Returns
+        -------
+        J : numpy.ndarray (N x 3 x 4)
+            Closed-form jacobian for each configuration.
+        """
+
+        terms = self._jacobianTerms(jointVals)
+        return self._assembleJacobian(terms, terms["dA"], terms["dB"], terms["dZ"])
+
+    def jacobianDot(self, jointVals, jointVels):
+        """
+        Calculates the time derivative of the Barret-WAM's end-effector linear velocity jacobian for (N x 4) arrays of joint values and velocities.
+        The end-effector acceleration is a = J @ qdd + Jdot @ qd.
+
+        Parameters
+        ----------
+        jointVals : array_like (N x 4)
+            Barret-WAM's joint values, one row per configuration.
+        jointVels : array_like (N x 4)
+            Barret-WAM's joint velocities, one row per configuration.
+
+        Returns
+        -------
+        Jdot : numpy.ndarray (N x 3 x 4)
+            Closed-form time derivative of the jacobian for each configuration.
+        """
+
+        qd = np.atleast_2d(np.asarray(jointVels, dtype=float))
+        terms = self._jacobianTerms(jointVals)
+        s1, c1, s2, c2, s3, c3, s4, c4 = (terms[key] for key in ("s1", "c1", "s2", "c2", "s3", "c3", "s4", "c4"))
+        A, B, Z, dA, dB, dZ = (terms[key] for key in ("A", "B", "Z", "dA", "dB", "dZ"))
+        qd1, qd2, qd3, qd4 = qd.T
+        lc = BarretWAM_4._lc
+
+        # Time derivatives of the planar terms A (radial), B (tangential) and Z (height) and of their partial derivatives
+        Adot = dA[1]*qd2 + dA[2]*qd3 + dA[3]*qd4
+        Bdot = dB[2]*qd3 + dB[3]*qd4
+        Zdot = dZ[1]*qd2 + dZ[2]*qd3 + dZ[3]*qd4
+
+        dAdot = (np.zeros_like(A),
+                 Zdot,
+                 -lc*(-s2*qd2*s3*c4 + c2*c3*qd3*c4 - c2*s3*s4*qd4),
+                 -lc*(c2*qd2*c4 - s2*s4*qd4) - lc*(-s2*qd2*c3*s4 - c2*s3*qd3*s4 + c2*c3*c4*qd4))
+        dBdot = (np.zeros_like(A),
+                 np.zeros_like(A),
+                 lc*(-s3*qd3*c4 - c3*s4*qd4),
+                 -lc*(c3*qd3*s4 + s3*c4*qd4))
+        dZdot = (np.zeros_like(A),
+                 -Adot,
+                 lc*(c2*qd2*s3*c4 + s2*c3*qd3*c4 - s2*s3*s4*qd4),
+                 -lc*(-s2*qd2*c4 - c2*s4*qd4) + lc*(c2*qd2*c3*s4 - s2*s3*qd3*s4 + s2*c3*c4*qd4))
+
+        # d/dt (c1*X - s1*Y) = c1*Xdot - s1*Ydot - qd1*(s1*X + c1*Y), and likewise for the y row
+        J = self._assembleJacobian(terms, dA, dB, dZ)
+        Jdot = self._assembleJacobian(terms, dAdot, dBdot, dZdot)
+        Jdot[:, 0, :] -= qd1[:, None]*J[:, 1, :]
+        Jdot[:, 1, :] += qd1[:, None]*J[:, 0, :]
+        Jdot[:, 0, 0] = -(s1*(Adot - qd1*B) + c1*(Bdot + qd1*A))
+        Jdot[:, 1, 0] = c1*(Adot - qd1*B) - s1*(Bdot + qd1*A)
+
+        return Jdot
+
+    def _jacobianTerms(self, jointVals):
+        q = np.atleast_2d(np.asarray(jointVals, dtype=float))
+        s1, s2, s3, s4 = np.sin(q).T
+        c1, c2, c3, c4 = np.cos(q).T
+        la, lc = BarretWAM_4._la, BarretWAM_4._lc
+
+        # The end-effector is p = (c1*A - s1*B, s1*A + c1*B, Z), with A, B and Z independent of q1
+        A = la*s2 - lc*s2*s4 + lc*c2*c3*c4
+        B = lc*c4*s3
+        Z = la*c2 - lc*c2*s4 - lc*c3*c4*s2
+        zeros = np.zeros_like(A)
+        dA = (zeros, Z, -lc*c2*s3*c4, -lc*s2*c4 - lc*c2*c3*s4)
+        dB = (zeros, zeros, lc*c3*c4, -lc*s3*s4)
+        dZ = (zeros, -A, lc*s2*s3*c4, -lc*c2*c4 + lc*s2*c3*s4)
+
+        return {"s1": s1, "c1": c1, "s2": s2, "c2": c2, "s3": s3, "c3": c3, "s4": s4, "c4": c4,
+                "A": A, "B": B, "Z": Z, "dA": dA, "dB": dB, "dZ": dZ}
+
+    def _assembleJacobian(self, terms, dA, dB, dZ):
+        s1, c1 = terms["s1"], terms["c1"]
+        J = np.empty((len(s1), 3, BarretWAM_4._manipDOF))
+        J[:, 0, 0] = -(s1*terms["A"] + c1*terms["B"])
+        J[:, 1, 0] = c1*terms["A"] - s1*terms["B"]
+        J[:, 2, 0] = 0
+        for jointIndex in range(1, BarretWAM_4._manipDOF):
+            J[:, 0, jointIndex] = c1*dA[jointIndex] - s1*dB[jointIndex]
+            J[:, 1, jointIndex] = s1*dA[jointIndex] + c1*dB[jointIndex]
+            J[:, 2, jointIndex] = dZ[jointIndex]
+
+        return J
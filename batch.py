@@ -0,0 +1,341 @@
+"""
+Batch
+-----
+
+Non-interactive entry point to plan many trajectories at once, without prompts or plots (matplotlib is never imported).
+
+Jobs are read from JSON or CSV files (or from stdin, with "-"):
+    JSON: a job, a list of jobs or {"jobs": [...]}, each job being
+          {"name": "route1", "manipulator": "barretwam4", "planner": "linear", "points": [[0.35, 0, 0.55], [0.3, 0.2, 0.5]]}
+    CSV: one point per row, with columns job, x, y, z and, optionally, manipulator and planner
+         (rows of the same job are taken in order).
+"manipulator" (the key of manipulatorOptions or the manipulator's name) and "planner" (curved or linear) are optional.
+
+Job names must be unique and cannot contain path separators. A file that is not made of such jobs (a job without
+points, a CSV without x, y and z columns...) is rejected as a whole, before anything is planned.
+For each job, writes <name>.json (coefficients and durations of each curve) and, with --samples, <name>_samples.csv
+(time and joint values) and, with --wire, <name>.ktcf (the coefficients packed for the embedded board, see
+coeffsWire; --float32 halves its size) to the output directory, and prints a status line with the planning time.
+The exit code is 0 only if every job succeeded.
+
+With --workers, the jobs are planned in parallel by a pool of processes.
+
+Usage:
+    python batch.py jobs.json [more.csv ...] [-o outputDir] [--samples] [--wire [--float32]] [--workers N]
+"""
+
+import argparse
+import collections
+import csv
+import io
+import json
+import os
+import sys
+import time
+from trajectoryPlanner import TrajectoryPlanner
+from lineTrajectoryPlanner import LineTrajectoryPlanner
+from barretwam4 import BarretWAM_4
+from parallelPlanner import planRoute, planRoutes
+from coeffsWire import savePlan
+
+manipulatorOptions = {"barretwam4": BarretWAM_4} ### Change here if you want to add more manipulators
+plannerOptions = {"curved": TrajectoryPlanner, "linear": LineTrajectoryPlanner} ### Change here if you want to add more trajectory types
+
+class BatchJob:
+    """
+    A class to represent one trajectory to be planned by the batch entry point
+
+    ...
+
+    Attributes
+    ----------
+    name : string
+        name of the job (also the name of its output files)
+    manipulator : string
+        key of manipulatorOptions (or name) of the manipulator
+    planner : string
+        key of plannerOptions of the trajectory planner
+    points : list[list[float]]
+        x, y and z coordinates of the points of the trajectory
+    """
+
+    def __init__(self, name, manipulator, planner, points):
+        self._name = name
+        self._manipulator = manipulator
+        self._planner = planner
+        self._points = points
+
+    @property
+    def name(self):
+        return self._name
+
+    @property
+    def manipulator(self):
+        return self._manipulator
+
+    @property
+    def planner(self):
+        return self._planner
+
+    @property
+    def points(self):
+        return self._points
+
+def readJobs(source, fileFormat=None):
+    """
+    Reads the jobs of a JSON or CSV file.
+
+    Parameters
+    ----------
+    source : string
+        path of the file, or "-" for stdin
+    fileFormat : string = None
+        "json" or "csv" (from the file extension if not given, JSON for stdin)
+
+    Returns
+    -------
+    jobs : list[BatchJob]
+        Jobs of the file, in order.
+    """
+
+    if fileFormat is None:
+        fileFormat = "csv" if source.lower().endswith(".csv") else "json"
+    defaultName = "stdin" if source == "-" else os.path.splitext(os.path.basename(source))[0]
+
+    if source == "-":
+        text = sys.stdin.read()
+    else:
+        with open(source, newline="") as file:
+            text = file.read()
+
+    if fileFormat == "csv":
+        return _jobsFromCSV(text, defaultName)
+    return _jobsFromJSON(text, defaultName)
+
+def manipulatorClass(manipulator):
+    """
+    Finds the manipulator class of a job.
+
+    Parameters
+    ----------
+    manipulator : string
+        key of manipulatorOptions or name of the manipulator
+
+    Returns
+    -------
+    manipClass : type
+        Manipulator class (raises ValueError if there is none by that key or name).
+    """
+
+    if manipulator in manipulatorOptions:
+        return manipulatorOptions[manipulator]
+    for manipClass in manipulatorOptions.values():
+        if manipClass._manipName == manipulator:
+            return manipClass
+    raise ValueError("unknown manipulator " + repr(manipulator))
+
+def planJob(job):
+    """
+    Plans the trajectory of a job.
+
+    Parameters
+    ----------
+    job : BatchJob
+        job to be planned
+
+    Returns
+    -------
+    status : string
+        "OK", "OUTSIDE WORKSPACE" or "ERROR: <reason>".
+    coeffs : list[list[list[float]]] | None
+        Polynomial coefficients for each curve of each joint (None if not planned).
+    times : list[float] | None
+        Duration of each curve (None if not planned).
+    """
+
+    try:
+        robot = manipulatorClass(job.manipulator)()
+        if job.planner not in plannerOptions:
+            raise ValueError("unknown planner " + repr(job.planner))
+    except ValueError as e:
+        return "ERROR: " + str(e), None, None
+
+    result = planRoute(plannerOptions[job.planner](robot, verbose=False), job.points)
+    if not result.succeeded:
+        return result.status, None, None
+    return result.status, result.coeffs.tolist(), result.times.tolist()
+
+def planJobsInParallel(jobs, maxWorkers):
+    """
+    Plans the trajectories of the jobs in a pool of processes (see parallelPlanner.planRoutes).
+
+    Parameters
+    ----------
+    jobs : list[BatchJob]
+        jobs to be planned
+    maxWorkers : int
+        number of worker processes
+
+    Returns
+    -------
+    results : list[tuple]
+        (status, coeffs, times, seconds) of each job, in the same order as jobs, like planJob plus the planning time.
+    """
+
+    results = [None] * len(jobs)
+    groups = {}
+    for jobIndex, job in enumerate(jobs):
+        groups.setdefault((job.manipulator, job.planner), []).append(jobIndex)
+
+    # The pool plans routes of one manipulator and planner, so jobs are grouped by them
+    for (manipulator, planner), jobIndexes in groups.items():
+        try:
+            manipClass = manipulatorClass(manipulator)
+            if planner not in plannerOptions:
+                raise ValueError("unknown planner " + repr(planner))
+        except ValueError as e:
+            for jobIndex in jobIndexes:
+                results[jobIndex] = ("ERROR: " + str(e), None, None, 0.0)
+            continue
+
+        routes = [jobs[jobIndex].points for jobIndex in jobIndexes]
+        routeResults = planRoutes(routes, manipClass, plannerOptions[planner], maxWorkers)
+        for jobIndex, result in zip(jobIndexes, routeResults):
+            coeffs = None if result.coeffs is None else result.coeffs.tolist()
+            times = None if result.times is None else result.times.tolist()
+            results[jobIndex] = (result.status, coeffs, times, result.seconds)
+
+    return results
+
+def writeJobResult(job, coeffs, times, outputDir, samples=False, wire=False, float32=False):
+    """
+    Writes the planned trajectory of a job to <outputDir>/<name>.json, if samples, <outputDir>/<name>_samples.csv and,
+    if wire, <outputDir>/<name>.ktcf.
+
+    Parameters
+    ----------
+    job : BatchJob
+        job that was planned
+    coeffs : list[list[list[float]]]
+        polynomial coefficients for each curve of each joint
+    times : list[float]
+        duration of each curve
+    outputDir : string
+        directory of the output files
+    samples : bool = False
+        whether to also write the joint values in time
+    wire : bool = False
+        whether to also write the coefficients packed for the embedded board
+    float32 : bool = False
+        whether the packed coefficients are single precision
+
+    Returns
+    -------
+    None
+    """
+
+    result = {"name": job.name, "manipulator": job.manipulator, "planner": job.planner, "times": times, "coeffs": coeffs}
+    with open(os.path.join(outputDir, job.name + ".json"), "w") as file:
+        json.dump(result, file)
+
+    if wire:
+        savePlan(os.path.join(outputDir, job.name + ".ktcf"), coeffs, times, float32)
+
+    if samples:
+        planner = plannerOptions[job.planner](manipulatorClass(job.manipulator)())
+        values, timeVector = planner.curvesValues(coeffs, times)
+        with open(os.path.join(outputDir, job.name + "_samples.csv"), "w", newline="") as file:
+            writer = csv.writer(file)
+            writer.writerow(["t"] + ["q" + str(jointIndex+1) for jointIndex in range(len(values))])
+            writer.writerows(zip(timeVector, *values))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Plans the trajectories of the jobs of JSON/CSV files without user interaction.")
+    parser.add_argument("inputs", nargs="+", help="job files (.json or .csv), or - for stdin")
+    parser.add_argument("-o", "--output", default=".", help="directory of the output files (default: current directory)")
+    parser.add_argument("-f", "--format", choices=("json", "csv"), help="format of the job files (default: from the extension)")
+    parser.add_argument("--samples", action="store_true", help="also write the joint values in time of each job")
+    parser.add_argument("--wire", action="store_true", help="also write the coefficients of each job packed for the embedded board (.ktcf)")
+    parser.add_argument("--float32", action="store_true", help="pack the coefficients in single precision (with --wire)")
+    parser.add_argument("--summary", help="also write the status and timing of every job to this JSON file")
+    parser.add_argument("-w", "--workers", type=int, default=1, help="number of processes planning jobs in parallel (default: 1)")
+    args = parser.parse_args(argv)
+
+    jobs = []
+    for source in args.inputs:
+        try:
+            jobs += readJobs(source, args.format)
+        except (OSError, ValueError) as e:
+            parser.error(source + ": " + str(e))
+    duplicates = sorted(name for name, count in collections.Counter(job.name for job in jobs).items() if count > 1)
+    if duplicates:
+        parser.error("jobs with the same name would overwrite each other's output files: " + ", ".join(duplicates))
+    os.makedirs(args.output, exist_ok=True)
+
+    if args.workers > 1:
+        results = planJobsInParallel(jobs, args.workers)
+    else:
+        results = []
+        for job in jobs:
+            start = time.perf_counter()
+            status, coeffs, times = planJob(job)
+            results.append((status, coeffs, times, time.perf_counter() - start))
+
+    summary = []
+    for job, (status, coeffs, times, planningTime) in zip(jobs, results):
+        if coeffs is not None:
+            writeJobResult(job, coeffs, times, args.output, args.samples, args.wire, args.float32)
+
+        summary.append({"name": job.name, "status": status, "seconds": planningTime, "curves": 0 if times is None else len(times)})
+        print(job.name + "\t" + status + "\t" + "{:.4f}".format(planningTime) + " s")
+
+    if args.summary:
+        with open(args.summary, "w") as file:
+            json.dump(summary, file, indent=2)
+
+    return 0 if all(entry["status"] == "OK" for entry in summary) else 1
+
+def _jobFromDict(entry, defaultName):
+    if not isinstance(entry, dict):
+        raise ValueError("job " + repr(defaultName) + " is not an object (expected {\"name\": ..., \"points\": [...]})")
+    if "points" not in entry:
+        raise ValueError("job " + repr(entry.get("name", defaultName)) + " has no \"points\"")
+    for key in ("manipulator", "planner"):
+        if not isinstance(entry.get(key, ""), str):
+            raise ValueError("job " + repr(entry.get("name", defaultName)) + ": \"" + key + "\" must be a string")
+    name = str(entry.get("name", defaultName))
+    # The name becomes the name of the output files, which must stay in the output directory
+    if name in ("", ".", "..") or any(separator in name for separator in ("/", "\\", os.sep, os.altsep) if separator):
+        raise ValueError("invalid job name " + repr(name) + " (it names the output files: no path separators)")
+    return BatchJob(name,
+                    entry.get("manipulator", next(iter(manipulatorOptions))),
+                    entry.get("planner", next(iter(plannerOptions))),
+                    entry["points"])
+
+def _jobsFromJSON(text, defaultName):
+    content = json.loads(text)
+    if isinstance(content, dict):
+        content = content["jobs"] if "jobs" in content else [content]
+    if not isinstance(content, list):
+        raise ValueError("expected a job, a list of jobs or {\"jobs\": [...]}")
+    return [_jobFromDict(entry, defaultName + "_" + str(jobIndex+1)) for jobIndex, entry in enumerate(content)]
+
+def _jobsFromCSV(text, defaultName):
+    jobs = {}
+    reader = csv.DictReader(io.StringIO(text))
+    missing = [column for column in ("x", "y", "z") if column not in (reader.fieldnames or ())]
+    if missing:
+        raise ValueError("missing column(s) " + ", ".join(missing) + " (expected job, x, y, z and, optionally, manipulator and planner)")
+    for row in reader:
+        name = row.get("job") or defaultName
+        if name not in jobs:
+            jobs[name] = {"name": name, "points": []}
+            if row.get("manipulator"):
+                jobs[name]["manipulator"] = row["manipulator"]
+            if row.get("planner"):
+                jobs[name]["planner"] = row["planner"]
+        jobs[name]["points"].append([row["x"], row["y"], row["z"]])
+    return [_jobFromDict(entry, name) for name, entry in jobs.items()]
+
+if __name__ == "__main__":
+    sys.exit(main())
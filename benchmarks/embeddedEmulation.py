@@ -0,0 +1,299 @@
+"""
+EmbeddedEmulation
+-----------------
+
+Runs the planner of the "Embedded version" on Linux under constraints that emulate the Colibri VF50, so that
+regressions of the embedded code (in time, memory or numbers) are caught before deploying it to the board.
+
+The embedded planner runs in a child process:
+    * with its address space limited (RLIMIT_AS, --memory-mb), so allocating more raises MemoryError as on the board;
+      Linux does not enforce RSS limits, so the peak RSS of every stage is checked against --rss-mb instead;
+    * pinned to a single core (--cpu);
+    * throttled by --throttle: the child is stopped (SIGSTOP) and continued (SIGCONT) so that it only runs 1/throttle
+      of the time, emulating a CPU that many times slower;
+    * with a deadline (--timeout) for every stage, so blow-ups (such as an O(n!) determinant) end as a timeout.
+
+For every stage (imports, isInWorkspace, ikine, durations, solve, curvesValues, curvesSamples) it records
+the wall time, the CPU time, the peak traced memory, the net number of memory blocks allocated and the peak RSS.
+
+The results are then cross-checked against the NumPy desktop planner: the desktop forward kinematics of the embedded
+joint values must reach the route points, the desktop dense solve of the same systems must give the same coefficients and
+the desktop sampling of those coefficients must give the same joint values.
+
+Usage:
+    python benchmarks/embeddedEmulation.py [route.json] [--points N] [--planner curved|linear] [--throttle 8]
+                                           [--memory-mb 128] [--rss-mb 64] [--timeout 60] [--float32] [--json out.json]
+route.json holds a list of [x, y, z] points; without it, a random route of --points points is used.
+The exit code is 0 only if every stage finished within the limits and the cross-check passed.
+"""
+
+import argparse
+import json
+import os
+import select
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+repositoryDir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+embeddedDir = os.path.join(repositoryDir, "Embedded version")
+
+def runEmulation(points, planner="curved", throttle=1.0, memoryMB=128, cpu=0, timeout=60.0, float32=False, log=print):
+    """
+    Plans a route with the embedded planner in a constrained child process.
+
+    Parameters
+    ----------
+    points : list[list[float]]
+        x, y and z coordinates of the points of the route
+    planner : string = "curved"
+        "curved" or "linear"
+    throttle : float = 1.0
+        the child only runs 1/throttle of the time
+    memoryMB : int = 128
+        address space limit of the child (None for no limit)
+    cpu : int = 0
+        core the child is pinned to (None to not pin it)
+    timeout : float = 60.0
+        maximum wall time of each stage
+    float32 : bool = False
+        whether the embedded linalg stores numbers in float32
+    log : callable(string) = print
+        called with a line for each stage
+
+    Returns
+    -------
+    stages : list[dict]
+        Measurements of each stage that finished.
+    result : dict | None
+        Joint values at the points, durations, coefficients and sampled values (None if the plan did not finish).
+    error : string | None
+        Why the plan did not finish (None if it did).
+    """
+
+    config = {"points": points, "planner": planner, "memoryMB": memoryMB, "cpu": cpu, "float32": float32}
+    child = subprocess.Popen([sys.executable, os.path.abspath(__file__), "--child", json.dumps(config)],
+                             stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+
+    events = []
+    lastEvent = [time.monotonic()]
+    def readEvents():
+        for line in child.stdout:
+            events.append(json.loads(line))
+            lastEvent[0] = time.monotonic()
+    reader = threading.Thread(target=readEvents, daemon=True)
+    reader.start()
+
+    # Duty cycle of 10 ms: runs for 10/throttle ms and stays stopped for the rest
+    period = 0.01
+    running = period/max(throttle, 1.0)
+    error = None
+    while child.poll() is None:
+        time.sleep(running)
+        if throttle > 1 and child.poll() is None:
+            child.send_signal(signal.SIGSTOP)
+            time.sleep(period - running)
+            child.send_signal(signal.SIGCONT)
+        if time.monotonic() - lastEvent[0] > timeout:
+            stage = events[-1]["stage"] if events and "stage" in events[-1] else "start"
+            error = "TIMEOUT in stage " + stage + " (more than " + str(timeout) + " s)"
+            child.kill()
+            break
+    child.wait()
+    reader.join()
+    stderr = child.stderr.read()
+
+    stages = [event for event in events if "seconds" in event]
+    for stage in stages:
+        log("{:<16}{:>10.1f} ms{:>10.1f} ms cpu{:>10.1f} KB peak{:>9} blocks{:>9.1f} MB rss".format(
+            stage["stage"], stage["seconds"]*1e3, stage["cpuSeconds"]*1e3, stage["peakBytes"]/1024, stage["blocks"], stage["maxRSS"]/1024))
+
+    results = [event["result"] for event in events if "result" in event]
+    if error is None and not results:
+        lines = stderr.strip().splitlines()
+        error = "FAILED: " + (lines[-1] if lines else "child exited with code " + str(child.returncode))
+    return stages, results[0] if results else None, error
+
+def crossCheck(points, result, planner="curved"):
+    """
+    Checks the embedded results against the NumPy desktop planner.
+
+    Parameters
+    ----------
+    points : list[list[float]]
+        x, y and z coordinates of the points of the route
+    result : dict
+        result of runEmulation
+    planner : string = "curved"
+        "curved" or "linear" (the linear planner adds points, so only the original points are checked)
+
+    Returns
+    -------
+    errors : dict
+        Largest position error of the joint values at the points (m), coefficient error (relative to the largest
+        coefficient) and sampled value error (rad).
+    """
+
+    import numpy as np
+    sys.path.insert(0, repositoryDir)
+    from barretwam4 import BarretWAM_4
+    from trajectoryPlanner import TrajectoryPlanner
+
+    manip = BarretWAM_4()
+    desktopPlanner = TrajectoryPlanner(manip)
+    pathJointVals = np.array(result["pathJointVals"], dtype=float)
+    times = result["times"]
+    coeffs = np.array(result["coeffs"], dtype=float)
+
+    positions = np.asarray(manip.fkineBatch(pathJointVals))
+    if planner == "curved":
+        positionError = float(np.max(np.linalg.norm(positions - np.array(points), axis=1)))
+    else:
+        # Every point of the route must be reached by one of the planned points (the others are intermediate)
+        distances = np.linalg.norm(positions[None, :, :] - np.array(points)[:, None, :], axis=2)
+        positionError = float(np.max(np.min(distances, axis=1)))
+
+    desktopCoeffs = np.array([desktopPlanner._polynomialCurvesThroughJointValues(jointValues, times) for jointValues in pathJointVals.T])
+    coeffsError = float(np.max(np.abs(desktopCoeffs - coeffs))/max(np.max(np.abs(desktopCoeffs)), 1e-12))
+
+    values, _ = desktopPlanner.curvesValues(coeffs, times)
+    valuesError = float(np.max(np.abs(np.array(values) - np.array(result["values"]))))
+
+    return {"position": positionError, "coeffs": coeffsError, "values": valuesError}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Runs the embedded planner under emulated VF50 constraints and cross-checks it with the desktop planner.")
+    parser.add_argument("route", nargs="?", help="JSON file with the [x, y, z] points of the route (default: random route)")
+    parser.add_argument("--points", type=int, default=10, help="points of the random route (default: 10)")
+    parser.add_argument("--planner", choices=("curved", "linear"), default="curved", help="trajectory planner (default: curved)")
+    parser.add_argument("--throttle", type=float, default=8.0, help="CPU slowdown factor (default: 8)")
+    parser.add_argument("--memory-mb", type=int, default=128, help="address space limit in MB, 0 for none (default: 128)")
+    parser.add_argument("--rss-mb", type=float, default=64.0, help="peak RSS allowed in MB (default: 64)")
+    parser.add_argument("--cpu", type=int, default=0, help="core to pin the planner to, -1 to not pin it (default: 0)")
+    parser.add_argument("--timeout", type=float, default=60.0, help="maximum seconds of each stage (default: 60)")
+    parser.add_argument("--float32", action="store_true", help="run the embedded linalg in float32 mode")
+    parser.add_argument("--tolerance", type=float, help="largest error accepted by the cross-check (default: 1e-6, 1e-4 with --float32)")
+    parser.add_argument("--json", help="write the measurements and the cross-check to this JSON file")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        return _child(json.loads(args.child))
+
+    if args.route:
+        with open(args.route) as file:
+            points = json.load(file)
+    else:
+        from planningBenchmark import randomRoute
+        _, route = randomRoute(args.points)
+        points = [[point.x, point.y, point.z] for point in route]
+
+    print("route of " + str(len(points)) + " points, " + args.planner + " planner, throttle " + str(args.throttle) + "x, "
+          + (str(args.memory_mb) + " MB address space" if args.memory_mb else "no memory limit") + (", float32" if args.float32 else ""))
+    stages, result, error = runEmulation(points, args.planner, args.throttle, args.memory_mb or None, None if args.cpu < 0 else args.cpu, args.timeout, args.float32)
+
+    report = {"points": len(points), "planner": args.planner, "throttle": args.throttle, "memoryMB": args.memory_mb, "float32": args.float32,
+              "stages": stages, "error": error}
+    failures = [] if error is None else [error]
+    for stage in stages:
+        if stage["maxRSS"]/1024 > args.rss_mb:
+            failures.append("RSS of " + str(round(stage["maxRSS"]/1024, 1)) + " MB in stage " + stage["stage"] + " (limit " + str(args.rss_mb) + " MB)")
+
+    if result is not None:
+        tolerance = args.tolerance if args.tolerance is not None else (1e-4 if args.float32 else 1e-6)
+        errors = crossCheck(points, result, args.planner)
+        report["crossCheck"] = errors
+        print("cross-check: position " + "{:.2e}".format(errors["position"]) + " m, coeffs " + "{:.2e}".format(errors["coeffs"])
+              + ", values " + "{:.2e}".format(errors["values"]) + " rad (tolerance " + str(tolerance) + ")")
+        failures += [name + " error " + "{:.2e}".format(value) + " above tolerance" for name, value in errors.items() if not value <= tolerance]
+
+    report["failures"] = failures
+    for failure in failures:
+        print("FAIL: " + failure)
+    if not failures:
+        print("OK")
+
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(report, file, indent=2)
+
+    return 1 if failures else 0
+
+def _child(config):
+    import resource
+    import tracemalloc
+
+    if config["memoryMB"]:
+        limit = config["memoryMB"]*1024*1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    if config["cpu"] is not None and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, {config["cpu"]})
+
+    tracemalloc.start()
+    stage = _Stage(resource, tracemalloc)
+
+    def importEmbedded():
+        # The board has no numpy: the shared backend must run its pure Python kernels here too
+        os.environ["KT_BACKEND"] = "python"
+        sys.path.insert(0, embeddedDir)
+        import linalg
+        from point import Point
+        from barretwam4 import BarretWAM_4
+        from trajectoryPlanner import TrajectoryPlanner
+        from lineTrajectoryPlanner import LineTrajectoryPlanner
+        return linalg, Point, BarretWAM_4, TrajectoryPlanner, LineTrajectoryPlanner
+    linalg, Point, BarretWAM_4, TrajectoryPlanner, LineTrajectoryPlanner = stage("imports", importEmbedded)
+    linalg.set_float32(config["float32"])
+
+    manip = BarretWAM_4()
+    planner = (LineTrajectoryPlanner if config["planner"] == "linear" else TrajectoryPlanner)(manip)
+    pathPoints = [Point(*point) for point in config["points"]]
+    if config["planner"] == "linear":
+        def intermediatePoints():
+            withIntermediate = [pathPoints[0]]
+            for pointIndex in range(1, len(pathPoints)):
+                withIntermediate += [*planner._defineIntermediatePoints(pathPoints[pointIndex-1], pathPoints[pointIndex]), pathPoints[pointIndex]]
+            return withIntermediate
+        pathPoints = stage("intermediate", intermediatePoints)
+
+    if not stage("isInWorkspace", lambda: manip.isInWorkspace(pathPoints)):
+        raise ValueError("Route goes outside the workspace")
+    pathJointVals = stage("ikine", lambda: planner._calculateJointValuesOnPathPoints(pathPoints))
+    times = stage("durations", lambda: planner._estimateTrajectoryStepsDuration(pathPoints))
+
+    coeffs = stage("solve", lambda: [[list(curveCoeffs) for curveCoeffs in jointCoeffs] for jointCoeffs in planner._polynomialCurvesThroughJointValues(pathJointVals, times)])
+
+    values, _ = stage("curvesValues", lambda: planner.curvesValues(coeffs, times))
+    stage("curvesSamples", lambda: sum(1 for _ in planner.curvesSamples(coeffs, times)))
+
+    result = {"pathJointVals": [list(jointVals) for jointVals in zip(*pathJointVals)], "times": list(times), "coeffs": coeffs,
+              "values": [list(jointValues) for jointValues in values]}
+    # A line longer than the pipe can hold may be cut if the child is stopped (SIGSTOP) while writing it; writes of
+    # at most PIPE_BUF bytes are atomic, so they are either done whole or retried
+    line = json.dumps({"result": result}) + "\n"
+    for start in range(0, len(line), select.PIPE_BUF):
+        sys.stdout.write(line[start : start + select.PIPE_BUF])
+        sys.stdout.flush()
+    return 0
+
+class _Stage:
+    def __init__(self, resource, tracemalloc):
+        self._resource = resource
+        self._tracemalloc = tracemalloc
+
+    def __call__(self, name, function):
+        print(json.dumps({"stage": name}), flush=True)
+        self._tracemalloc.reset_peak()
+        blocks = sys.getallocatedblocks()
+        start, cpuStart = time.perf_counter(), time.process_time()
+        value = function()
+        seconds, cpuSeconds = time.perf_counter() - start, time.process_time() - cpuStart
+        measurements = {"stage": name, "seconds": seconds, "cpuSeconds": cpuSeconds, "peakBytes": self._tracemalloc.get_traced_memory()[1],
+                        "blocks": sys.getallocatedblocks() - blocks, "maxRSS": self._resource.getrusage(self._resource.RUSAGE_SELF).ru_maxrss}
+        print(json.dumps(measurements), flush=True)
+        return value
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,327 @@
+"""
+PlanningBenchmark
+-----------------
+
+Reproducible benchmarks of the kinematics, planning, sampling and linear algebra at several sizes, to tell whether
+a change makes them faster or slower.
+
+Cases (each at every size given for it):
+    fkine, ikine, isInWorkspace     BarretWAM_4, for N points or joint values           (--points)
+    curvedPlanner, linePlanner      trajectoryThroughPoints through N waypoints          (--waypoints)
+    linearSystem                    the curves of one joint through N waypoints, timing  (--waypoints)
+                                    already cached (with scipy, back-substitution only)
+    linearSystemCold                the same with a new planner (assembly and solve)     (--waypoints)
+    curvesValues                    curvesValues producing N samples                     (--samples)
+    embeddedSolve                   Embedded version/linalg.py solve_equations, N pts    (--waypoints)
+    boardSpline                     the curves of every joint through N waypoints with   (--waypoints)
+                                    backend.py's pure Python kernels (the board's solve)
+    numpySpline                     the same with backend.py's numpy kernels             (--waypoints)
+
+Routes are random walks in the joint space (fixed seed), so their points are always in the workspace and close to each
+other. Dense systems bigger than --max-dense unknowns (and embedded ones bigger than --max-embedded) are reported as
+skipped instead of exhausting the memory or running for hours.
+
+Every case is repeated until it has run for --min-time seconds (at least --repeat times); the median, minimum and the
+median per item are written to a JSON file. With --compare, the results are checked against a stored baseline and
+every case slower by more than --threshold (relative) is flagged as a regression (exit code 1).
+
+Usage:
+    python benchmarks/planningBenchmark.py [--quick] [--json results.json] [--compare baseline.json [--threshold 0.2]]
+                                           [--cases fkine curvedPlanner ...]
+"""
+
+import argparse
+import contextlib
+import importlib.util
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import numpy as np
+
+repositoryDir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, repositoryDir)
+
+import backend
+from barretwam4 import BarretWAM_4
+from trajectoryPlanner import TrajectoryPlanner
+from lineTrajectoryPlanner import LineTrajectoryPlanner
+from point import Point
+
+defaultPoints = (10, 100, 1000, 10000)
+defaultWaypoints = (2, 10, 100, 1000, 10000)
+defaultSamples = (100, 1000, 10000, 100000, 1000000)
+quickPoints = (10, 100)
+quickWaypoints = (2, 10, 100)
+quickSamples = (100, 10000)
+
+def randomRoute(numberOfPoints, seed=0):
+    """
+    Creates a route of points in the Barret-WAM's workspace by a random walk of its joint values.
+
+    Parameters
+    ----------
+    numberOfPoints : int
+        number of points of the route
+    seed : int = 0
+        seed of the random walk
+
+    Returns
+    -------
+    jointVals : numpy.ndarray (N x 4)
+        Joint values of each point.
+    points : list[Point]
+        Points of the route.
+    """
+
+    generator = np.random.default_rng(seed)
+    lower = np.array((-1.5, 0.3, 0.0, 0.2))
+    upper = np.array((1.5, 1.5, 0.0, 1.5))
+    jointVals = np.empty((numberOfPoints, 4))
+    jointVals[0] = (lower + upper)/2
+    for pointIndex in range(1, numberOfPoints):
+        step = generator.uniform(-0.02, 0.02, 4)
+        jointVals[pointIndex] = np.clip(jointVals[pointIndex - 1] + step, lower, upper)
+
+    manip = BarretWAM_4()
+    points = [Point(*position) for position in manip.fkineBatch(jointVals)]
+    return jointVals, points
+
+def measure(function, repeat=3, minTime=0.2):
+    """
+    Runs a function until it has run for minTime seconds and at least repeat times.
+
+    Parameters
+    ----------
+    function : callable()
+        function to measure
+    repeat : int = 3
+        minimum number of runs
+    minTime : float = 0.2
+        minimum total time of the runs
+
+    Returns
+    -------
+    times : list[float]
+        Time of each run.
+    """
+
+    times = []
+    while len(times) < repeat or sum(times) < minTime:
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return times
+
+def benchmarkCases(points, waypoints, samples, maxDense, maxEmbedded):
+    """
+    Lists the benchmark cases.
+
+    Parameters
+    ----------
+    points : tuple[int]
+        sizes of the kinematics cases
+    waypoints : tuple[int]
+        sizes of the planning and linear algebra cases
+    samples : tuple[int]
+        sizes of the sampling cases
+    maxDense : int
+        largest dense system (unknowns) to solve with numpy
+    maxEmbedded : int
+        largest dense system (unknowns) to solve with the embedded linalg
+
+    Returns
+    -------
+    cases : list[tuple]
+        (case, size, function or None, reason skipped) of each case.
+    """
+
+    manip = BarretWAM_4()
+    curvedPlanner = TrajectoryPlanner(manip)
+    linePlanner = LineTrajectoryPlanner(manip)
+    cases = []
+
+    for size in points:
+        jointVals, route = randomRoute(size)
+        joints = [BarretWAM_4.Joints(*values) for values in jointVals.tolist()]
+        cases.append(("fkine", size, lambda joints=joints: manip.fkine(joints), None))
+        cases.append(("ikine", size, lambda route=route: manip.ikine(route), None))
+        cases.append(("isInWorkspace", size, lambda route=route: manip.isInWorkspace(route), None))
+
+    for size in waypoints:
+        jointVals, route = randomRoute(size)
+        unknowns = 4*(size - 1)
+        tooBig = "dense system of " + str(unknowns) + " unknowns"
+        dense = unknowns <= maxDense
+        cases.append(("curvedPlanner", size, (lambda route=route: _quietly(curvedPlanner.trajectoryThroughPoints, route)) if dense else None, None if dense else tooBig))
+        cases.append(("linePlanner", size, (lambda route=route: _quietly(linePlanner.trajectoryThroughPoints, route)) if dense else None, None if dense else tooBig))
+
+        times = curvedPlanner._estimateTrajectoryStepsDuration(route)
+        values = jointVals[:, 0].tolist()
+        cases.append(("linearSystem", size, (lambda values=values, times=times: curvedPlanner._polynomialCurvesThroughJointValues(values, times)) if dense else None, None if dense else tooBig))
+        cases.append(("linearSystemCold", size, (lambda values=values, times=times: TrajectoryPlanner(manip)._polynomialCurvesThroughJointValues(values, times)) if dense else None, None if dense else tooBig))
+        embedded = unknowns <= maxEmbedded
+        cases.append(("embeddedSolve", size, _embeddedSolve(curvedPlanner, values, times) if embedded else None, None if embedded else tooBig))
+        cases.append(("boardSpline", size, _boardSpline(jointVals.T.tolist(), times), None))
+        cases.append(("numpySpline", size, lambda jointValues=jointVals.T, times=times: backend.splineCoefficients(jointValues, times), None))
+
+    for size in samples:
+        numberOfCurves = max(1, round((size - 1)/TrajectoryPlanner._numberOfPointsPerStepForCurveDrawing))
+        jointVals, route = randomRoute(numberOfCurves + 1)
+        if 4*numberOfCurves <= maxDense:
+            _, coeffs, times = _quietly(curvedPlanner.trajectoryThroughPoints, route)
+        else:
+            # Any cubic curves will do to measure the sampling
+            coeffs = np.zeros((4, numberOfCurves, 4))
+            coeffs[..., 0] = jointVals[:-1].T
+            times = [0.1] * numberOfCurves
+        cases.append(("curvesValues", size, lambda coeffs=coeffs, times=times: curvedPlanner.curvesValues(coeffs, times), None))
+
+    return cases
+
+def runBenchmarks(cases, repeat=3, minTime=0.2, selected=None, log=print):
+    """
+    Runs the benchmark cases.
+
+    Parameters
+    ----------
+    cases : list[tuple]
+        cases from benchmarkCases
+    repeat : int = 3
+        minimum number of runs of each case
+    minTime : float = 0.2
+        minimum total time of the runs of each case
+    selected : tuple[string] = None
+        names of the cases to run (all if not given)
+    log : callable(string) = print
+        called with a line for each case
+
+    Returns
+    -------
+    results : dict
+        Results of each case, keyed by "case[size]".
+    """
+
+    results = {}
+    for case, size, function, skipped in cases:
+        if selected and case not in selected:
+            continue
+        key = case + "[" + str(size) + "]"
+        if function is None:
+            results[key] = {"case": case, "size": size, "skipped": skipped}
+            log("{:<28}{:>14}".format(key, "skipped") + "  (" + skipped + ")")
+            continue
+
+        times = measure(function, repeat, minTime)
+        median = statistics.median(times)
+        results[key] = {"case": case, "size": size, "seconds": median, "minSeconds": min(times), "runs": len(times), "secondsPerItem": median/size}
+        log("{:<28}{:>11.3f} ms{:>14.3f} us/item{:>6} runs".format(key, median*1e3, median/size*1e6, len(times)))
+
+    return results
+
+def compareResults(results, baseline, threshold=0.2):
+    """
+    Compares results with a stored baseline.
+
+    Parameters
+    ----------
+    results : dict
+        results from runBenchmarks
+    baseline : dict
+        results stored by a previous run
+    threshold : float = 0.2
+        relative slowdown above which a case is a regression
+
+    Returns
+    -------
+    comparison : list[tuple]
+        (key, baseline seconds, seconds, ratio, regressed) of each case measured in both.
+    """
+
+    comparison = []
+    for key, result in results.items():
+        reference = baseline.get(key)
+        if reference is None or "seconds" not in result or "seconds" not in reference:
+            continue
+        ratio = result["seconds"]/reference["seconds"]
+        comparison.append((key, reference["seconds"], result["seconds"], ratio, ratio > 1 + threshold))
+    return comparison
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks kinematics, planning, sampling and linear algebra at several sizes.")
+    parser.add_argument("--points", type=int, nargs="+", help="sizes of the kinematics cases (default: " + " ".join(map(str, defaultPoints)) + ")")
+    parser.add_argument("--waypoints", type=int, nargs="+", help="sizes of the planning cases (default: " + " ".join(map(str, defaultWaypoints)) + ")")
+    parser.add_argument("--samples", type=int, nargs="+", help="sizes of the sampling cases (default: " + " ".join(map(str, defaultSamples)) + ")")
+    parser.add_argument("--quick", action="store_true", help="use small default sizes")
+    parser.add_argument("--cases", nargs="+", help="only run these cases")
+    parser.add_argument("--repeat", type=int, default=3, help="minimum runs of each case (default: 3)")
+    parser.add_argument("--min-time", type=float, default=0.2, help="minimum seconds of runs of each case (default: 0.2)")
+    parser.add_argument("--max-dense", type=int, default=4000, help="largest dense system solved with numpy (default: 4000 unknowns)")
+    parser.add_argument("--max-embedded", type=int, default=200, help="largest system solved with the embedded linalg (default: 200 unknowns)")
+    parser.add_argument("--json", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="compare with the results stored in this JSON file")
+    parser.add_argument("--threshold", type=float, default=0.2, help="relative slowdown flagged as a regression (default: 0.2)")
+    args = parser.parse_args(argv)
+
+    points = args.points or (quickPoints if args.quick else defaultPoints)
+    waypoints = args.waypoints or (quickWaypoints if args.quick else defaultWaypoints)
+    samples = args.samples or (quickSamples if args.quick else defaultSamples)
+
+    cases = benchmarkCases(points, waypoints, samples, args.max_dense, args.max_embedded)
+    results = runBenchmarks(cases, args.repeat, args.min_time, args.cases)
+    report = {"python": sys.version.split()[0], "numpy": np.__version__, "machine": platform.machine(), "platform": platform.platform(), "results": results}
+
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(report, file, indent=2)
+
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)["results"]
+        comparison = compareResults(results, baseline, args.threshold)
+        print("\n{:<28}{:>14}{:>14}{:>9}".format("case", "baseline (ms)", "now (ms)", "ratio"))
+        for key, reference, seconds, ratio, regressed in comparison:
+            print("{:<28}{:>14.3f}{:>14.3f}{:>8.2f}x".format(key, reference*1e3, seconds*1e3, ratio) + ("  REGRESSION" if regressed else ""))
+        regressions = sum(regressed for *_, regressed in comparison)
+        print(str(regressions) + " regression(s) above " + str(round(args.threshold*100)) + "%")
+        return 1 if regressions else 0
+
+    return 0
+
+def _quietly(function, *args):
+    # The planners report workspace problems by printing
+    with contextlib.redirect_stdout(io.StringIO()):
+        return function(*args)
+
+def _embeddedSolve(planner, values, times):
+    embeddedDir = os.path.join(repositoryDir, "Embedded version")
+    if embeddedDir not in sys.path:
+        sys.path.append(embeddedDir)
+    import linalg
+
+    numberOfCurves = len(values) - 1
+    A, b = planner._linearSystem(numberOfCurves, values, times)
+    A, b = linalg.as_matrix(A.tolist()), linalg.as_matrix(b[:, None].tolist())
+    return lambda: linalg.solve_equations(A, b)
+
+def _boardSpline(jointValues, times):
+    # A copy of the embedded backend.py loaded without numpy, as on the board (this process has the numpy one)
+    embeddedBackend = os.path.join(repositoryDir, "Embedded version", "backend.py")
+    spec = importlib.util.spec_from_file_location("boardBackend", embeddedBackend)
+    boardBackend = importlib.util.module_from_spec(spec)
+    previous = os.environ.get("KT_BACKEND")
+    os.environ["KT_BACKEND"] = "python"
+    try:
+        spec.loader.exec_module(boardBackend)
+    finally:
+        if previous is None:
+            del os.environ["KT_BACKEND"]
+        else:
+            os.environ["KT_BACKEND"] = previous
+    return lambda: boardBackend.splineCoefficients(jointValues, times)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,93 @@
+"""
+StartupBenchmark
+----------------
+
+Measures how long a fresh Python process takes to import the planning modules, to keep planning-only processes
+(batch runs, workers, services) free of the plotting stack.
+
+For each module, runs `python -X importtime -c "import <module>"` several times in new processes and reports
+the median wall time of the process (minus the median of an empty process) and the median cumulative import time
+of the module as reported by -X importtime. Also reports whether matplotlib was imported.
+
+Usage:
+    python benchmarks/startupBenchmark.py [--repeat N] [--json results.json] [modules ...]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+repositoryDir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+defaultModules = ("trajectoryPlanner", "lineTrajectoryPlanner", "batch", "parallelPlanner", "trajectoryPlot")
+
+def measureImport(module, repeat=5):
+    """
+    Measures the startup cost of importing a module in a fresh interpreter.
+
+    Parameters
+    ----------
+    module : string
+        name of the module to import (None for an empty process)
+    repeat : int = 5
+        number of processes to run
+
+    Returns
+    -------
+    wallSeconds : float
+        Median wall time of the whole process.
+    importSeconds : float
+        Median cumulative import time of the module (0 for an empty process).
+    importsMatplotlib : bool
+        Whether matplotlib was imported.
+    """
+
+    code = "pass" if module is None else "import " + module
+    wallTimes = []
+    importTimes = []
+    importsMatplotlib = False
+    for _ in range(repeat):
+        start = time.perf_counter()
+        process = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=repositoryDir, capture_output=True, text=True, check=True)
+        wallTimes.append(time.perf_counter() - start)
+
+        cumulative = 0
+        for line in process.stderr.splitlines():
+            # import time: self [us] | cumulative | imported package
+            fields = line.removeprefix("import time:").split("|")
+            if len(fields) != 3 or not fields[1].strip().isdigit():
+                continue
+            name = fields[2].strip()
+            if name == module:
+                cumulative = int(fields[1])
+            if name.split(".")[0] == "matplotlib":
+                importsMatplotlib = True
+        importTimes.append(cumulative*1e-6)
+
+    return statistics.median(wallTimes), statistics.median(importTimes), importsMatplotlib
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measures the import cost of the planning modules in fresh processes.")
+    parser.add_argument("modules", nargs="*", default=defaultModules, help="modules to import (default: the planning modules)")
+    parser.add_argument("--repeat", type=int, default=5, help="processes per module (default: 5)")
+    parser.add_argument("--json", help="also write the results to this JSON file")
+    args = parser.parse_args(argv)
+
+    emptyWall, _, _ = measureImport(None, args.repeat)
+    results = {"python": sys.version.split()[0], "emptyProcessSeconds": emptyWall, "modules": {}}
+    print("empty process: " + "{:.1f}".format(emptyWall*1e3) + " ms")
+    print("{:<24}{:>14}{:>14}  matplotlib".format("module", "startup (ms)", "import (ms)"))
+    for module in args.modules:
+        wall, imports, importsMatplotlib = measureImport(module, args.repeat)
+        results["modules"][module] = {"startupSeconds": wall - emptyWall, "importSeconds": imports, "importsMatplotlib": importsMatplotlib}
+        print("{:<24}{:>14.1f}{:>14.1f}  {}".format(module, (wall - emptyWall)*1e3, imports*1e3, "yes" if importsMatplotlib else "no"))
+
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(results, file, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""
+CoeffsWire
+----------
+
+Compact binary format to ship planned trajectories (the polynomial coefficients and durations of the curves) from the
+workstation to the embedded board, so that the board only evaluates the curves and never builds or solves a linear system.
+
+Pure Python (struct and binascii only), so the same module runs on both sides.
+
+Layout (little-endian):
+    magic           4 bytes     b"KTCF"
+    version         uint8       1
+    flags           uint8       bit 0: values are float32 (float64 otherwise)
+    dof             uint16      number of joints
+    numberOfCurves  uint32      number of curves of each joint
+    times           numberOfCurves floats
+    coeffs          dof x numberOfCurves x 4 floats (joint by joint, curve by curve, c0 to c3)
+    checksum        uint32      CRC-32 of everything before it
+
+A plan of a 4 DOF manipulator takes 12 + 4*(1 + 16)*numberOfCurves + 4 bytes in float32 (about 7 KB for 100 curves),
+twice that in float64.
+"""
+
+import struct
+import binascii
+
+_magic = b"KTCF"
+_version = 1
+_float32Flag = 1
+_header = struct.Struct("<4sBBHI")
+_checksum = struct.Struct("<I")
+
+def encodePlan(coeffs, times, float32=False):
+    """
+    Packs the coefficients and durations of a planned trajectory.
+
+    Parameters
+    ----------
+    coeffs : tuple[tuple[tuple[float]]]
+        polynomial coefficients for each curve of each joint
+    times : tuple[float]
+        duration of each curve
+    float32 : bool = False
+        whether to store the values in single precision (half the size)
+
+    Returns
+    -------
+    data : bytes
+        Packed plan.
+    """
+
+    numberOfCurves = len(times)
+    valueFormat = "f" if float32 else "d"
+    flatCoeffs = []
+    for jointCoeffs in coeffs:
+        if len(jointCoeffs) != numberOfCurves:
+            raise ValueError("Every joint needs one set of coefficients per curve!")
+        for curveCoeffs in jointCoeffs:
+            flatCoeffs.extend(float(coeff) for coeff in curveCoeffs[:4])
+
+    data = _header.pack(_magic, _version, _float32Flag if float32 else 0, len(coeffs), numberOfCurves)
+    data += struct.pack("<" + str(numberOfCurves + len(flatCoeffs)) + valueFormat, *[float(time) for time in times], *flatCoeffs)
+    return data + _checksum.pack(binascii.crc32(data) & 0xffffffff)
+
+def decodePlan(data):
+    """
+    Unpacks a plan packed by encodePlan, checking its checksum.
+
+    Parameters
+    ----------
+    data : bytes
+        packed plan
+
+    Returns
+    -------
+    coeffs : list[list[list[float]]]
+        Polynomial coefficients for each curve of each joint.
+    times : list[float]
+        Duration of each curve.
+    """
+
+    if len(data) < _header.size + _checksum.size or data[:len(_magic)] != _magic:
+        raise ValueError("Data is not a packed plan!")
+    _, version, flags, dof, numberOfCurves = _header.unpack_from(data, 0)
+    if version != _version:
+        raise ValueError("Unsupported plan version " + str(version) + "!")
+
+    valueFormat = "f" if flags & _float32Flag else "d"
+    numberOfValues = numberOfCurves*(1 + 4*dof)
+    payloadSize = _header.size + struct.calcsize("<" + str(numberOfValues) + valueFormat)
+    if len(data) != payloadSize + _checksum.size:
+        raise ValueError("Packed plan has the wrong size!")
+    checksum, = _checksum.unpack_from(data, payloadSize)
+    if binascii.crc32(data[:payloadSize]) & 0xffffffff != checksum:
+        raise ValueError("Packed plan is corrupted (checksum mismatch)!")
+
+    values = struct.unpack_from("<" + str(numberOfValues) + valueFormat, data, _header.size)
+    times = list(values[:numberOfCurves])
+    coeffs = []
+    for jointIndex in range(dof):
+        start = numberOfCurves*(1 + 4*jointIndex)
+        coeffs.append([list(values[start + 4*curveIndex : start + 4*(curveIndex+1)]) for curveIndex in range(numberOfCurves)])
+
+    return coeffs, times
+
+def savePlan(fileName, coeffs, times, float32=False):
+    """
+    Packs a planned trajectory (see encodePlan) and writes it to a file.
+
+    Parameters
+    ----------
+    fileName : string
+        file to write
+    coeffs : tuple[tuple[tuple[float]]]
+        polynomial coefficients for each curve of each joint
+    times : tuple[float]
+        duration of each curve
+    float32 : bool = False
+        whether to store the values in single precision (half the size)
+
+    Returns
+    -------
+    size : int
+        Number of bytes written.
+    """
+
+    data = encodePlan(coeffs, times, float32)
+    with open(fileName, "wb") as file:
+        file.write(data)
+    return len(data)
+
+def loadPlan(fileName):
+    """
+    Reads a planned trajectory written by savePlan (see decodePlan).
+
+    Parameters
+    ----------
+    fileName : string
+        file to read
+
+    Returns
+    -------
+    coeffs : list[list[list[float]]]
+        Polynomial coefficients for each curve of each joint.
+    times : list[float]
+        Duration of each curve.
+    """
+
+    with open(fileName, "rb") as file:
+        return decodePlan(file.read())
@@ -0,0 +1,206 @@
+import numpy as np
+from manipulator import Manipulator
+
+class DampedLeastSquaresIK:
+    """
+    A class to numerically solve the inverse kinematics (end-effector position only) of a manipulator without a closed form
+
+    ...
+
+    Each iteration moves the joints by dq = J.T @ inv(J @ J.T + damping² I) @ error, which stays well behaved
+    close to singularities and works for redundant manipulators (dof > 3). Every target of a batch iterates at once;
+    samples along a path can instead be warm-started from the previous sample's solution, so they usually converge
+    in a couple of iterations.
+
+    Attributes
+    ----------
+    manip : Manipulator
+        manipulator to solve, must implement fkineBatch and jacobian
+    damping : float
+        damping factor of the least squares steps
+    tolerance : float
+        distance (m) from the target under which a sample is considered solved
+    maxIterations : int
+        maximum number of iterations of each sample (from each seed)
+    maxStep : float
+        maximum norm of the joint displacement in one iteration
+
+    Methods
+    -------
+    solve(targets, initialJointVals=None, warmStart=False):
+        Calculates joint values that take the end-effector to each of the targets.
+    """
+
+    _numberOfRestarts = 8
+
+    def __init__(self, manip : Manipulator, damping = 0.05, tolerance = 1e-6, maxIterations = 100, maxStep = 0.3):
+        self._manip = manip
+        self._damping = damping
+        self._tolerance = tolerance
+        self._maxIterations = maxIterations
+        self._maxStep = maxStep
+
+        jointLims = np.array(manip.jointLims, dtype=float)
+        self._lowerLims = jointLims[:, 0]
+        self._upperLims = jointLims[:, 1]
+
+    @property
+    def damping(self):
+        return self._damping
+
+    @property
+    def tolerance(self):
+        return self._tolerance
+
+    @property
+    def maxIterations(self):
+        return self._maxIterations
+
+    @property
+    def maxStep(self):
+        return self._maxStep
+
+    def solve(self, targets, initialJointVals = None, warmStart = False):
+        """
+        Calculates joint values that take the end-effector to each of the targets.
+        Samples that do not converge from their seed are retried from a few other seeds spread over the joint limits.
+
+        Parameters
+        ----------
+        targets : array_like (N x 3)
+            x, y and z coordinates of each target.
+        initialJointVals : array_like (dof) | (N x dof) = None
+            seed of the iterations (the middle of the joint limits if not given). With warmStart, only the first sample uses it.
+        warmStart : bool = False
+            whether to solve the samples in order, each one starting from the previous one's solution (for points along a path),
+            instead of solving all of them at once from the given seed.
+
+        Returns
+        -------
+        jointVals : numpy.ndarray (N x dof)
+            joint values found for each target (best attempt for the samples that did not converge).
+        statistics : IKStatistics
+            convergence and iteration count of each sample.
+        """
+
+        targets = np.atleast_2d(np.asarray(targets, dtype=float))
+        if initialJointVals is None:
+            initialJointVals = (self._lowerLims + self._upperLims)/2
+        seeds = np.broadcast_to(np.asarray(initialJointVals, dtype=float), (len(targets), self._manip.dof))
+
+        if warmStart:
+            jointVals = np.empty((len(targets), self._manip.dof))
+            iterations = np.empty(len(targets), dtype=int)
+            residuals = np.empty(len(targets))
+            seed = seeds[0]
+            for sampleIndex in range(len(targets)):
+                result = self._iterate(targets[sampleIndex:sampleIndex+1], seed[None, :])
+                jointVals[sampleIndex], iterations[sampleIndex], residuals[sampleIndex] = result[0][0], result[1][0], result[2][0]
+                if residuals[sampleIndex] <= self._tolerance:
+                    seed = jointVals[sampleIndex]
+        else:
+            jointVals, iterations, residuals = self._iterate(targets, seeds)
+
+        self._restartUnconverged(targets, jointVals, iterations, residuals)
+
+        return jointVals, IKStatistics(iterations, residuals, residuals <= self._tolerance)
+
+    def _iterate(self, targets, jointVals):
+        jointVals = np.array(jointVals, dtype=float)
+        iterations = np.zeros(len(targets), dtype=int)
+        residuals = np.full(len(targets), np.inf)
+        active = np.arange(len(targets))
+        dampingSquared = self._damping**2*np.eye(3)
+
+        for iteration in range(self._maxIterations + 1):
+            error = targets[active] - self._manip.fkineBatch(jointVals[active])
+            residuals[active] = np.linalg.norm(error, axis=1)
+
+            # Samples leave the batch as soon as they converge, so the rest keep iterating on smaller arrays
+            stillActive = residuals[active] > self._tolerance
+            active, error = active[stillActive], error[stillActive]
+            if len(active) == 0 or iteration == self._maxIterations:
+                break
+
+            J = self._manip.jacobian(jointVals[active])
+            JT = np.transpose(J, (0, 2, 1))
+            step = np.einsum("nij,nj->ni", JT, np.linalg.solve(J @ JT + dampingSquared, error[..., None])[..., 0])
+            stepNorm = np.linalg.norm(step, axis=1, keepdims=True)
+            step *= np.minimum(1, self._maxStep/np.maximum(stepNorm, 1e-300))
+
+            jointVals[active] = np.clip(jointVals[active] + step, self._lowerLims, self._upperLims)
+            iterations[active] += 1
+
+        return jointVals, iterations, residuals
+
+    def _restartUnconverged(self, targets, jointVals, iterations, residuals):
+        generator = np.random.default_rng(0)
+        for _ in range(DampedLeastSquaresIK._numberOfRestarts):
+            unconverged = np.flatnonzero(residuals > self._tolerance)
+            if len(unconverged) == 0:
+                return
+
+            seeds = generator.uniform(self._lowerLims, self._upperLims, (len(unconverged), self._manip.dof))
+            newJointVals, newIterations, newResiduals = self._iterate(targets[unconverged], seeds)
+            iterations[unconverged] += newIterations
+            better = newResiduals < residuals[unconverged]
+            jointVals[unconverged[better]] = newJointVals[better]
+            residuals[unconverged[better]] = newResiduals[better]
+
+
+class IKStatistics:
+    """
+    A class to represent the convergence statistics of a numerical inverse kinematics solution
+
+    ...
+
+    Attributes
+    ----------
+    iterations : numpy.ndarray (N)
+        number of iterations spent on each sample (including restarts)
+    residuals : numpy.ndarray (N)
+        final distance (m) from each target
+    converged : numpy.ndarray (N)
+        whether each sample converged
+    numberOfConverged : int
+        number of samples that converged
+    totalIterations : int
+        number of iterations spent on all samples
+
+    Implemented Operations
+    ----------------------
+    str : string = str(IKStatistics)
+        S = "converged/N converged ; iterations: total (mean per sample, max) ; max residual: r".
+    """
+
+    def __init__(self, iterations, residuals, converged):
+        self._iterations = iterations
+        self._residuals = residuals
+        self._converged = converged
+
+    @property
+    def iterations(self):
+        return self._iterations
+
+    @property
+    def residuals(self):
+        return self._residuals
+
+    @property
+    def converged(self):
+        return self._converged
+
+    @property
+    def numberOfConverged(self):
+        return int(np.count_nonzero(self._converged))
+
+    @property
+    def totalIterations(self):
+        return int(np.sum(self._iterations))
+
+    def __str__(self):
+        if len(self._iterations) == 0:
+            return "0/0 converged"
+        return (str(self.numberOfConverged) + "/" + str(len(self._converged)) + " converged ; iterations: " + str(self.totalIterations)
+                + " (" + str(round(float(np.mean(self._iterations)), 2)) + " per sample, max " + str(int(np.max(self._iterations))) + ")"
+                + " ; max residual: " + "{:.2e}".format(float(np.max(self._residuals))))
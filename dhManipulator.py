@@ -0,0 +1,416 @@
+import numpy as np
+from math import cos, sin, degrees
+from point import Point
+from joints import Joints_
+from manipulator import Manipulator
+from dampedLeastSquaresIK import DampedLeastSquaresIK
+
+class DHManipulator(Manipulator):
+    """
+    A class to represent a generic serial manipulator described by its Denavit-Hartenberg table
+
+    ...
+
+    Attributes
+    ----------
+    name : string
+        name of the manipulator
+    dof : int
+        manipulator's number of degrees of freedom (number of rows of the DH table)
+    dhTable : tuple[tuple[float]]
+        standard DH parameters (a, alpha, d, theta) of each link; the joint value is added to theta (rotative joint) or to d (prismatic joint)
+    jointTypes : tuple[bool]
+        indicates the type of the joints; True = rotative, False = prismatic
+    jointLims : tuple[tuple[float]]
+        indicates the limits of the joints
+    jointVelLims : tuple[float] | None
+        indicates the maximum absolute velocity of each joint (None if not declared)
+    jointAccLims : tuple[float] | None
+        indicates the maximum absolute acceleration of each joint (None if not declared)
+    speed : float
+        avarage speed of the manipulator's end-effector
+    ikineStatistics : IKStatistics | None
+        convergence statistics of the last call to ikine
+
+    Methods
+    -------
+    isInWorkspace(point):
+        Verifies if the given point is inside of the manipulator's workspace.
+        If argument is a iterable, verify all points.
+    fkine(jointVals):
+        Calculates the manipulator's end-effector position in the space for given joint values - forward kinematics.
+        If argument is a iterable, apply method to all values.
+    fkineBatch(jointVals):
+        Calculates the manipulator's end-effector positions for an (N x dof) array of joint values.
+    framePositions(jointVals):
+        Calculates the position of every link frame (base to end-effector) for an (N x dof) array of joint values.
+    ikine(point):
+        Calculates the manipulator's joint values for given end-effector position in the space - inverse kinematics (numerical).
+        If argument is a iterable, apply method to all points, each one starting from the previous one's solution.
+    jacobian(jointVals):
+        Calculates the manipulator's end-effector linear velocity jacobian for an (N x dof) array of joint values.
+
+    Inner Class
+    -----------
+    Joints:
+        A structure that stores the manipulator's joint values.
+
+    Implemented Operations
+    ----------------------
+    str : string = str(DHManipulator)
+        S = "manip.name".
+
+    Example
+    -------
+    The Barret-WAM (4 DOF) of BarretWAM_4 is described by:
+        DHManipulator("Barret-WAM (4 DOF)", ((0, -pi/2, 0, 0), (0, pi/2, 0, 0), (0, -pi/2, 0.55, 0), (0.35, 0, 0, 0)),
+                      (True, True, True, True), BarretWAM_4._manipJointLims)
+    """
+
+    def __init__(self, name, dhTable, jointTypes, jointLims, speed = 0.05, jointVelLims = None, jointAccLims = None, ikSolver = None):
+        if len(dhTable) != len(jointTypes) or len(dhTable) != len(jointLims):
+            raise ValueError("DH table, joint types and joint limits must have one entry per joint")
+
+        super().__init__(name, len(dhTable), tuple(jointTypes), tuple(jointLims), speed, jointVelLims, jointAccLims)
+        self._dhTable = tuple(tuple(float(param) for param in link) for link in dhTable)
+
+        # Each instance gets its own Joints structure, bound to its number of joints and limits
+        self.Joints = type("Joints", (DHManipulator.Joints,), {"_jointTypes": self._jointTypes, "_jointLims": self._jointLims})
+
+        # Kernels are generated once, here, so that evaluating them is a flat sequence of array operations
+        self._positionKernelSource = _DHKernelBuilder(self._dhTable, self._jointTypes).build(framesOnly=False)
+        self._framesKernelSource = _DHKernelBuilder(self._dhTable, self._jointTypes).build(framesOnly=True)
+        self._positionKernel = _compileKernel(self._positionKernelSource, name)
+        self._framesKernel = _compileKernel(self._framesKernelSource, name)
+
+        self._ikSolver = DampedLeastSquaresIK(self) if ikSolver is None else ikSolver
+        self._ikineStatistics = None
+
+    @property
+    def dhTable(self):
+        return self._dhTable
+
+    @property
+    def ikineStatistics(self):
+        return self._ikineStatistics
+
+    class Joints(Joints_):
+        """
+        A class to represent the manipulator's joint values.
+
+        ...
+
+        Attributes
+        ----------
+        joints : list[float]
+            Manipulator's joint values, only accepts values within limits.
+
+        Implemented Operations
+        ----------------------
+        getItem : float|int = Joints[int]
+            val = joints[idx].
+        setItem : Joints[int] = float|int
+            joints[idx] = val (only accepts values within limits).
+        iterator : Iterator = iter(Joints)
+            iter = joints (iterates over the joint values).
+        str : string = str(Joints)
+            S = "(joints[0] ; joints[1] ; ... ; joints[dof-1])".
+        """
+
+        _jointTypes = ()
+        _jointLims = ()
+
+        def __init__(self, *jointVals):
+            super().__init__(len(self._jointLims))
+            for index, qx in enumerate(jointVals):
+                self[index] = qx
+
+        def __setitem__(self, index, qx):
+            if qx == None:
+                return
+            elif qx >= self._jointLims[index][0] and qx <= self._jointLims[index][1]:
+                self._joints[index] = qx
+            else:
+                raise ValueError("Joint values are outside of workspace!")
+
+        def __str__(self):
+            string = "("
+            for joint, jointType in zip(self._joints, self._jointTypes):
+                jointFormatted = ""
+                if jointType:
+                    jointFormatted += str(round(degrees(joint), 2)) + "º"
+                else:
+                    jointFormatted += str(round(joint, 2)) + "m"
+                string += jointFormatted + " ; "
+            string = string.removesuffix(" ; ")
+            string += ")"
+            return string
+
+    def isInWorkspace(self, point:Point | tuple[Point]):
+        """
+        Verifies if the given point is inside of the manipulator's workspace.
+        If argument is a iterable, verify all points.
+
+        Parameters
+        ----------
+        point : Point | Iterable[Point]
+            x, y and z coordinates of a point in 3D space for the end-effector.
+
+        Returns
+        -------
+        isInWorkspace : bool
+            Whether given point(s) is(are) inside of the workspace.
+        """
+
+        try:
+            self.ikine(point)
+            return True
+        except ValueError:
+            return False
+
+    def fkine(self, jointVals:Joints_ | tuple[Joints_]):
+        """
+        Calculates the manipulator's end-effector position in the space for given joint values - forward kinematics.
+        If argument is a iterable, apply method to all values.
+
+        Parameters
+        ----------
+        jointVals : DHManipulator.Joints | Iterable[DHManipulator.Joints]
+            manipulator's joint values.
+
+        Returns
+        -------
+        point : Point | Iterable[Point]
+            x, y and z coordinates of point(s) in 3D space for the manipulator's end-effector given values.
+        """
+
+        if isinstance(jointVals, DHManipulator.Joints):
+            return Point(*self.fkineBatch([list(jointVals)])[0].tolist())
+
+        elif type(jointVals) == tuple or type(jointVals) == list:
+            if len(jointVals) == 0:
+                return []
+            positions = self.fkineBatch([list(thisJointVals) for thisJointVals in jointVals])
+            return [Point(*position) for position in positions.tolist()]
+
+        else:
+            raise TypeError("fkine can only operate on Joints, tuple[Joints] or list[Joints]")
+
+    def fkineBatch(self, jointVals):
+        """
+        Calculates the manipulator's end-effector positions for an (N x dof) array of joint values.
+
+        Parameters
+        ----------
+        jointVals : array_like (N x dof)
+            manipulator's joint values, one row per configuration.
+
+        Returns
+        -------
+        positions : numpy.ndarray (N x 3)
+            x, y and z coordinates of the end-effector for each configuration.
+        """
+
+        q = np.atleast_2d(np.asarray(jointVals, dtype=float))
+        return _stackKernelOutputs(self._positionKernel(q), len(q))[:, 0, :]
+
+    def framePositions(self, jointVals):
+        """
+        Calculates the position of every link frame (base to end-effector) for an (N x dof) array of joint values.
+
+        Parameters
+        ----------
+        jointVals : array_like (N x dof)
+            manipulator's joint values, one row per configuration.
+
+        Returns
+        -------
+        positions : numpy.ndarray (N x (dof+1) x 3)
+            x, y and z coordinates of the origin of each frame for each configuration, the last one being the end-effector.
+        """
+
+        q = np.atleast_2d(np.asarray(jointVals, dtype=float))
+        return _stackKernelOutputs(self._framesKernel(q), len(q))[:, :self._dof + 1, :]
+
+    def ikine(self, point:Point | tuple[Point]):
+        """
+        Calculates the manipulator's joint values for given end-effector position in the space - inverse kinematics.
+        If argument is a iterable, apply method to all points.
+
+        There is no closed form for a generic DH table, so the joint values are found with damped least squares iterations.
+        Points of an iterable are taken as a path: each one starts from the previous one's solution.
+        The convergence statistics are kept in ikineStatistics.
+
+        Parameters
+        ----------
+        point : Point | Iterable[Point]
+            x, y and z coordinates of point(s) in 3D space for the end-effector.
+
+        Returns
+        -------
+        jointVals : DHManipulator.Joints | Iterable[DHManipulator.Joints]
+            manipulator's joint values for the given point.
+        """
+
+        if type(point) == Point:
+            return self.ikine([point])[0]
+
+        elif type(point) == tuple or type(point) == list:
+            if len(point) == 0:
+                return []
+            targets = [[thisPoint.x, thisPoint.y, thisPoint.z] for thisPoint in point]
+            jointVals, self._ikineStatistics = self._ikSolver.solve(targets, warmStart=True)
+            if self._ikineStatistics.numberOfConverged < len(targets):
+                raise ValueError("Point is outside of workspace!")
+            return [self.Joints(*thisJointVals) for thisJointVals in jointVals.tolist()]
+
+        else:
+            raise TypeError("ikine can only operate on Point, tuple[Point] or list[Point]")
+
+    def jacobian(self, jointVals):
+        """
+        Calculates the manipulator's end-effector linear velocity jacobian for an (N x dof) array of joint values.
+        The end-effector velocity is v = J @ qd.
+
+        Parameters
+        ----------
+        jointVals : array_like (N x dof)
+            manipulator's joint values, one row per configuration.
+
+        Returns
+        -------
+        J : numpy.ndarray (N x 3 x dof)
+            Geometric jacobian (linear part) for each configuration.
+        """
+
+        q = np.atleast_2d(np.asarray(jointVals, dtype=float))
+        frames = _stackKernelOutputs(self._framesKernel(q), len(q))
+        origins = frames[:, :self._dof + 1, :]
+        zAxes = frames[:, self._dof + 1:, :]
+
+        # Joint i moves about (or along) the z axis of frame i-1
+        J = np.empty((len(q), 3, self._dof))
+        for jointIndex in range(self._dof):
+            if self._jointTypes[jointIndex]:
+                J[:, :, jointIndex] = np.cross(zAxes[:, jointIndex], origins[:, -1] - origins[:, jointIndex])
+            else:
+                J[:, :, jointIndex] = zAxes[:, jointIndex]
+
+        return J
+
+
+class _DHKernelBuilder:
+    _snapTolerance = 1e-12
+
+    def __init__(self, dhTable, jointTypes):
+        self._dhTable = dhTable
+        self._jointTypes = jointTypes
+        self._lines = []
+        self._products = {}
+        self._numberOfTemporaries = 0
+
+    def build(self, framesOnly):
+        lines = ["def kernel(q):"]
+        T = [[1.0, 0.0, 0.0, 0.0],
+             [0.0, 1.0, 0.0, 0.0],
+             [0.0, 0.0, 1.0, 0.0]]
+        origins = [[T[row][3] for row in range(3)]]
+        zAxes = [[T[row][2] for row in range(3)]]
+
+        for jointIndex, (a, alpha, d, theta) in enumerate(self._dhTable):
+            cosAlpha, sinAlpha = self._snap(cos(alpha)), self._snap(sin(alpha))
+            if self._jointTypes[jointIndex]:
+                cosTheta = self._emit("cos(q[:, %d] + %r)" % (jointIndex, theta) if theta else "cos(q[:, %d])" % jointIndex)
+                sinTheta = self._emit("sin(q[:, %d] + %r)" % (jointIndex, theta) if theta else "sin(q[:, %d])" % jointIndex)
+                offset = d
+            else:
+                cosTheta, sinTheta = self._snap(cos(theta)), self._snap(sin(theta))
+                offset = self._emit("q[:, %d] + %r" % (jointIndex, d) if d else "q[:, %d]" % jointIndex)
+
+            link = [[cosTheta, self._neg(self._mul(sinTheta, cosAlpha)), self._mul(sinTheta, sinAlpha), self._mul(a, cosTheta)],
+                    [sinTheta, self._mul(cosTheta, cosAlpha), self._neg(self._mul(cosTheta, sinAlpha)), self._mul(a, sinTheta)],
+                    [0.0, sinAlpha, cosAlpha, offset]]
+
+            T = [[self._add([self._mul(T[row][k], link[k][col]) for k in range(3)] + ([T[row][3]] if col == 3 else []))
+                  for col in range(4)] for row in range(3)]
+            origins.append([T[row][3] for row in range(3)])
+            zAxes.append([T[row][2] for row in range(3)])
+
+        outputs = origins + zAxes if framesOnly else [origins[-1]]
+        body = self._eliminateDeadCode(outputs)
+        lines += ["    " + line for line in body]
+        lines.append("    return (" + ", ".join("(" + ", ".join(self._format(entry) for entry in output) + ")" for output in outputs) + ",)")
+
+        return "\n".join(lines) + "\n"
+
+    def _snap(self, value):
+        for exact in (-1.0, 0.0, 1.0):
+            if abs(value - exact) < _DHKernelBuilder._snapTolerance:
+                return exact
+        return value
+
+    def _emit(self, expression):
+        name = "t" + str(self._numberOfTemporaries)
+        self._numberOfTemporaries += 1
+        self._lines.append((name, expression))
+        return name
+
+    def _mul(self, x, y):
+        if isinstance(x, float) and isinstance(y, float):
+            return x*y
+        if isinstance(y, float):
+            x, y = y, x
+        if x == 0.0:
+            return 0.0
+        if x == 1.0:
+            return y
+        if x == -1.0:
+            return self._neg(y)
+
+        # Signs are carried on the names instead of being computed, and products are memoised,
+        # so each distinct product is computed only once however many entries use it
+        negative = isinstance(x, float) and x < 0 or isinstance(x, str) and x.startswith("-")
+        negative ^= y.startswith("-")
+        key = tuple(sorted((self._format(abs(x)) if isinstance(x, float) else x.lstrip("-"), y.lstrip("-"))))
+        if key not in self._products:
+            self._products[key] = self._emit(key[0] + "*" + key[1])
+        return self._neg(self._products[key]) if negative else self._products[key]
+
+    def _neg(self, x):
+        if isinstance(x, float):
+            return -x
+        return x[1:] if x.startswith("-") else "-" + x
+
+    def _add(self, terms):
+        constant = sum(term for term in terms if isinstance(term, float))
+        variables = [term for term in terms if not isinstance(term, float)]
+        if not variables:
+            return constant
+        if constant:
+            variables.append(constant)
+        if len(variables) == 1:
+            return variables[0]
+        return self._emit(" + ".join(self._format(term) for term in variables).replace("+ -", "- "))
+
+    def _format(self, entry):
+        return repr(entry) if isinstance(entry, float) else entry
+
+    def _eliminateDeadCode(self, outputs):
+        needed = {entry.lstrip("-") for output in outputs for entry in output if not isinstance(entry, float)}
+        body = []
+        for name, expression in reversed(self._lines):
+            if name in needed:
+                body.append(name + " = " + expression)
+                needed.update(token for token in expression.replace("*", " ").replace("+", " ").replace("-", " ").split() if token.startswith("t"))
+
+        return body[::-1]
+
+
+def _compileKernel(source, name):
+    namespace = {"cos": np.cos, "sin": np.sin}
+    exec(compile(source, "<DH kernel of " + name + ">", "exec"), namespace)
+    return namespace["kernel"]
+
+def _stackKernelOutputs(outputs, numberOfConfigurations):
+    # Entries that are constant for the whole table come back as plain floats and are broadcast here
+    return np.stack([np.stack([np.broadcast_to(entry, (numberOfConfigurations,)) for entry in output], axis=-1) for output in outputs], axis=1)
@@ -0,0 +1,282 @@
+"""
+Instrumentation
+---------------
+
+Timing spans and counters for the stages of the planning pipeline (inverse kinematics, duration estimation, linear
+system assembly, solve, sampling...), to tell where the time of a slow plan went.
+
+The planners open a span around each stage and add to counters (IK calls, exceptions, system size, samples...).
+Nothing is recorded until a sink is enabled:
+
+    import instrumentation
+    sink = instrumentation.MemorySink()
+    instrumentation.enable(sink)
+    planner.trajectoryThroughPoints(points)
+    instrumentation.disable()
+    print(sink)
+
+Sinks: MemorySink (aggregates in memory), JSONLinesSink (one JSON object per span or counter) and ChromeTraceSink
+(Chrome trace event format, to open in chrome://tracing or https://ui.perfetto.dev).
+
+While disabled, span returns one shared object that does nothing and count returns at once, so the hooks left in
+the planners cost a function call each (tens of nanoseconds per stage, nothing measurable next to a plan).
+Spans are timed with time.perf_counter_ns.
+"""
+
+import json
+import os
+import threading
+import time
+
+_sink = None
+
+def enable(sink):
+    """
+    Starts sending spans and counters to a sink (replacing the previous one).
+
+    Parameters
+    ----------
+    sink : MemorySink | JSONLinesSink | ChromeTraceSink
+        sink that receives the spans and counters
+
+    Returns
+    -------
+    None
+    """
+
+    global _sink
+    _sink = sink
+
+def disable():
+    """
+    Stops sending spans and counters, and closes the sink.
+
+    Returns
+    -------
+    sink : MemorySink | JSONLinesSink | ChromeTraceSink | None
+        Sink that was enabled.
+    """
+
+    global _sink
+    sink, _sink = _sink, None
+    if sink is not None:
+        sink.close()
+    return sink
+
+def enabled():
+    """
+    Tells whether a sink is enabled.
+
+    Returns
+    -------
+    enabled : bool
+        Whether spans and counters are being recorded.
+    """
+
+    return _sink is not None
+
+def span(name, **attributes):
+    """
+    Times a stage, to be used as a context manager (with instrumentation.span("solve", size=n): ...).
+    If the stage raises, the exception is counted (counter "exceptions", once even if it goes through nested spans)
+    before propagating.
+
+    Parameters
+    ----------
+    name : string
+        name of the stage
+    **attributes
+        values recorded with the span (e.g. the size of the problem)
+
+    Returns
+    -------
+    span : context manager
+        Span of the stage (a shared object that does nothing if instrumentation is disabled).
+    """
+
+    if _sink is None:
+        return _nullSpan
+    return _Span(_sink, name, attributes)
+
+def count(name, value=1):
+    """
+    Adds to a counter.
+
+    Parameters
+    ----------
+    name : string
+        name of the counter
+    value : int | float = 1
+        value to add
+
+    Returns
+    -------
+    None
+    """
+
+    if _sink is not None:
+        _sink.counter(name, value)
+
+class MemorySink:
+    """
+    A class to aggregate spans and counters in memory
+
+    ...
+
+    Attributes
+    ----------
+    spans : dict[string, dict]
+        for each stage: calls, totalNs, minNs and maxNs
+    counters : dict[string, int | float]
+        total of each counter
+
+    Implemented Operations
+    ----------------------
+    str : string = str(MemorySink)
+        S = table with the calls, total, mean and max time of each stage, followed by the counters.
+    """
+
+    def __init__(self):
+        self._spans = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    @property
+    def spans(self):
+        return self._spans
+
+    @property
+    def counters(self):
+        return self._counters
+
+    def span(self, name, startNs, durationNs, attributes):
+        with self._lock:
+            stats = self._spans.get(name)
+            if stats is None:
+                self._spans[name] = {"calls": 1, "totalNs": durationNs, "minNs": durationNs, "maxNs": durationNs}
+            else:
+                stats["calls"] += 1
+                stats["totalNs"] += durationNs
+                stats["minNs"] = min(stats["minNs"], durationNs)
+                stats["maxNs"] = max(stats["maxNs"], durationNs)
+
+    def counter(self, name, value):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def close(self):
+        pass
+
+    def __str__(self):
+        lines = ["{:<32}{:>8}{:>14}{:>14}{:>14}".format("stage", "calls", "total (ms)", "mean (us)", "max (us)")]
+        for name, stats in sorted(self._spans.items(), key=lambda item: -item[1]["totalNs"]):
+            lines.append("{:<32}{:>8}{:>14.3f}{:>14.1f}{:>14.1f}".format(name, stats["calls"], stats["totalNs"]*1e-6,
+                                                                       stats["totalNs"]/stats["calls"]*1e-3, stats["maxNs"]*1e-3))
+        for name, value in sorted(self._counters.items()):
+            lines.append("{:<32}{:>8}".format(name, value))
+        return "\n".join(lines)
+
+class JSONLinesSink:
+    """
+    A class to write every span and counter as a line of JSON
+    ({"type": "span", "name", "startNs", "durationNs", ...attributes} or {"type": "counter", "name", "value"})
+
+    ...
+
+    Attributes
+    ----------
+    file : file object | string
+        open text file, or name of the file to create
+    """
+
+    def __init__(self, file):
+        self._ownsFile = isinstance(file, str)
+        self._file = open(file, "w") if self._ownsFile else file
+        self._lock = threading.Lock()
+
+    def span(self, name, startNs, durationNs, attributes):
+        self._write({"type": "span", "name": name, "startNs": startNs, "durationNs": durationNs, **attributes})
+
+    def counter(self, name, value):
+        self._write({"type": "counter", "name": name, "value": value})
+
+    def close(self):
+        with self._lock:
+            if self._ownsFile:
+                self._file.close()
+            else:
+                self._file.flush()
+
+    def _write(self, event):
+        line = json.dumps(event)
+        with self._lock:
+            self._file.write(line + "\n")
+
+class ChromeTraceSink:
+    """
+    A class to write spans and counters in the Chrome trace event format (written when the sink is closed)
+
+    ...
+
+    Attributes
+    ----------
+    fileName : string
+        file to write the trace to
+    """
+
+    def __init__(self, fileName):
+        self._fileName = fileName
+        self._events = []
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def span(self, name, startNs, durationNs, attributes):
+        event = {"name": name, "ph": "X", "ts": startNs/1000, "dur": durationNs/1000, "pid": os.getpid(), "tid": threading.get_ident()}
+        if attributes:
+            event["args"] = attributes
+        with self._lock:
+            self._events.append(event)
+
+    def counter(self, name, value):
+        with self._lock:
+            # Counter events carry the running total, so the trace viewer draws how it grows in time
+            self._counters[name] = self._counters.get(name, 0) + value
+            self._events.append({"name": name, "ph": "C", "ts": time.perf_counter_ns()/1000, "pid": os.getpid(), "args": {name: self._counters[name]}})
+
+    def close(self):
+        with self._lock:
+            with open(self._fileName, "w") as file:
+                json.dump({"traceEvents": self._events, "displayTimeUnit": "ms"}, file)
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, exc, traceback):
+        return False
+
+_nullSpan = _NullSpan()
+
+class _Span:
+    def __init__(self, sink, name, attributes):
+        self._sink = sink
+        self._name = name
+        self._attributes = attributes
+
+    def __enter__(self):
+        self._start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, excType, exc, traceback):
+        durationNs = time.perf_counter_ns() - self._start
+        if excType is not None:
+            self._attributes["exception"] = excType.__name__
+            # Every enclosing span sees the same exception: it is counted by the innermost one only
+            if not getattr(exc, "_instrumentationCounted", False):
+                self._sink.counter("exceptions", 1)
+                try:
+                    exc._instrumentationCounted = True
+                except AttributeError:
+                    pass
+        self._sink.span(self._name, self._start, durationNs, self._attributes)
+        return False
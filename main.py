@@ -1,3 +1,4 @@
+from backgroundPlanner import BackgroundPlanner
 from trajectoryPlanner import TrajectoryPlanner
 from lineTrajectoryPlanner import LineTrajectoryPlanner
 from barretwam4 import BarretWAM_4
@@ -47,6 +48,9 @@ while whichTrajectory not in range(1, len(trajectoryOptions) + 1):
 
 planner = trajectoryOptions[whichTrajectory-1](robot)
 
+# Plans the route entered so far while the next points are typed, so that the trajectory is ready when it is finished
+backgroundPlanner = BackgroundPlanner(robot, trajectoryOptions[whichTrajectory-1])
+
 
 
 ############################## INPUT POINTS AND CALCULATE TRAJECTORY ################################
@@ -61,9 +65,16 @@ while not ret:
         inWorkspace = False
         while not inWorkspace:
             point = None
-            coords = input("Enter the coordinates for point" + str(pointIndex) + " (F to finish inputting points): ")
+            coords = input("Enter the coordinates for point" + str(pointIndex) + " (F to finish inputting points, U to undo the last one): ")
             if coords == "F":
                 break
+            if coords == "U":
+                if pathPoints:
+                    pathPoints.pop()
+                    pointIndex -= 1
+                    backgroundPlanner.update(pathPoints)
+                    print("Point" + str(pointIndex) + " removed\n")
+                continue
             try:
                 x, y, z = [float(c) for c in coords.split()]
             except ValueError:
@@ -79,9 +90,10 @@ while not ret:
             break
         pointIndex += 1
         pathPoints.append(point)
+        backgroundPlanner.update(pathPoints)
 
     try:
-        ret, coeffs, durations = planner.trajectoryThroughPoints(pathPoints)
+        ret, coeffs, durations = backgroundPlanner.result(pathPoints)
     except ValueError as e:
         print(e)
 
@@ -18,6 +18,10 @@ class Manipulator(abc.ABC):
         indicates the type of the joints; True = rotative, False = prismatic
     jointLims : tuple[tuple[float]]
         indicates the limits of the joints
+    jointVelLims : tuple[float] | None
+        indicates the maximum absolute velocity of each joint (None if not declared)
+    jointAccLims : tuple[float] | None
+        indicates the maximum absolute acceleration of each joint (None if not declared)
     speed : float
         avarage speed of the manipulator's end-effector
     
@@ -29,9 +33,19 @@ class Manipulator(abc.ABC):
     fkine(jointVals):
         Calculates the manipulator's end-effector position in the space for given joint values - forward kinematics.
         If argument is a iterable, apply method to all values.
+    fkineBatch(jointVals):
+        Calculates the manipulator's end-effector positions for an (N x dof) array of joint values.
+    framePositions(jointVals):
+        Calculates the position of the manipulator's link frames (base to end-effector) for an (N x dof) array of joint values.
     ikine(point):
         Calculates the manipulator's joint values for given end-effector position in the space - inverse kinematics.
         If argument is a iterable, apply method to all points.
+    ikinePath(pathPoints):
+        Calculates the manipulator's joint values for the points of a path, keeping the joint values continuous along it.
+    jacobian(jointVals):
+        Calculates the manipulator's end-effector linear velocity jacobian for an array of joint values.
+    jacobianDot(jointVals, jointVels):
+        Calculates the time derivative of the manipulator's end-effector linear velocity jacobian for arrays of joint values and velocities.
 
     Inner Class
     -----------
@@ -44,11 +58,13 @@ class Manipulator(abc.ABC):
         S = "manip.name".
     """
     
-    def __init__(self, name, dof, jointTypes, jointLims, speed = 0.05):
+    def __init__(self, name, dof, jointTypes, jointLims, speed = 0.05, jointVelLims = None, jointAccLims = None):
         self._name = name
         self._dof = dof
         self._jointTypes = jointTypes
         self._jointLims = jointLims
+        self._jointVelLims = jointVelLims
+        self._jointAccLims = jointAccLims
         self._speed = speed
 
     @property
@@ -63,6 +79,14 @@ class Manipulator(abc.ABC):
     def jointLims(self):
         return self._jointLims
 
+    @property
+    def jointVelLims(self):
+        return self._jointVelLims
+
+    @property
+    def jointAccLims(self):
+        return self._jointAccLims
+
     @property
     def speed(self):
         return self._speed
@@ -109,5 +133,48 @@ class Manipulator(abc.ABC):
         """
         pass
 
+    def fkineBatch(self, jointVals):
+        """
+        Calculates the manipulator's end-effector positions for an (N x dof) array of joint values.
+        Rows are not checked against the joint limits.
+
+        Defaults to fkine applied to all values; subclasses should evaluate all rows at once.
+        """
+        points = self.fkine([self.Joints(*thisJointVals) for thisJointVals in jointVals])
+        return [[point.x, point.y, point.z] for point in points]
+
+    def framePositions(self, jointVals):
+        """
+        Calculates the position of the manipulator's link frames (base to end-effector) for an (N x dof) array of joint values.
+
+        Optional method, to be implemented in subclass (specific manipulator) if available.
+        """
+        raise NotImplementedError(self._name + " does not implement framePositions")
+
+    def ikinePath(self, pathPoints:tuple[Point]):
+        """
+        Calculates the manipulator's joint values for the points of a path, keeping the joint values continuous along it.
+
+        Defaults to ikine applied to all points; subclasses with more than one inverse kinematics solution should
+        choose, among them, the one that moves the joints the least between consecutive points.
+        """
+        return self.ikine(list(pathPoints))
+
+    def jacobian(self, jointVals):
+        """
+        Calculates the manipulator's end-effector linear velocity jacobian for an array of joint values.
+
+        Optional method, to be implemented in subclass (specific manipulator) if available.
+        """
+        raise NotImplementedError(self._name + " does not implement jacobian")
+
+    def jacobianDot(self, jointVals, jointVels):
+        """
+        Calculates the time derivative of the manipulator's end-effector linear velocity jacobian for arrays of joint values and velocities.
+
+        Optional method, to be implemented in subclass (specific manipulator) if available.
+        """
+        raise NotImplementedError(self._name + " does not implement jacobianDot")
+
     def __str__(self):
         return self._name
\ No newline at end of file
@@ -0,0 +1,186 @@
+"""
+ParallelPlanner
+---------------
+
+Plans many independent routes at once, sharding them across a pool of processes.
+
+Routes go to the workers as float arrays and come back as float arrays (coefficients and durations), never as Point
+or Joints objects, so little is pickled per route. Results keep the order of the routes, a route that fails does not
+affect the others (if a worker process dies, the routes lost with it are planned again, and only a route that kills
+its worker on its own is reported as failed), and progress is reported as chunks of routes finish.
+"""
+
+import os
+import time
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from trajectoryPlanner import TrajectoryPlanner
+from barretwam4 import BarretWAM_4
+from point import Point
+
+class RouteResult:
+    """
+    A class to represent the planned trajectory of one route
+
+    ...
+
+    Attributes
+    ----------
+    status : string
+        "OK", "OUTSIDE WORKSPACE" or "ERROR: <reason>"
+    succeeded : bool
+        whether the route was planned
+    coeffs : numpy.ndarray (dof x curves x 4) | None
+        polynomial coefficients for each curve of each joint
+    times : numpy.ndarray (curves) | None
+        duration of each curve
+    seconds : float
+        time spent planning the route (in its worker)
+    """
+
+    def __init__(self, status, coeffs=None, times=None, seconds=0.0):
+        self._status = status
+        self._coeffs = coeffs
+        self._times = times
+        self._seconds = seconds
+
+    @property
+    def status(self):
+        return self._status
+
+    @property
+    def succeeded(self):
+        return self._status == "OK"
+
+    @property
+    def coeffs(self):
+        return self._coeffs
+
+    @property
+    def times(self):
+        return self._times
+
+    @property
+    def seconds(self):
+        return self._seconds
+
+def planRoutes(routes, manipulatorFactory=BarretWAM_4, plannerClass=TrajectoryPlanner, maxWorkers=None, chunkSize=None, progress=None):
+    """
+    Plans the trajectory through the points of each route, in parallel.
+
+    Parameters
+    ----------
+    routes : Iterable[array_like (N x 3)]
+        x, y and z coordinates of the points of each route.
+    manipulatorFactory : callable = BarretWAM_4
+        picklable callable (e.g. a manipulator class) that creates the manipulator in each worker.
+    plannerClass : type = TrajectoryPlanner
+        trajectory planner class to use (it must accept verbose=False, which the workers pass to it).
+    maxWorkers : int = None
+        number of worker processes (number of CPUs if not given).
+    chunkSize : int = None
+        number of routes sent to a worker at once (chosen from the number of routes and workers if not given).
+    progress : callable(done, total) = None
+        called in this process every time a chunk of routes finishes.
+
+    Returns
+    -------
+    results : list[RouteResult]
+        Planned trajectory of each route, in the same order as routes.
+    """
+
+    routes = [_routeArray(route) for route in routes]
+    if maxWorkers is None:
+        maxWorkers = os.cpu_count() or 1
+    if chunkSize is None:
+        # A few chunks per worker balances the load without paying the inter-process cost for every route
+        chunkSize = max(1, len(routes)//(4*maxWorkers))
+
+    results = [None] * len(routes)
+    chunks = [range(start, min(start + chunkSize, len(routes))) for start in range(0, len(routes), chunkSize)]
+    done = 0
+
+    def record(chunk, chunkResults):
+        nonlocal done
+        for routeIndex, result in zip(chunk, chunkResults):
+            results[routeIndex] = result
+        done += len(chunk)
+        if progress is not None:
+            progress(done, len(routes))
+
+    initargs = (manipulatorFactory, plannerClass)
+    crashed = _planChunks(routes, chunks, maxWorkers, initargs, record)
+    if crashed:
+        # When a worker dies the pool fails every chunk not finished yet, not only the one that killed it. Their routes
+        # are planned again in a new pool, one route per chunk, and the routes lost again are planned one at a time,
+        # alone in their pool, so that only a route that kills its worker is reported as failed
+        crashed = _planChunks(routes, [range(routeIndex, routeIndex + 1) for chunk in crashed for routeIndex in chunk], maxWorkers, initargs, record)
+        for chunk in crashed:
+            if _planChunks(routes, [chunk], 1, initargs, record):
+                record(chunk, [RouteResult("ERROR: worker process died")])
+
+    return results
+
+def planRoute(planner, points):
+    """
+    Plans the trajectory through the points of one route, in this process.
+
+    Parameters
+    ----------
+    planner : TrajectoryPlanner
+        trajectory planner to use (built with verbose=False, so that routes outside the workspace are only reported in
+        the result).
+    points : array_like (N x 3)
+        x, y and z coordinates of the points of the route.
+
+    Returns
+    -------
+    result : RouteResult
+        Planned trajectory of the route.
+    """
+
+    start = time.perf_counter()
+    try:
+        pathPoints = [Point(*point) for point in np.asarray(points, dtype=float).reshape(-1, 3).tolist()]
+        succeeded, coeffs, times = planner.trajectoryThroughPoints(pathPoints)
+    except Exception as e:
+        return RouteResult("ERROR: " + str(e), seconds=time.perf_counter() - start)
+
+    if not succeeded:
+        return RouteResult("OUTSIDE WORKSPACE", seconds=time.perf_counter() - start)
+    return RouteResult("OK", np.asarray(coeffs, dtype=float), np.asarray(times, dtype=float), time.perf_counter() - start)
+
+_workerPlanner = None
+
+def _routeArray(points):
+    try:
+        return np.asarray(points, dtype=float).reshape(-1, 3)
+    except ValueError:
+        # Malformed routes are sent as they are, so that planRoute reports the error for that route only
+        return points
+
+def _initWorker(manipulatorFactory, plannerClass):
+    # Each worker builds its manipulator and planner once and reuses them for all of its routes
+    global _workerPlanner
+    _workerPlanner = plannerClass(manipulatorFactory(), verbose=False)
+
+def _planChunks(routes, chunks, maxWorkers, initargs, record):
+    # Plans the chunks in a new pool, records their results, and returns the chunks lost because a worker died
+    crashed = []
+    with ProcessPoolExecutor(max_workers=maxWorkers, initializer=_initWorker, initargs=initargs) as executor:
+        futures = {executor.submit(_planChunk, [routes[routeIndex] for routeIndex in chunk]): chunk for chunk in chunks}
+        for future in as_completed(futures):
+            chunk = futures[future]
+            try:
+                chunkResults = future.result()
+            except BrokenProcessPool:
+                crashed.append(chunk)
+                continue
+            except Exception as e:
+                chunkResults = [RouteResult("ERROR: " + str(e))] * len(chunk)
+            record(chunk, chunkResults)
+    return crashed
+
+def _planChunk(routes):
+    return [planRoute(_workerPlanner, route) for route in routes]
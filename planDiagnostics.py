@@ -0,0 +1,179 @@
+"""
+PlanDiagnostics
+---------------
+
+Memory estimates of a plan, made before any work from the number of points, the number of joints and the number of
+samples per curve, and the record of what the planner chose and how much memory it actually used.
+
+The estimates are upper bounds calibrated with tracemalloc on the BarretWAM_4 planners:
+    * inverse kinematics: the candidate joint values of every point and the path search (about 6 KB per point);
+    * dense solve: the 4n x 4n system of each joint and numpy's copy of it while solving (256 n^2 bytes);
+    * banded solve: a few vectors of n values per joint (tridiagonal system of the knot velocities);
+    * samples: curvesValues' lists of Python floats for every joint and the time (about 40 bytes per value);
+    * streamed curve: the arrays curvesValuesStream fills for each curve of a chunk (8 bytes per value and a couple of
+      time arrays).
+"""
+
+_ikineBytesPerPoint = 6144
+_denseBytesPerSquaredCurve = 2*8*16
+_bandedBytesPerCurveAndJoint = 8*12
+_coeffsBytesPerCurveAndJoint = 8*8
+_bytesPerSampledValue = 40
+_streamBytesPerValue = 8
+_streamBytesPerSample = 2*8
+
+def estimatePlanMemory(numberOfPoints, dof, samplesPerCurve):
+    """
+    Estimates the peak memory of each stage of a plan.
+
+    Parameters
+    ----------
+    numberOfPoints : int
+        number of points of the trajectory (after any intermediate points are added)
+    dof : int
+        number of joints of the manipulator
+    samplesPerCurve : int
+        number of samples of each curve in curvesValues
+
+    Returns
+    -------
+    estimate : dict[string, int]
+        Bytes of "ikine", "denseSolve", "bandedSolve", "coeffs", "samples" and "streamedCurve" (one curve of a chunk of
+        curvesValuesStream).
+    """
+
+    numberOfCurves = max(numberOfPoints - 1, 1)
+    return {"ikine": _ikineBytesPerPoint*numberOfPoints,
+            "denseSolve": _denseBytesPerSquaredCurve*numberOfCurves**2,
+            "bandedSolve": _bandedBytesPerCurveAndJoint*numberOfCurves*dof,
+            "coeffs": _coeffsBytesPerCurveAndJoint*numberOfCurves*dof,
+            "samples": _bytesPerSampledValue*(samplesPerCurve*numberOfCurves + 1)*(dof + 1),
+            "streamedCurve": (_streamBytesPerValue*dof + _streamBytesPerSample)*samplesPerCurve}
+
+class PlanDiagnostics:
+    """
+    A class to represent the memory decisions and usage of a plan
+
+    ...
+
+    Attributes
+    ----------
+    budget : int
+        memory budget of the planner (bytes)
+    estimate : dict[string, int]
+        estimated bytes of each stage (see estimatePlanMemory)
+    solver : string
+        "dense" or "banded"
+    sampling : string
+        "full" (the lists of curvesValues fit in the budget) or "chunked" (they do not: sample with curvesValuesStream)
+    curvesPerChunk : int
+        number of curves sampled at a time by curvesValuesStream
+    peakBytes : int | None
+        peak memory traced (tracemalloc) while planning, above the memory in use before it (None if tracemalloc was
+        already tracing: its peak belongs to whoever started it)
+    seconds : float | None
+        time spent planning
+    withinBudget : bool | None
+        whether the peak memory stayed within the budget
+
+    Methods
+    -------
+    recordUsage(peakBytes, seconds):
+        Records the memory and time the plan actually used.
+    estimatedPeakBytes():
+        Estimated peak memory of the plan with the chosen solver and sampling.
+
+    Implemented Operations
+    ----------------------
+    str : string = str(PlanDiagnostics)
+        S = summary of the decisions, estimate and peak memory.
+    """
+
+    def __init__(self, budget, estimate, solver, sampling, curvesPerChunk):
+        self._budget = budget
+        self._estimate = estimate
+        self._solver = solver
+        self._sampling = sampling
+        self._curvesPerChunk = curvesPerChunk
+        self._peakBytes = None
+        self._seconds = None
+
+    @property
+    def budget(self):
+        return self._budget
+
+    @property
+    def estimate(self):
+        return self._estimate
+
+    @property
+    def solver(self):
+        return self._solver
+
+    @property
+    def sampling(self):
+        return self._sampling
+
+    @property
+    def curvesPerChunk(self):
+        return self._curvesPerChunk
+
+    @property
+    def peakBytes(self):
+        return self._peakBytes
+
+    @property
+    def seconds(self):
+        return self._seconds
+
+    @property
+    def withinBudget(self):
+        return None if self._peakBytes is None else self._peakBytes <= self._budget
+
+    def recordUsage(self, peakBytes, seconds):
+        """
+        Records the memory and time the plan actually used.
+
+        Parameters
+        ----------
+        peakBytes : int | None
+            peak memory traced while planning (None if not measured)
+        seconds : float
+            time spent planning
+
+        Returns
+        -------
+        None
+        """
+
+        self._peakBytes = peakBytes
+        self._seconds = seconds
+
+    def __str__(self):
+        text = (self._solver + " solve, " + self._sampling + " sampling (" + str(self._curvesPerChunk) + " curves per chunk), budget "
+                + _formatBytes(self._budget) + ", estimated " + _formatBytes(self.estimatedPeakBytes()))
+        if self._peakBytes is not None:
+            text += ", peak " + _formatBytes(self._peakBytes)
+        if self._seconds is not None:
+            text += ", planned in " + str(round(self._seconds, 3)) + " s"
+        return text
+
+    def estimatedPeakBytes(self):
+        """
+        Estimated peak memory of the plan with the chosen solver and sampling.
+
+        Returns
+        -------
+        bytes : int
+            Estimated peak memory.
+        """
+
+        solve = self._estimate["denseSolve"] if self._solver == "dense" else self._estimate["bandedSolve"]
+        return self._estimate["ikine"] + solve + self._estimate["coeffs"]
+
+def _formatBytes(numberOfBytes):
+    for unit in ("B", "KB", "MB"):
+        if numberOfBytes < 1024:
+            return str(round(numberOfBytes, 1)) + " " + unit
+        numberOfBytes /= 1024
+    return str(round(numberOfBytes, 1)) + " GB"
@@ -0,0 +1,576 @@
+"""
+PlanningService
+---------------
+
+asyncio server that plans trajectories for several clients (cell controllers) on one planning host.
+
+Clients connect over local TCP or a Unix socket and exchange frames:
+    uint32 (big-endian)   size of the rest of the frame
+    uint32 (big-endian)   size of the JSON header
+    JSON header           UTF-8
+    payload               binary (may be empty)
+
+Requests (JSON header, no payload):
+    {"type": "plan", "id": 1, "points": [[x, y, z], ...], "manipulator": "barretwam4", "planner": "curved", "float32": false}
+    {"type": "cancel", "id": 1}
+    {"type": "stats", "id": 2}
+Replies:
+    {"id": 1, "status": "OK", "seconds": ..., "deduplicated": false} + payload with the coefficients packed by coeffsWire
+    {"id": 1, "status": "OUTSIDE WORKSPACE" | "CANCELLED" | "BUSY" | "ERROR: <reason>"}
+    {"type": "stats", "id": 2, "requests": ..., "latency": {...}, ...}
+
+Plans run on a bounded pool of processes (at most maxPending jobs submitted at once, the rest wait in the service).
+Each client may have at most maxQueuedPerClient plans in flight; further plans are answered with "BUSY" at once,
+so a client that floods the service slows only itself. Identical plans in flight (same manipulator, planner, precision
+and points) are planned once and the result is sent to every client that asked for it. Cancelling a plan (or closing
+the connection) cancels it in the pool if no other client is waiting for it and it has not started yet.
+If a worker process dies (e.g. killed for running out of memory), the pool is replaced and the plans it failed are
+planned once more, one at a time: only the plan that kills its worker is answered with an error.
+Latency (from request to reply) is kept in histograms, available with a "stats" request.
+
+PlanningClient connects to the service from asyncio code. "--self-check" starts the service on a free localhost port,
+plans with several clients at once (identical routes, a cancellation, a flood beyond the per-client limit), checks the
+coefficients against planning in this process and prints the statistics.
+
+Usage:
+    python planningService.py [--host 127.0.0.1] [--port 8765 | --unix /tmp/planning.sock] [--workers N]
+    python planningService.py --self-check
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import os
+import struct
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import batch
+from coeffsWire import encodePlan, decodePlan
+from parallelPlanner import planRoute
+
+_frameSizes = struct.Struct(">II")
+_maxFrameSize = 64*1024*1024
+
+class LatencyHistogram:
+    """
+    A class to count latencies in logarithmic buckets (4 per doubling, from 10 us)
+
+    ...
+
+    Attributes
+    ----------
+    count : int
+        number of latencies recorded
+    total : float
+        sum of the latencies (s)
+    maximum : float
+        largest latency (s)
+
+    Methods
+    -------
+    record(seconds):
+        Counts a latency.
+    percentile(fraction):
+        Upper limit of the bucket of the given fraction of the latencies.
+    asDict():
+        Count, mean, maximum, percentiles and non-empty buckets.
+    """
+
+    _smallest = 1e-5
+    _bucketsPerDoubling = 4
+
+    def __init__(self):
+        self._buckets = {}
+        self._count = 0
+        self._total = 0.0
+        self._maximum = 0.0
+
+    @property
+    def count(self):
+        return self._count
+
+    @property
+    def total(self):
+        return self._total
+
+    @property
+    def maximum(self):
+        return self._maximum
+
+    def record(self, seconds):
+        bucket = max(0, math.ceil(math.log2(max(seconds, LatencyHistogram._smallest)/LatencyHistogram._smallest)*LatencyHistogram._bucketsPerDoubling))
+        self._buckets[bucket] = self._buckets.get(bucket, 0) + 1
+        self._count += 1
+        self._total += seconds
+        self._maximum = max(self._maximum, seconds)
+
+    def percentile(self, fraction):
+        if self._count == 0:
+            return 0.0
+        target = fraction*self._count
+        seen = 0
+        for bucket in sorted(self._buckets):
+            seen += self._buckets[bucket]
+            if seen >= target:
+                return min(self._bucketLimit(bucket), self._maximum)
+        return self._maximum
+
+    def asDict(self):
+        return {"count": self._count, "mean": self._total/self._count if self._count else 0.0, "max": self._maximum,
+                "p50": self.percentile(0.5), "p90": self.percentile(0.9), "p99": self.percentile(0.99),
+                "buckets": {"{:.6f}".format(self._bucketLimit(bucket)): count for bucket, count in sorted(self._buckets.items())}}
+
+    def _bucketLimit(self, bucket):
+        return LatencyHistogram._smallest*2**(bucket/LatencyHistogram._bucketsPerDoubling)
+
+class PlanningService:
+    """
+    A class to serve trajectory plans to many clients from a pool of processes
+
+    ...
+
+    Attributes
+    ----------
+    address : tuple | string | None
+        (host, port) or Unix socket path the service listens on (None before start)
+    stats : dict
+        counters and latency histograms of the service
+
+    Methods
+    -------
+    start(host="127.0.0.1", port=0, path=None):
+        Starts listening on TCP (host, port; port 0 picks a free one) or on the Unix socket path.
+    close():
+        Stops listening, cancels the plans in flight and shuts the pool down.
+    """
+
+    def __init__(self, maxWorkers=None, maxPending=None, maxQueuedPerClient=8):
+        self._maxWorkers = maxWorkers or os.cpu_count() or 1
+        self._executor = ProcessPoolExecutor(max_workers=self._maxWorkers)
+        self._executorLock = asyncio.Lock()
+        self._retryLock = asyncio.Lock()
+        self._pending = asyncio.Semaphore(maxPending or 2*self._maxWorkers)
+        self._maxQueuedPerClient = maxQueuedPerClient
+        self._inFlight = {}
+        self._clients = set()
+        self._server = None
+        self._address = None
+        self._counters = {"requests": 0, "planned": 0, "deduplicated": 0, "cancelled": 0, "busy": 0, "errors": 0, "clients": 0, "poolRestarts": 0}
+        self._latency = LatencyHistogram()
+        self._planLatency = LatencyHistogram()
+
+    @property
+    def address(self):
+        return self._address
+
+    @property
+    def stats(self):
+        return {**self._counters, "inFlight": len(self._inFlight), "latency": self._latency.asDict(), "planLatency": self._planLatency.asDict()}
+
+    async def start(self, host="127.0.0.1", port=0, path=None):
+        if path is not None:
+            self._server = await asyncio.start_unix_server(self._handleClient, path)
+            self._address = path
+        else:
+            self._server = await asyncio.start_server(self._handleClient, host, port)
+            self._address = self._server.sockets[0].getsockname()[:2]
+        return self._address
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+        for client in list(self._clients):
+            client.writer.close()
+        for job in list(self._inFlight.values()):
+            job.task.cancel()
+        if self._server is not None:
+            await self._server.wait_closed()
+        await asyncio.gather(*(client.handler for client in list(self._clients)), return_exceptions=True)
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    async def _handleClient(self, reader, writer):
+        self._counters["clients"] += 1
+        client = _Client(writer, asyncio.current_task())
+        self._clients.add(client)
+        try:
+            while True:
+                try:
+                    header, _ = await readFrame(reader)
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+
+                requestType = header.get("type")
+                requestId = header.get("id")
+                if requestType == "plan":
+                    self._counters["requests"] += 1
+                    if len(client.requests) >= self._maxQueuedPerClient:
+                        self._counters["busy"] += 1
+                        await client.send({"id": requestId, "status": "BUSY"})
+                        continue
+                    request = asyncio.create_task(self._result(header))
+                    client.requests[requestId] = request
+                    # Replies from another task, so that even a plan cancelled before it starts is answered
+                    client.replies.add(asyncio.create_task(self._reply(client, requestId, request, time.perf_counter())))
+                elif requestType == "cancel":
+                    request = client.requests.get(requestId)
+                    if request is not None:
+                        request.cancel()
+                elif requestType == "stats":
+                    await client.send({"type": "stats", "id": requestId, **self.stats})
+                else:
+                    await client.send({"id": requestId, "status": "ERROR: unknown request type " + repr(requestType)})
+        except ConnectionError:
+            pass
+        finally:
+            for request in list(client.requests.values()):
+                request.cancel()
+            await asyncio.gather(*client.replies, return_exceptions=True)
+            self._clients.discard(client)
+            writer.close()
+
+    async def _result(self, header):
+        job, deduplicated = self._job(header)
+        try:
+            status, payload, seconds = await asyncio.shield(job.task)
+        finally:
+            job.waiters -= 1
+            # Nobody is waiting for the plan any more: take it out of the pool if it has not started
+            if job.waiters == 0 and not job.task.done():
+                job.task.cancel()
+        return {"status": status, "seconds": seconds, "deduplicated": deduplicated}, payload
+
+    async def _reply(self, client, requestId, request, received):
+        await asyncio.wait((request,))
+        client.requests.pop(requestId, None)
+        if request.cancelled():
+            self._counters["cancelled"] += 1
+            reply, payload = {"status": "CANCELLED"}, b""
+        elif request.exception() is not None:
+            self._counters["errors"] += 1
+            reply, payload = {"status": "ERROR: " + str(request.exception())}, b""
+        else:
+            reply, payload = request.result()
+        self._latency.record(time.perf_counter() - received)
+
+        try:
+            await client.send({"id": requestId, **reply}, payload)
+        except ConnectionError:
+            pass
+        finally:
+            client.replies.discard(asyncio.current_task())
+
+    def _job(self, header):
+        points = [[float(coordinate) for coordinate in point] for point in header["points"]]
+        manipulator = header.get("manipulator", "barretwam4")
+        planner = header.get("planner", "curved")
+        float32 = bool(header.get("float32", False))
+        batch.manipulatorClass(manipulator)
+        if planner not in batch.plannerOptions:
+            raise ValueError("unknown planner " + repr(planner))
+        key = hashlib.sha1(json.dumps([manipulator, planner, float32, points]).encode()).hexdigest()
+
+        job = self._inFlight.get(key)
+        deduplicated = job is not None
+        if deduplicated:
+            self._counters["deduplicated"] += 1
+        else:
+            job = _Job(asyncio.create_task(self._plan(manipulator, planner, float32, points)))
+            self._inFlight[key] = job
+            job.task.add_done_callback(lambda task: self._inFlight.pop(key, None))
+        job.waiters += 1
+        return job, deduplicated
+
+    async def _plan(self, manipulator, planner, float32, points):
+        async with self._pending:
+            start = time.perf_counter()
+            try:
+                result = await self._planInPool(manipulator, planner, float32, points)
+            except BrokenProcessPool:
+                # A dead worker fails every plan in the pool, not only its own. Each of them is planned once more, one
+                # at a time, so the plan that kills its worker fails again and the others succeed
+                async with self._retryLock:
+                    result = await self._planInPool(manipulator, planner, float32, points)
+            self._planLatency.record(time.perf_counter() - start)
+            self._counters["planned"] += 1
+            return result
+
+    async def _planInPool(self, manipulator, planner, float32, points):
+        executor = self._executor
+        try:
+            return await asyncio.get_running_loop().run_in_executor(executor, _planInWorker, manipulator, planner, float32, points)
+        except BrokenProcessPool:
+            # The pool cannot be used any more: the first plan to notice replaces it
+            async with self._executorLock:
+                if self._executor is executor:
+                    self._counters["poolRestarts"] += 1
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    self._executor = ProcessPoolExecutor(max_workers=self._maxWorkers)
+            raise
+
+class PlanningClient:
+    """
+    A class to request plans from a PlanningService
+
+    ...
+
+    Methods
+    -------
+    connect(host="127.0.0.1", port=8765, path=None):
+        Connects to the service over TCP or the Unix socket path.
+    plan(points, manipulator="barretwam4", planner="curved", float32=False):
+        Plans the trajectory through the points; returns (status, coeffs, times, reply header).
+    cancel(requestId):
+        Cancels a plan in flight.
+    stats():
+        Returns the counters and latency histograms of the service.
+    close():
+        Closes the connection.
+    """
+
+    def __init__(self):
+        self._reader = None
+        self._writer = None
+        self._replies = {}
+        self._nextId = 0
+        self._listener = None
+        self._lock = asyncio.Lock()
+
+    async def connect(self, host="127.0.0.1", port=8765, path=None):
+        if path is not None:
+            self._reader, self._writer = await asyncio.open_unix_connection(path)
+        else:
+            self._reader, self._writer = await asyncio.open_connection(host, port)
+        self._listener = asyncio.create_task(self._listen())
+
+    def nextRequestId(self):
+        self._nextId += 1
+        return self._nextId
+
+    async def plan(self, points, manipulator="barretwam4", planner="curved", float32=False, requestId=None):
+        requestId = self.nextRequestId() if requestId is None else requestId
+        header, payload = await self._request({"type": "plan", "id": requestId, "points": [list(map(float, point)) for point in points],
+                                               "manipulator": manipulator, "planner": planner, "float32": float32}, requestId)
+        if header["status"] != "OK":
+            return header["status"], None, None, header
+        coeffs, times = decodePlan(payload)
+        return "OK", coeffs, times, header
+
+    async def cancel(self, requestId):
+        await self._send({"type": "cancel", "id": requestId})
+
+    async def stats(self):
+        requestId = self.nextRequestId()
+        header, _ = await self._request({"type": "stats", "id": requestId}, requestId)
+        return header
+
+    async def close(self):
+        if self._listener is not None:
+            self._listener.cancel()
+        if self._writer is not None:
+            self._writer.close()
+
+    async def _request(self, header, replyKey):
+        reply = asyncio.get_running_loop().create_future()
+        self._replies[replyKey] = reply
+        await self._send(header)
+        return await reply
+
+    async def _send(self, header):
+        async with self._lock:
+            self._writer.write(encodeFrame(header))
+            await self._writer.drain()
+
+    async def _listen(self):
+        try:
+            while True:
+                header, payload = await readFrame(self._reader)
+                reply = self._replies.pop(header.get("id"), None)
+                if reply is not None and not reply.done():
+                    reply.set_result((header, payload))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            for reply in self._replies.values():
+                if not reply.done():
+                    reply.set_exception(ConnectionError("connection to the planning service closed"))
+
+def encodeFrame(header, payload=b""):
+    """
+    Packs a frame.
+
+    Parameters
+    ----------
+    header : dict
+        JSON header
+    payload : bytes = b""
+        binary payload
+
+    Returns
+    -------
+    frame : bytes
+        Packed frame.
+    """
+
+    headerBytes = json.dumps(header).encode("utf-8")
+    return _frameSizes.pack(4 + len(headerBytes) + len(payload), len(headerBytes)) + headerBytes + payload
+
+async def readFrame(reader):
+    """
+    Reads a frame.
+
+    Parameters
+    ----------
+    reader : asyncio.StreamReader
+        stream to read from
+
+    Returns
+    -------
+    header : dict
+        JSON header.
+    payload : bytes
+        Binary payload.
+    """
+
+    frameSize, headerSize = _frameSizes.unpack(await reader.readexactly(_frameSizes.size))
+    if frameSize > _maxFrameSize or headerSize > frameSize - 4:
+        raise ConnectionError("malformed frame")
+    body = await reader.readexactly(frameSize - 4)
+    return json.loads(body[:headerSize]), body[headerSize:]
+
+class _Client:
+    def __init__(self, writer, handler):
+        self.writer = writer
+        self.handler = handler
+        self.requests = {}
+        self.replies = set()
+        self._lock = asyncio.Lock()
+
+    async def send(self, header, payload=b""):
+        async with self._lock:
+            self.writer.write(encodeFrame(header, payload))
+            # Waits while the client does not read its replies (backpressure on slow readers)
+            await self.writer.drain()
+
+class _Job:
+    def __init__(self, task):
+        self.task = task
+        self.waiters = 0
+
+_workerPlanners = {}
+
+def _planInWorker(manipulator, planner, float32, points):
+    # Each worker keeps one planner per manipulator and trajectory type
+    key = (manipulator, planner)
+    if key not in _workerPlanners:
+        _workerPlanners[key] = batch.plannerOptions[planner](batch.manipulatorClass(manipulator)(), verbose=False)
+    result = planRoute(_workerPlanners[key], points)
+    if not result.succeeded:
+        return result.status, b"", result.seconds
+    return "OK", encodePlan(result.coeffs.tolist(), result.times.tolist(), float32), result.seconds
+
+async def selfCheck(numberOfClients=4, maxWorkers=2, log=print):
+    """
+    Starts a service on a free localhost port and checks it with several clients at once.
+
+    Parameters
+    ----------
+    numberOfClients : int = 4
+        number of clients planning at the same time
+    maxWorkers : int = 2
+        planning processes of the service
+    log : callable(string) = print
+        called with a line for each check
+
+    Returns
+    -------
+    passed : bool
+        Whether every check passed.
+    """
+
+    import numpy as np
+    from barretwam4 import BarretWAM_4
+
+    manip = BarretWAM_4()
+    planner = batch.plannerOptions["curved"](manip, verbose=False)
+    jointVals = np.array([(0.2*i, 0.6 + 0.05*i, 0.0, 0.4 + 0.05*i) for i in range(6)])
+    route = manip.fkineBatch(jointVals).tolist()
+    expected = planRoute(planner, route)
+    checks = []
+
+    service = PlanningService(maxWorkers, maxQueuedPerClient=4)
+    host, port = await service.start()
+    clients = [PlanningClient() for _ in range(numberOfClients)]
+    try:
+        for client in clients:
+            await client.connect(host, port)
+
+        # Every client asks for the same route: it is planned once
+        replies = await asyncio.gather(*(client.plan(route) for client in clients))
+        checks.append(("identical plans", all(status == "OK" and np.allclose(coeffs, expected.coeffs) and np.allclose(times, expected.times)
+                                              for status, coeffs, times, _ in replies)))
+        checks.append(("deduplicated", sum(header["deduplicated"] for *_, header in replies) >= 1))
+
+        # A point far away from the manipulator
+        status, *_ = await clients[0].plan(route + [[10.0, 10.0, 10.0]])
+        checks.append(("outside workspace", status == "OUTSIDE WORKSPACE"))
+
+        # Cancel a plan that is still being planned: a route long enough to take a few tenths of a second (the cancel
+        # follows the plan on the same connection, so the service handles it well before the plan is done)
+        longRoute = manip.fkineBatch(np.linspace(jointVals[0], jointVals[-1], 600)).tolist()
+        requestId = clients[1].nextRequestId()
+        request = asyncio.create_task(clients[1].plan(longRoute, requestId=requestId))
+        await asyncio.sleep(0)
+        await clients[1].cancel(requestId)
+        status, *_ = await request
+        checks.append(("cancelled", status == "CANCELLED"))
+
+        # More plans than the per-client limit: the rest are refused at once
+        statuses = [status for status, *_ in await asyncio.gather(*(clients[2].plan([point + [0.001*i] for point in route]) for i in range(8)))]
+        checks.append(("busy beyond the limit", "BUSY" in statuses and "OK" in statuses))
+
+        stats = await clients[3].stats()
+    finally:
+        for client in clients:
+            await client.close()
+        await service.close()
+
+    for name, passed in checks:
+        log("{:<28}{}".format(name, "ok" if passed else "FAILED"))
+    log("requests " + str(stats["requests"]) + ", planned " + str(stats["planned"]) + ", deduplicated " + str(stats["deduplicated"])
+        + ", cancelled " + str(stats["cancelled"]) + ", busy " + str(stats["busy"]))
+    latency = stats["latency"]
+    log("latency p50 {:.1f} ms, p90 {:.1f} ms, p99 {:.1f} ms, max {:.1f} ms".format(latency["p50"]*1e3, latency["p90"]*1e3, latency["p99"]*1e3, latency["max"]*1e3))
+    return all(passed for _, passed in checks)
+
+async def _serveForever(args):
+    service = PlanningService(args.workers, maxQueuedPerClient=args.max_per_client)
+    address = await service.start(args.host, args.port, args.unix)
+    print("planning service listening on " + str(address))
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await service.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serves trajectory plans over local TCP or a Unix socket.")
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8765, help="TCP port (default: 8765)")
+    parser.add_argument("--unix", help="listen on this Unix socket instead of TCP")
+    parser.add_argument("-w", "--workers", type=int, help="planning processes (default: number of CPUs)")
+    parser.add_argument("--max-per-client", type=int, default=8, help="plans in flight per client (default: 8)")
+    parser.add_argument("--self-check", action="store_true", help="check the service with several clients on localhost and exit")
+    args = parser.parse_args(argv)
+
+    if args.self_check:
+        return 0 if asyncio.run(selfCheck(maxWorkers=args.workers or 2)) else 1
+
+    try:
+        asyncio.run(_serveForever(args))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,531 @@
+"""
+SetpointStreamer
+----------------
+
+Sends the joint setpoints of a planned trajectory to a controller at a fixed rate (e.g. 1 kHz), over UDP or TCP.
+
+The setpoints are evaluated from the polynomial coefficients as they are sent (nothing is sampled beforehand), one
+batch of frames at a time. Each packet is
+    header "<4sHHI"       magic b"KTSP", number of joints, number of frames, sequence number of the first frame
+    frames "<d" + dof "d"  time and joint values of each frame
+and, over TCP, is preceded by its size (uint32, little-endian).
+
+Scheduling uses absolute deadlines: packet j is due at start + j*batchSize/rate, so a late packet does not push the
+next ones back (no drift). The streamer sleeps until shortly before the deadline and spins on time.perf_counter for
+the rest, which keeps the send jitter to tens of microseconds on an idle Linux machine. While streaming, the
+interpreter's thread switch interval is lowered, so that other Python threads cannot hold the GIL for the default 5 ms.
+After the end of the trajectory, the last setpoint is held until the requested duration is over.
+
+StreamStats records how late every packet was sent (the send jitter) and counts the missed deadlines (packets sent
+later than the tolerance, half a period by default). ControllerStandIn receives the packets like a controller would and
+counts the frames, the lost ones and the arrival jitter.
+
+Usage:
+    python setpointStreamer.py [plan.ktcf] [--rate 1000] [--batch 1] [--protocol udp|tcp] [--target host:port]
+                               [--duration 10] [--load-threads N] [--load-processes N] [--realtime]
+Without a target, a ControllerStandIn is started on localhost; without a plan, a demonstration route is planned.
+"""
+
+import argparse
+import multiprocessing
+import os
+import socket
+import struct
+import sys
+import threading
+import time
+from array import array
+import numpy as np
+from coeffsWire import loadPlan
+
+_packetHeader = struct.Struct("<4sHHI")
+_packetSize = struct.Struct("<I")
+_magic = b"KTSP"
+
+class StreamStats:
+    """
+    A class to represent the timing of a setpoint stream
+
+    ...
+
+    Attributes
+    ----------
+    rate : float
+        frames per second
+    batchSize : int
+        frames per packet
+    frames : int
+        number of frames sent
+    packets : int
+        number of packets sent
+    missedDeadlines : int
+        number of packets sent later than the tolerance
+    lateness : array.array
+        how late each packet was sent after its deadline (s)
+    work : array.array
+        time spent evaluating and packing each packet (s), the part of the period the streamer needs
+
+    Methods
+    -------
+    percentile(fraction):
+        Lateness below which the given fraction of the packets were sent (s).
+    workPercentile(fraction):
+        Work time below which the given fraction of the packets were evaluated and packed (s).
+    asDict():
+        Counts, lateness and work percentiles.
+
+    Implemented Operations
+    ----------------------
+    str : string = str(StreamStats)
+        S = summary of the counts and the send jitter percentiles.
+    """
+
+    def __init__(self, rate, batchSize):
+        self._rate = rate
+        self._batchSize = batchSize
+        self._frames = 0
+        self._missedDeadlines = 0
+        self._lateness = array("d")
+        self._work = array("d")
+
+    @property
+    def rate(self):
+        return self._rate
+
+    @property
+    def batchSize(self):
+        return self._batchSize
+
+    @property
+    def frames(self):
+        return self._frames
+
+    @property
+    def packets(self):
+        return len(self._lateness)
+
+    @property
+    def missedDeadlines(self):
+        return self._missedDeadlines
+
+    @property
+    def lateness(self):
+        return self._lateness
+
+    @property
+    def work(self):
+        return self._work
+
+    def record(self, frames, lateness, missed, work):
+        self._frames += frames
+        self._lateness.append(lateness)
+        self._missedDeadlines += missed
+        self._work.append(work)
+
+    def percentile(self, fraction):
+        return _percentile(self._lateness, fraction)
+
+    def workPercentile(self, fraction):
+        return _percentile(self._work, fraction)
+
+    def asDict(self):
+        return {"rate": self._rate, "batchSize": self._batchSize, "frames": self._frames, "packets": self.packets,
+                "missedDeadlines": self._missedDeadlines, "p50": self.percentile(0.5), "p90": self.percentile(0.9),
+                "p99": self.percentile(0.99), "p999": self.percentile(0.999), "max": self.percentile(1.0),
+                "workP50": self.workPercentile(0.5), "workP99": self.workPercentile(0.99)}
+
+    def __str__(self):
+        period = self._batchSize/self._rate
+        return ("{} frames in {} packets at {:g} Hz, {} missed deadlines\n"
+                "send jitter p50 {:.1f} us, p99 {:.1f} us, p99.9 {:.1f} us, max {:.1f} us\n"
+                "work per packet p50 {:.1f} us, p99 {:.1f} us ({:.1f}% of the period)").format(
+                    self._frames, self.packets, self._rate, self._missedDeadlines,
+                    self.percentile(0.5)*1e6, self.percentile(0.99)*1e6, self.percentile(0.999)*1e6, self.percentile(1.0)*1e6,
+                    self.workPercentile(0.5)*1e6, self.workPercentile(0.99)*1e6, self.workPercentile(0.99)/period*100)
+
+class SetpointStreamer:
+    """
+    A class to send the setpoints of a planned trajectory at a fixed rate
+
+    ...
+
+    Attributes
+    ----------
+    target : tuple[string, int]
+        host and port of the controller
+    protocol : string
+        "udp" or "tcp"
+    rate : float
+        frames per second
+    batchSize : int
+        frames per packet (the frames of a packet are sent at the deadline of its first frame)
+    tolerance : float
+        lateness above which a packet counts as a missed deadline (s)
+    stats : StreamStats | None
+        timing of the last stream
+
+    Methods
+    -------
+    stream(allCoeffs, times, duration=None):
+        Sends the setpoints of the trajectory (held at the end until duration), and returns the StreamStats.
+    stop():
+        Stops the stream (from another thread).
+    """
+
+    _spinSeconds = 0.0003
+    _switchInterval = 0.0002
+
+    def __init__(self, target, protocol="udp", rate=1000, batchSize=1, tolerance=None):
+        if protocol not in ("udp", "tcp"):
+            raise ValueError("unknown protocol " + repr(protocol))
+        self._target = target
+        self._protocol = protocol
+        self._rate = rate
+        self._batchSize = batchSize
+        self._tolerance = 0.5/rate if tolerance is None else tolerance
+        self._stats = None
+        self._stopped = threading.Event()
+
+    @property
+    def target(self):
+        return self._target
+
+    @property
+    def protocol(self):
+        return self._protocol
+
+    @property
+    def rate(self):
+        return self._rate
+
+    @property
+    def batchSize(self):
+        return self._batchSize
+
+    @property
+    def tolerance(self):
+        return self._tolerance
+
+    @property
+    def stats(self):
+        return self._stats
+
+    def stop(self):
+        self._stopped.set()
+
+    def stream(self, allCoeffs, times, duration=None):
+        """
+        Sends the setpoints of the trajectory at the fixed rate.
+
+        Parameters
+        ----------
+        allCoeffs : array_like (dof x curves x 4)
+            polynomial coefficients for each curve of each joint
+        times : array_like (curves)
+            duration of each curve
+        duration : float = None
+            seconds to stream (the duration of the trajectory if not given; the last setpoint is held after its end)
+
+        Returns
+        -------
+        stats : StreamStats
+            Timing of the stream.
+        """
+
+        # Coefficients of every joint grouped by curve, as Python floats: for a frame or a few, evaluating them in
+        # plain Python costs a fraction of numpy's per-call overhead
+        coeffs = np.asarray(allCoeffs, dtype=float)
+        dof = coeffs.shape[0]
+        curveCoeffs = [[tuple(jointCoeffs) for jointCoeffs in curve] for curve in coeffs.transpose(1, 0, 2).tolist()]
+        times = [float(curveTime) for curveTime in times]
+        endTimes = np.cumsum(times).tolist()
+        lastCurve = len(times) - 1
+        if duration is None:
+            duration = endTimes[-1]
+        numberOfFrames = int(np.floor(duration*self._rate + 1e-9)) + 1
+        period = self._batchSize/self._rate
+        frameStruct = struct.Struct("<" + "d"*(dof + 1))
+
+        self._stats = StreamStats(self._rate, self._batchSize)
+        self._stopped.clear()
+        connection, send = self._connect()
+        switchInterval = sys.getswitchinterval()
+        sys.setswitchinterval(SetpointStreamer._switchInterval)
+        try:
+            curve = 0
+            start = time.perf_counter() + period
+            for packetIndex, first in enumerate(range(0, numberOfFrames, self._batchSize)):
+                if self._stopped.is_set():
+                    break
+
+                # Evaluated before waiting for the deadline, so that only the send happens at the deadline
+                workStart = time.perf_counter()
+                count = min(self._batchSize, numberOfFrames - first)
+                frames = [_packetHeader.pack(_magic, dof, count, first)]
+                for frame in range(first, first + count):
+                    t = frame/self._rate
+                    while curve < lastCurve and t >= endTimes[curve]:
+                        curve += 1
+                    localTime = min(t - endTimes[curve] + times[curve], times[curve])
+                    frames.append(frameStruct.pack(t, *[((c3*localTime + c2)*localTime + c1)*localTime + c0 for c0, c1, c2, c3 in curveCoeffs[curve]]))
+                packet = b"".join(frames)
+                if self._protocol == "tcp":
+                    packet = _packetSize.pack(len(packet)) + packet
+                work = time.perf_counter() - workStart
+
+                deadline = start + packetIndex*period
+                remaining = deadline - time.perf_counter()
+                if remaining > SetpointStreamer._spinSeconds:
+                    time.sleep(remaining - SetpointStreamer._spinSeconds)
+                now = time.perf_counter()
+                while now < deadline:
+                    now = time.perf_counter()
+                send(packet)
+
+                lateness = now - deadline
+                self._stats.record(count, lateness, lateness > self._tolerance, work)
+        finally:
+            sys.setswitchinterval(switchInterval)
+            connection.close()
+
+        return self._stats
+
+    def _connect(self):
+        if self._protocol == "tcp":
+            connection = socket.create_connection(self._target)
+            connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            return connection, connection.sendall
+        # Not connected, so that a controller that is not listening yet does not stop the stream with ICMP errors
+        connection = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sendto = connection.sendto
+        target = self._target
+        return connection, lambda packet: sendto(packet, target)
+
+class ControllerStandIn:
+    """
+    A class to receive setpoint packets on localhost like a controller would, in a background thread
+
+    ...
+
+    Attributes
+    ----------
+    address : tuple[string, int]
+        host and port it listens on
+    protocol : string
+        "udp" or "tcp"
+    frames : int
+        number of frames received
+    lost : int
+        number of frames missing from the sequence
+    lastFrame : tuple[float] | None
+        time and joint values of the last frame received
+    arrivals : array.array
+        time.perf_counter of the arrival of each packet
+
+    Methods
+    -------
+    start():
+        Starts receiving.
+    stop():
+        Stops receiving.
+    arrivalJitter(period):
+        Percentiles (p50, p99, max) of how far the intervals between packets were from the period (s).
+    """
+
+    def __init__(self, protocol="udp", host="127.0.0.1", port=0):
+        self._protocol = protocol
+        if protocol == "tcp":
+            self._socket = socket.create_server((host, port))
+        else:
+            self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self._socket.bind((host, port))
+        self._socket.settimeout(0.2)
+        self._address = self._socket.getsockname()[:2]
+        self._frames = 0
+        self._lost = 0
+        self._nextSequence = 0
+        self._lastFrame = None
+        self._arrivals = array("d")
+        self._running = threading.Event()
+        self._thread = None
+
+    @property
+    def address(self):
+        return self._address
+
+    @property
+    def protocol(self):
+        return self._protocol
+
+    @property
+    def frames(self):
+        return self._frames
+
+    @property
+    def lost(self):
+        return self._lost
+
+    @property
+    def lastFrame(self):
+        return self._lastFrame
+
+    @property
+    def arrivals(self):
+        return self._arrivals
+
+    def start(self):
+        self._running.set()
+        self._thread = threading.Thread(target=self._receiveTCP if self._protocol == "tcp" else self._receiveUDP, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running.clear()
+        if self._thread is not None:
+            self._thread.join()
+        self._socket.close()
+
+    def arrivalJitter(self, period):
+        if len(self._arrivals) < 2:
+            return 0.0, 0.0, 0.0
+        deviations = np.sort(np.abs(np.diff(np.frombuffer(self._arrivals, dtype=float)) - period))
+        return float(np.median(deviations)), float(deviations[int(0.99*(len(deviations) - 1))]), float(deviations[-1])
+
+    def _receiveUDP(self):
+        while self._running.is_set():
+            try:
+                packet = self._socket.recv(65536)
+            except socket.timeout:
+                continue
+            self._packet(packet)
+
+    def _receiveTCP(self):
+        connection = None
+        while self._running.is_set() and connection is None:
+            try:
+                connection, _ = self._socket.accept()
+            except socket.timeout:
+                continue
+        if connection is None:
+            return
+        connection.settimeout(0.2)
+        buffer = b""
+        with connection:
+            while self._running.is_set():
+                try:
+                    data = connection.recv(65536)
+                except socket.timeout:
+                    continue
+                if not data:
+                    break
+                buffer += data
+                while len(buffer) >= _packetSize.size:
+                    size, = _packetSize.unpack_from(buffer)
+                    if len(buffer) < _packetSize.size + size:
+                        break
+                    self._packet(buffer[_packetSize.size:_packetSize.size + size])
+                    buffer = buffer[_packetSize.size + size:]
+
+    def _packet(self, packet):
+        self._arrivals.append(time.perf_counter())
+        magic, dof, count, first = _packetHeader.unpack_from(packet)
+        if magic != _magic:
+            return
+        if first > self._nextSequence:
+            self._lost += first - self._nextSequence
+        self._nextSequence = first + count
+        self._frames += count
+        self._lastFrame = struct.unpack_from("<" + "d"*(dof + 1), packet, _packetHeader.size + (count - 1)*8*(dof + 1))
+
+def _percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = np.sort(np.frombuffer(values, dtype=float))
+    return float(values[min(int(fraction*len(values)), len(values) - 1)])
+
+def _runStandIn(protocol, connection):
+    # Runs in its own process, so that the controller does not compete with the streamer for the GIL
+    standIn = ControllerStandIn(protocol)
+    standIn.start()
+    connection.send(standIn.address)
+    period = connection.recv()
+    standIn.stop()
+    connection.send((standIn.frames, standIn.lost, standIn.arrivalJitter(period)))
+
+def _burnCPU(stopped):
+    # Keeps a core (or, in a thread, the GIL) busy
+    x = 0
+    while not stopped.is_set():
+        for _ in range(10000):
+            x += 1
+
+def _demonstrationPlan():
+    import contextlib
+    import io
+    from barretwam4 import BarretWAM_4
+    from trajectoryPlanner import TrajectoryPlanner
+
+    from point import Point
+
+    manip = BarretWAM_4()
+    jointVals = np.array([(0.2*i, 0.6 + 0.05*i, 0.0, 0.4 + 0.05*i) for i in range(6)])
+    points = [Point(*position) for position in manip.fkineBatch(jointVals).tolist()]
+    with contextlib.redirect_stdout(io.StringIO()):
+        _, coeffs, times = TrajectoryPlanner(manip).trajectoryThroughPoints(points)
+    return coeffs, times
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Streams the setpoints of a planned trajectory at a fixed rate over UDP or TCP.")
+    parser.add_argument("plan", nargs="?", help=".ktcf file with the planned trajectory (a demonstration route if not given)")
+    parser.add_argument("--rate", type=float, default=1000, help="frames per second (default: 1000)")
+    parser.add_argument("--batch", type=int, default=1, help="frames per packet (default: 1)")
+    parser.add_argument("--protocol", choices=("udp", "tcp"), default="udp", help="transport (default: udp)")
+    parser.add_argument("--target", help="host:port of the controller (a local stand-in if not given)")
+    parser.add_argument("--duration", type=float, help="seconds to stream, holding the last setpoint (default: the trajectory's duration)")
+    parser.add_argument("--load-threads", type=int, default=0, help="Python threads kept busy while streaming")
+    parser.add_argument("--load-processes", type=int, default=0, help="processes kept busy while streaming")
+    parser.add_argument("--realtime", action="store_true", help="ask for the SCHED_FIFO real-time scheduling policy")
+    args = parser.parse_args(argv)
+
+    coeffs, times = loadPlan(args.plan) if args.plan else _demonstrationPlan()
+
+    standIn = None
+    if args.target:
+        host, port = args.target.rsplit(":", 1)
+        target = (host, int(port))
+    else:
+        standIn, child = multiprocessing.Pipe()
+        multiprocessing.Process(target=_runStandIn, args=(args.protocol, child), daemon=True).start()
+        target = standIn.recv()
+
+    stopped = multiprocessing.Event()
+    loads = [threading.Thread(target=_burnCPU, args=(stopped,), daemon=True) for _ in range(args.load_threads)]
+    loads += [multiprocessing.Process(target=_burnCPU, args=(stopped,), daemon=True) for _ in range(args.load_processes)]
+    for load in loads:
+        load.start()
+
+    # Only after starting the load and the stand-in, which would otherwise inherit the real-time policy
+    if args.realtime:
+        try:
+            os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(50))
+        except (AttributeError, PermissionError) as e:
+            print("could not use SCHED_FIFO (" + str(e) + "), streaming with the normal policy")
+
+    streamer = SetpointStreamer(target, args.protocol, args.rate, args.batch)
+    try:
+        stats = streamer.stream(coeffs, times, args.duration)
+    finally:
+        stopped.set()
+        for load in loads:
+            load.join()
+
+    print(stats)
+    if standIn is not None:
+        time.sleep(0.05)
+        standIn.send(args.batch/args.rate)
+        frames, lost, (p50, p99, maximum) = standIn.recv()
+        print("controller: {} frames received, {} lost; arrival jitter p50 {:.1f} us, p99 {:.1f} us, max {:.1f} us".format(
+              frames, lost, p50*1e6, p99*1e6, maximum*1e6))
+    return 0 if stats.missedDeadlines == 0 else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
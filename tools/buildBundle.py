@@ -0,0 +1,264 @@
+"""
+BuildBundle
+-----------
+
+Packs the embedded planner ("Embedded version") into a single file to copy to the board, so that starting it reads one
+file instead of a source file and a __pycache__ entry per module from the slow external storage.
+
+The shared modules are copied from the repository root first (tools/syncEmbedded.py), so the bundle never packs a
+stale copy. Only the modules main.py actually imports are packed (found with modulefinder, so curvesBenchmark.py and the like stay
+out). They are compiled beforehand, without docstrings (-OO), as unchecked hash-based bytecode: at startup nothing is
+compiled and nothing is checked against a source. The result is a zipapp:
+
+    python3 -S planner.pyz [plan.ktcf]
+
+runs main.py (-S skips the site module, which the planner does not need).
+
+Bytecode only loads in the Python version (major.minor) that compiled it, so build with the version the board runs (the
+script only needs the standard library, so it can also run on the board), or pass --with-sources so that any other
+version falls back to compiling the sources at every start.
+
+With --report, the startup is measured in fresh processes for three layouts: the source files compiled at every run
+(no __pycache__, as when it cannot be written), the source files with __pycache__, and the bundle, each with and
+without -S. For each one: the -X importtime breakdown of the planner modules and the time to first plan (start the
+interpreter, import, plan a 3 point route with the curved planner and exit). The processes run with KT_BACKEND=python,
+as on the board, which has no numpy.
+
+Usage:
+    python tools/buildBundle.py [-o planner.pyz] [--with-sources] [--python "/usr/bin/env python3"]
+                                [--report [--repeat N] [--json report.json]]
+"""
+
+import argparse
+import json
+import modulefinder
+import os
+import py_compile
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import zipfile
+import syncEmbedded
+
+repositoryDir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+embeddedDir = os.path.join(repositoryDir, "Embedded version")
+
+# Imports what main.py imports and plans a short route, counting the files opened and the folders listed on the way
+# (distinct paths: zipimport opens the bundle again for every module, but it is the same file)
+_firstPlanCode = ("import sys\n"
+                  "touched = set()\n"
+                  "sys.addaudithook(lambda event, args: event in ('open', 'os.listdir', 'os.scandir') and touched.add(str(args[0])))\n"
+                  "sys.path.insert(0, {path!r})\n"
+                  "import trajectoryPlanner, lineTrajectoryPlanner, barretwam4, point\n"
+                  "from point import Point\n"
+                  "from barretwam4 import BarretWAM_4\n"
+                  "from trajectoryPlanner import TrajectoryPlanner\n"
+                  "TrajectoryPlanner(BarretWAM_4()).trajectoryThroughPoints([Point(0.3, 0.2, 0.4), Point(0.4, 0.1, 0.5), Point(0.5, 0.0, 0.4)])\n"
+                  "print(len(touched))\n")
+
+def neededModules(mainFile=None):
+    """
+    Finds the embedded modules imported (directly or not) by the embedded main.py.
+
+    Parameters
+    ----------
+    mainFile : string = None
+        script whose imports are followed (default: Embedded version/main.py)
+
+    Returns
+    -------
+    modules : dict[string, string]
+        File of each module, by module name (sorted by name).
+    """
+
+    finder = modulefinder.ModuleFinder(path=[embeddedDir])
+    finder.run_script(mainFile or os.path.join(embeddedDir, "main.py"))
+    modules = {}
+    for name, module in finder.modules.items():
+        if name != "__main__" and module.__file__ and os.path.dirname(os.path.abspath(module.__file__)) == embeddedDir:
+            modules[name] = module.__file__
+    return dict(sorted(modules.items()))
+
+def buildBundle(output, withSources=False, interpreter="/usr/bin/env python3"):
+    """
+    Builds the single-file bundle of the embedded planner.
+
+    Parameters
+    ----------
+    output : string
+        file to create (a zipapp, e.g. planner.pyz)
+    withSources : bool = False
+        whether to also pack the sources, for Python versions that cannot load the bytecode
+    interpreter : string | None = "/usr/bin/env python3"
+        interpreter of the shebang line (None for no shebang)
+
+    Returns
+    -------
+    modules : list[string]
+        Names of the packed modules (main.py is packed as __main__).
+    """
+
+    modules = neededModules()
+    modules["__main__"] = os.path.join(embeddedDir, "main.py")
+    with tempfile.TemporaryDirectory() as buildDir:
+        with open(output, "wb") as file:
+            if interpreter:
+                file.write(b"#!" + interpreter.encode() + b"\n")
+            # Stored, not deflated: reading a few more KB costs less than loading zlib (another shared library) at startup
+            with zipfile.ZipFile(file, "w", compression=zipfile.ZIP_STORED) as bundle:
+                for name, fileName in modules.items():
+                    compiled = os.path.join(buildDir, name + ".pyc")
+                    # The file name recorded in the bytecode (shown in tracebacks) is the original one
+                    py_compile.compile(fileName, cfile=compiled, dfile=os.path.basename(fileName), doraise=True, optimize=2,
+                                       invalidation_mode=py_compile.PycInvalidationMode.UNCHECKED_HASH)
+                    bundle.write(compiled, name + ".pyc")
+                    if withSources:
+                        bundle.write(fileName, name + ".py")
+    if interpreter:
+        os.chmod(output, os.stat(output).st_mode | 0o111)
+
+    return list(modules)
+
+def measureStartup(command, cwd, modules, repeat=10):
+    """
+    Measures the startup of a command in fresh processes (with -X importtime).
+
+    Parameters
+    ----------
+    command : list[string]
+        interpreter options and arguments (the interpreter and -X importtime are added)
+    cwd : string
+        folder the processes run in
+    modules : list[string]
+        modules whose import times are reported
+    repeat : int = 10
+        number of processes to run
+
+    Returns
+    -------
+    wallSeconds : float
+        Median wall time of the whole process.
+    importSeconds : dict[string, dict[string, float]]
+        Median self and cumulative import time of each module, and "total" (every import of the process).
+    fileAccesses : int | None
+        Distinct files opened and folders listed after the start, if the command prints their number (as the first
+        plan does).
+    """
+
+    environment = dict(os.environ, KT_BACKEND="python")
+    wallTimes = []
+    fileAccesses = None
+    importTimes = {module: {"self": [], "cumulative": []} for module in [*modules, "total"]}
+    for _ in range(repeat):
+        start = time.perf_counter()
+        process = subprocess.run([sys.executable, "-X", "importtime", *command], cwd=cwd, env=environment, capture_output=True, text=True, check=True)
+        wallTimes.append(time.perf_counter() - start)
+        if process.stdout.strip().isdigit():
+            fileAccesses = int(process.stdout)
+
+        found = {}
+        total = 0
+        for line in process.stderr.splitlines():
+            # import time: self [us] | cumulative | imported package
+            fields = line.removeprefix("import time:").split("|")
+            if len(fields) != 3 or not fields[1].strip().isdigit():
+                continue
+            name = fields[2].strip()
+            total += int(fields[0])
+            if name in importTimes:
+                found[name] = (int(fields[0]), int(fields[1]))
+        found["total"] = (total, total)
+        for name, times in importTimes.items():
+            selfTime, cumulative = found.get(name, (0, 0))
+            times["self"].append(selfTime*1e-6)
+            times["cumulative"].append(cumulative*1e-6)
+
+    importSeconds = {name: {kind: statistics.median(values) for kind, values in times.items()} for name, times in importTimes.items()}
+    return statistics.median(wallTimes), importSeconds, fileAccesses
+
+def startupReport(bundleFile, repeat=10, log=print):
+    """
+    Measures the time to first plan and the import times of the planner in the three layouts (sources compiled at
+    every run, sources with __pycache__, bundle), with and without -S.
+
+    Parameters
+    ----------
+    bundleFile : string
+        bundle built by buildBundle
+    repeat : int = 10
+        number of processes for each measurement
+    log : function = print
+        receives the lines of the report
+
+    Returns
+    -------
+    report : dict
+        Python version, bundle size, and for each layout the empty process time, the time to first plan, the import
+        times of each module and the number of files opened and folders listed.
+    """
+
+    modules = list(neededModules())
+    report = {"python": sys.version.split()[0], "bundleBytes": os.path.getsize(bundleFile), "modules": modules, "layouts": {}}
+    log("python " + report["python"] + ", bundle of " + str(len(modules) + 1) + " modules, " + str(round(report["bundleBytes"]/1024, 1)) + " KB")
+
+    with tempfile.TemporaryDirectory() as workDir:
+        # Copies of the needed sources, so that the layouts do not depend on the __pycache__ of the repository
+        sourcesDir = os.path.join(workDir, "sources")
+        cachedDir = os.path.join(workDir, "cached")
+        for folder in (sourcesDir, cachedDir):
+            os.mkdir(folder)
+            for module in modules:
+                shutil.copy(os.path.join(embeddedDir, module + ".py"), folder)
+        for module in modules:
+            py_compile.compile(os.path.join(cachedDir, module + ".py"), doraise=True)
+
+        layouts = {"sources": (["-B"], sourcesDir), "__pycache__": ([], cachedDir), "bundle": ([], os.path.abspath(bundleFile))}
+        log("{:<16}{:>12}{:>18}{:>16}{:>20}{:>16}".format("layout", "empty (ms)", "first plan (ms)", "planner (ms)", "all imports (ms)", "file accesses"))
+        for layoutName, (options, path) in layouts.items():
+            for skipSite in (False, True):
+                siteOptions = ["-S"] if skipSite else []
+                emptyWall, _, _ = measureStartup([*options, *siteOptions, "-c", "pass"], workDir, [], repeat)
+                code = _firstPlanCode.format(path=path)
+                wall, imports, fileAccesses = measureStartup([*options, *siteOptions, "-c", code], workDir, modules, repeat)
+                name = layoutName + (" -S" if skipSite else "")
+                report["layouts"][name] = {"emptyProcessSeconds": emptyWall, "firstPlanSeconds": wall, "importSeconds": imports, "fileAccesses": fileAccesses}
+                plannerImports = sum(imports[module]["self"] for module in modules)
+                log("{:<16}{:>12.1f}{:>18.1f}{:>16.1f}{:>20.1f}{:>16}".format(name, emptyWall*1e3, wall*1e3, plannerImports*1e3,
+                                                                          imports["total"]["self"]*1e3, fileAccesses))
+
+    log("")
+    log("import time of each module (self, ms):")
+    log("{:<24}".format("module") + "".join("{:>16}".format(name) for name in report["layouts"]))
+    for module in [*modules, "total"]:
+        log("{:<24}".format(module) + "".join("{:>16.2f}".format(layout["importSeconds"][module]["self"]*1e3) for layout in report["layouts"].values()))
+
+    return report
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Packs the embedded planner into a single precompiled zipapp.")
+    parser.add_argument("-o", "--output", default="planner.pyz", help="bundle to create (default: planner.pyz)")
+    parser.add_argument("--with-sources", action="store_true", help="also pack the sources, for other Python versions")
+    parser.add_argument("--python", default="/usr/bin/env python3", help="interpreter of the shebang line ('' for none)")
+    parser.add_argument("--report", action="store_true", help="measure the startup of the sources and of the bundle")
+    parser.add_argument("--repeat", type=int, default=10, help="processes per measurement of the report (default: 10)")
+    parser.add_argument("--json", help="also write the report to this JSON file")
+    args = parser.parse_args(argv)
+
+    for module in syncEmbedded.syncEmbedded():
+        print("copied " + module + " to Embedded version")
+    modules = buildBundle(args.output, args.with_sources, args.python or None)
+    print(args.output + ": " + ", ".join(modules) + " (Python " + str(sys.version_info[0]) + "." + str(sys.version_info[1]) + " bytecode)")
+
+    if args.report:
+        print()
+        report = startupReport(args.output, args.repeat)
+        if args.json:
+            with open(args.json, "w") as file:
+                json.dump(report, file, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,75 @@
+"""
+SyncEmbedded
+------------
+
+Copies the modules shared by the workstation and the embedded board from the repository root (their only source) to
+"Embedded version", so that the board runs the same planning code as the workstation. Edit the modules at the root and
+run this script (tools/buildBundle.py runs it before packing); --check only compares the copies, and fails when one of
+them differs from its source (e.g. in a pre-commit hook or CI).
+
+Usage:
+    python tools/syncEmbedded.py [--check]
+"""
+
+import argparse
+import filecmp
+import os
+import shutil
+import sys
+
+repositoryDir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+embeddedDir = os.path.join(repositoryDir, "Embedded version")
+
+# Modules with no tree-specific code (standard library only). trajectoryPlanner.py, manipulator.py and barretwam4.py
+# are not among them: the workstation's use numpy, the board's linalg.py
+sharedModules = ("backend.py", "coeffsWire.py", "joints.py", "lineTrajectoryPlanner.py", "point.py", "splinePlanner.py")
+
+def staleCopies():
+    """
+    Finds the shared modules whose copy in "Embedded version" is missing or differs from the source.
+
+    Returns
+    -------
+    modules : list[string]
+        File names of the stale copies.
+    """
+
+    stale = []
+    for module in sharedModules:
+        copy = os.path.join(embeddedDir, module)
+        if not os.path.exists(copy) or not filecmp.cmp(os.path.join(repositoryDir, module), copy, shallow=False):
+            stale.append(module)
+    return stale
+
+def syncEmbedded():
+    """
+    Copies the stale shared modules to "Embedded version".
+
+    Returns
+    -------
+    modules : list[string]
+        File names of the copied modules (empty if every copy was up to date).
+    """
+
+    stale = staleCopies()
+    for module in stale:
+        shutil.copyfile(os.path.join(repositoryDir, module), os.path.join(embeddedDir, module))
+    return stale
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Copies the shared modules to the embedded tree.")
+    parser.add_argument("--check", action="store_true", help="only check the copies; exit with 1 if one differs")
+    args = parser.parse_args(argv)
+
+    if args.check:
+        stale = staleCopies()
+        for module in stale:
+            print("Embedded version/" + module + " differs from " + module + " (run tools/syncEmbedded.py)")
+        return 1 if stale else 0
+
+    for module in syncEmbedded():
+        print("copied " + module)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
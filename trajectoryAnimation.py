@@ -0,0 +1,217 @@
+"""
+TrajectoryAnimation
+-------------------
+
+Animation of the whole manipulator moving along a planned trajectory.
+
+The position of every link frame, for every frame of the animation, is calculated up front in one call to the
+manipulator's framePositions. Each frame then only updates the data of the arm and trail artists and redraws them over
+a cached background (blitting), instead of redrawing the whole 3D figure.
+
+The animation is shown on screen, or rendered headlessly (Agg canvas) to a GIF, to a video (through ffmpeg) or
+to an image sequence (a file name with a printf-style frame number, e.g. "frames/arm_%04d.png").
+"""
+
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+import numpy as np
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+class AnimationReport:
+    """
+    A class to represent how fast an animation was rendered
+
+    ...
+
+    Attributes
+    ----------
+    frames : int
+        number of frames rendered
+    seconds : float
+        wall time spent rendering them
+    fps : float
+        achieved frames per second
+
+    Implemented Operations
+    ----------------------
+    str : string = str(AnimationReport)
+        S = "frames frames in seconds s (fps fps)".
+    """
+
+    def __init__(self, frames, seconds):
+        self._frames = frames
+        self._seconds = seconds
+
+    @property
+    def frames(self):
+        return self._frames
+
+    @property
+    def seconds(self):
+        return self._seconds
+
+    @property
+    def fps(self):
+        return self._frames/self._seconds if self._seconds > 0 else float("inf")
+
+    def __str__(self):
+        return str(self._frames) + " frames in " + str(round(self._seconds, 3)) + " s (" + str(round(self.fps, 1)) + " fps)"
+
+def animateManipulator(manip, values, timeVector, fps=30, fileName=None):
+    """
+    Animates the manipulator following the joint values in time, in real time.
+
+    Parameters
+    ----------
+    manip : Manipulator
+        manipulator to animate, must implement framePositions
+    values : tuple[tuple[float]]
+        values of each joint values
+    timeVector : tuple[float]
+        times of each joint values
+    fps : float = 30
+        frames per second of the animation
+    fileName : string = None
+        file to render the animation to (.gif, a video extension such as .mp4, or an image name with a frame number
+        such as "arm_%04d.png"); if not given, the animation is shown on screen
+
+    Returns
+    -------
+    report : AnimationReport
+        Number of frames rendered and achieved frames per second.
+    """
+
+    timeVector = np.asarray(timeVector, dtype=float)
+    frameTimes = np.arange(timeVector[0], timeVector[-1], 1/fps)
+    frameTimes = np.append(frameTimes, timeVector[-1])
+    jointVals = np.stack([np.interp(frameTimes, timeVector, jointValues) for jointValues in values], axis=1)
+    positions = np.asarray(manip.framePositions(jointVals), dtype=float)
+
+    if fileName is None:
+        return _showAnimation(positions, frameTimes, fps)
+    return _renderAnimation(positions, frameTimes, fps, fileName)
+
+def _setupFigure(fig, positions):
+    axs = fig.add_subplot(projection="3d")
+    lower, upper = positions.reshape(-1, 3).min(axis=0), positions.reshape(-1, 3).max(axis=0)
+    center, halfSize = (lower + upper)/2, max((upper - lower).max()/2, 1e-3)
+    axs.set(xlim=(center[0] - halfSize, center[0] + halfSize), ylim=(center[1] - halfSize, center[1] + halfSize),
+            zlim=(center[2] - halfSize, center[2] + halfSize), xlabel="x (m)", ylabel="y (m)", zlabel="z (m)")
+    axs.set_title("Manipulator")
+
+    trail, = axs.plot([], [], [], color="tab:blue", linewidth=1, animated=True)
+    arm, = axs.plot([], [], [], "o-", color="black", linewidth=3, markersize=5, animated=True)
+    clock = axs.text2D(0.02, 0.95, "", transform=axs.transAxes, animated=True)
+
+    def update(frameIndex, frameTimes):
+        arm.set_data_3d(*positions[frameIndex].T)
+        trail.set_data_3d(*positions[:frameIndex + 1, -1].T)
+        clock.set_text("t = " + str(round(frameTimes[frameIndex], 2)) + " s")
+        return trail, arm, clock
+
+    return axs, update
+
+def _showAnimation(positions, frameTimes, fps):
+    import matplotlib.pyplot as plt
+    from matplotlib.animation import FuncAnimation
+
+    fig = plt.figure()
+    _, update = _setupFigure(fig, positions)
+    framesDrawn = [0]
+
+    def drawFrame(frameIndex):
+        framesDrawn[0] += 1
+        return update(frameIndex, frameTimes)
+
+    start = time.perf_counter()
+    animation = FuncAnimation(fig, drawFrame, frames=len(frameTimes), interval=1000/fps, blit=True, repeat=False)
+    plt.show()
+    del animation
+
+    return AnimationReport(framesDrawn[0], time.perf_counter() - start)
+
+def _renderAnimation(positions, frameTimes, fps, fileName):
+    fig = Figure()
+    canvas = FigureCanvasAgg(fig)
+    axs, update = _setupFigure(fig, positions)
+
+    # The static part of the figure (axes, grid, labels) is drawn once and restored under each frame
+    canvas.draw()
+    background = canvas.copy_from_bbox(fig.bbox)
+    width, height = canvas.get_width_height()
+    sink = _FrameSink(fileName, width, height, fps)
+
+    start = time.perf_counter()
+    try:
+        for frameIndex in range(len(frameTimes)):
+            canvas.restore_region(background)
+            for artist in update(frameIndex, frameTimes):
+                axs.draw_artist(artist)
+            sink.write(np.asarray(canvas.buffer_rgba()))
+    finally:
+        sink.close()
+
+    return AnimationReport(len(frameTimes), time.perf_counter() - start)
+
+class _FrameSink:
+    def __init__(self, fileName, width, height, fps):
+        self._fileName = fileName
+        self._fps = fps
+        self._frames = []
+        self._frameIndex = 0
+        self._process = None
+
+        extension = os.path.splitext(fileName)[1].lower()
+        if "%" in fileName:
+            self._mode = "images"
+            os.makedirs(os.path.dirname(fileName) or ".", exist_ok=True)
+        elif extension == ".gif":
+            self._mode = "gif"
+        else:
+            ffmpeg = shutil.which("ffmpeg")
+            if ffmpeg is None:
+                raise RuntimeError("ffmpeg is needed to render " + fileName + " (use a .gif or an image sequence instead)")
+            self._mode = "video"
+            # ffmpeg's messages go to a file, not a pipe: nobody reads them while the frames are written, and a full pipe
+            # would block it
+            self._errors = tempfile.TemporaryFile()
+            self._process = subprocess.Popen([ffmpeg, "-y", "-loglevel", "error", "-f", "rawvideo", "-pix_fmt", "rgba",
+                                              "-s", str(width) + "x" + str(height), "-r", str(fps), "-i", "-",
+                                              "-pix_fmt", "yuv420p", fileName], stdin=subprocess.PIPE, stderr=self._errors)
+
+    def write(self, rgba):
+        if self._mode == "images":
+            from PIL import Image
+            Image.fromarray(rgba).save(self._fileName % self._frameIndex)
+        elif self._mode == "gif":
+            from PIL import Image
+            self._frames.append(Image.fromarray(rgba).convert("P", palette=Image.ADAPTIVE))
+        else:
+            try:
+                self._process.stdin.write(rgba.tobytes())
+            except BrokenPipeError:
+                # ffmpeg has exited: close raises with its messages
+                self.close()
+                raise
+        self._frameIndex += 1
+
+    def close(self):
+        if self._mode == "gif" and self._frames:
+            self._frames[0].save(self._fileName, save_all=True, append_images=self._frames[1:], duration=round(1000/self._fps), loop=0)
+        elif self._mode == "video" and self._process is not None:
+            process, self._process = self._process, None
+            try:
+                process.stdin.close()
+            except BrokenPipeError:
+                pass
+            process.wait()
+            self._errors.seek(0)
+            errors = self._errors.read().decode(errors="replace").strip()
+            self._errors.close()
+            if process.returncode != 0:
+                raise RuntimeError("ffmpeg failed to render " + self._fileName + " (exit status " + str(process.returncode) + ")"
+                                   + (":\n" + "\n".join(errors.splitlines()[-10:]) if errors else ""))
@@ -0,0 +1,203 @@
+"""
+TrajectoryFile
+--------------
+
+Compact binary files of sampled trajectories, so that planned motions can be saved, shipped and replayed without
+planning again.
+
+A file is a small header followed by the joint values of every sample, as one contiguous little-endian float array
+(sample-major: the values of all joints at the first sample, then at the second, ...). Samples are taken at a fixed
+rate, so the time of sample k is k/rate and no time column is stored.
+
+Header (little-endian):
+    magic           8 bytes     b"KTTRAJ01"
+    headerSize      uint32      offset of the samples from the start of the file (multiple of 64)
+    dof             uint32      number of joints
+    rate            float64     samples per second
+    numberOfSamples uint64      number of samples
+    itemSize        uint32      bytes per value (8 for float64, 4 for float32)
+    nameSize        uint16      followed by the manipulator name (UTF-8)
+    unitsSize       uint16      followed by the unit of each joint, comma separated (e.g. "rad,rad,m")
+    padding                     zeros up to headerSize
+
+Files are written one chunk of samples at a time, so they can be far larger than the memory of the writer, and read
+through a memory map, so any time window is a zero-copy slice of the file.
+"""
+
+import struct
+import numpy as np
+
+_magic = b"KTTRAJ01"
+_fixedHeader = struct.Struct("<8sIIdQI")
+_sizeField = struct.Struct("<H")
+_headerAlignment = 64
+_dtypes = {8: np.dtype("<f8"), 4: np.dtype("<f4")}
+
+def writeTrajectory(fileName, manip, rate, chunks, dtype=np.float64):
+    """
+    Writes sampled joint values to a trajectory file, one chunk at a time.
+
+    Parameters
+    ----------
+    fileName : string
+        file to write
+    manip : Manipulator
+        manipulator whose joint values are written (name, dof and joint types go to the header)
+    rate : float
+        samples per second of the joint values
+    chunks : Iterable[array_like (N x dof)]
+        consecutive chunks of samples, each with the values of every joint
+    dtype : numpy.dtype = numpy.float64
+        numpy.float64 or numpy.float32
+
+    Returns
+    -------
+    numberOfSamples : int
+        Number of samples written.
+    """
+
+    dtype = np.dtype(dtype).newbyteorder("<")
+    if dtype.itemsize not in _dtypes or dtype.kind != "f":
+        raise ValueError("Trajectory files store float64 or float32 values!")
+
+    name = str(manip).encode("utf-8")
+    units = ",".join("rad" if jointType else "m" for jointType in manip.jointTypes).encode("ascii")
+    variablePart = _sizeField.pack(len(name)) + name + _sizeField.pack(len(units)) + units
+    headerSize = -(-(_fixedHeader.size + len(variablePart))//_headerAlignment)*_headerAlignment
+
+    numberOfSamples = 0
+    with open(fileName, "wb") as file:
+        file.write(bytes(headerSize))
+        for chunk in chunks:
+            chunk = np.asarray(chunk, dtype=dtype).reshape(-1, manip.dof)
+            file.write(np.ascontiguousarray(chunk).tobytes())
+            numberOfSamples += len(chunk)
+
+        # The number of samples is only known at the end, so the header is written last
+        file.seek(0)
+        file.write(_fixedHeader.pack(_magic, headerSize, manip.dof, rate, numberOfSamples, dtype.itemsize) + variablePart)
+
+    return numberOfSamples
+
+class TrajectoryFile:
+    """
+    A class to read a trajectory file through a memory map
+
+    ...
+
+    Attributes
+    ----------
+    manipulatorName : string
+        name of the manipulator of the trajectory
+    dof : int
+        number of joints
+    rate : float
+        samples per second
+    jointUnits : tuple[string]
+        unit of each joint ("rad" or "m")
+    numberOfSamples : int
+        number of samples
+    duration : float
+        time of the last sample
+    values : numpy.memmap (numberOfSamples x dof)
+        joint values of every sample (read-only, zero-copy)
+
+    Methods
+    -------
+    window(startTime, endTime):
+        Returns the joint values and times of the samples between startTime and endTime (zero-copy).
+    close():
+        Releases the memory map (slices already taken stay valid).
+    """
+
+    def __init__(self, fileName):
+        with open(fileName, "rb") as file:
+            fixedPart = file.read(_fixedHeader.size)
+            if len(fixedPart) < _fixedHeader.size or fixedPart[:len(_magic)] != _magic:
+                raise ValueError(fileName + " is not a trajectory file!")
+            _, headerSize, self._dof, self._rate, self._numberOfSamples, itemSize = _fixedHeader.unpack(fixedPart)
+            variablePart = file.read(headerSize - _fixedHeader.size)
+
+        if itemSize not in _dtypes:
+            raise ValueError(fileName + " has an unknown value size!")
+        nameSize, = _sizeField.unpack_from(variablePart, 0)
+        self._manipulatorName = variablePart[2:2 + nameSize].decode("utf-8")
+        unitsSize, = _sizeField.unpack_from(variablePart, 2 + nameSize)
+        units = variablePart[4 + nameSize:4 + nameSize + unitsSize].decode("ascii")
+        self._jointUnits = tuple(units.split(",")) if units else ()
+
+        if self._numberOfSamples > 0:
+            self._values = np.memmap(fileName, dtype=_dtypes[itemSize], mode="r", offset=headerSize, shape=(self._numberOfSamples, self._dof))
+        else:
+            self._values = np.empty((0, self._dof), dtype=_dtypes[itemSize])
+
+    @property
+    def manipulatorName(self):
+        return self._manipulatorName
+
+    @property
+    def dof(self):
+        return self._dof
+
+    @property
+    def rate(self):
+        return self._rate
+
+    @property
+    def jointUnits(self):
+        return self._jointUnits
+
+    @property
+    def numberOfSamples(self):
+        return self._numberOfSamples
+
+    @property
+    def duration(self):
+        return max(self._numberOfSamples - 1, 0)/self._rate
+
+    @property
+    def values(self):
+        return self._values
+
+    def window(self, startTime, endTime):
+        """
+        Returns the samples between startTime and endTime (both included), without copying them.
+
+        Parameters
+        ----------
+        startTime : float
+            time of the first sample of the window
+        endTime : float
+            time of the last sample of the window
+
+        Returns
+        -------
+        values : numpy.ndarray (N x dof)
+            Joint values of the samples in the window (a view of the file).
+        timeVector : numpy.ndarray (N)
+            Time of each sample in the window.
+        """
+
+        # A small tolerance keeps samples exactly on the window limits despite rounding of the times
+        first = max(int(np.ceil(startTime*self._rate - 1e-9)), 0)
+        last = min(int(np.floor(endTime*self._rate + 1e-9)), self._numberOfSamples - 1)
+        last = max(last, first - 1)
+
+        return self._values[first:last + 1], np.arange(first, last + 1)/self._rate
+
+    def close(self):
+        """
+        Releases the memory map of the file. Slices already taken keep their own reference to it.
+
+        Returns
+        -------
+        None
+        """
+
+        self._values = np.empty((0, self._dof), dtype=self._values.dtype)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
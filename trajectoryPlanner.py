@@ -1,9 +1,19 @@
+import time
+import tracemalloc
+from collections import OrderedDict
 import numpy as np
-import matplotlib.pyplot as plt
+try:
+    from scipy.linalg import lu_factor, lu_solve
+except ImportError:
+    lu_factor = lu_solve = None
+import backend
+import instrumentation
+from planDiagnostics import PlanDiagnostics, estimatePlanMemory
+from splinePlanner import SplinePlanner
 from point import Point
 from manipulator import Manipulator
 
-class TrajectoryPlanner:
+class TrajectoryPlanner(SplinePlanner):
     """ 
     A class to calculate the trajectory of the end-effector of given manipulator
 
@@ -13,25 +23,70 @@ class TrajectoryPlanner:
     ----------
     manip : Manipulator
         manipulator for which the trajectory will be calculated
+    memoryBudget : int | None
+        bytes a plan may use; if given, the planner picks the solver and the sampling that fit in it
+    diagnostics : PlanDiagnostics | None
+        memory estimate, decisions and peak memory of the last plan (only with a memory budget)
+    verbose : bool
+        whether trajectoryThroughPoints prints when the trajectory goes outside the workspace
     
     Methods
     -------
     trajectoryThroughPoints(pathPoints):
         Calculates a trajectory for the end-effector through all the points in pathPoints.
+    trajectoryFromPlan(fileName):
+        Loads a trajectory planned on the workstation and packed by coeffsWire.
     curvesValues(allCoeffs, times):
         Calculates values in time of joint values curve for given polynomial coefficients and curve durations.
-    drawJointCurves(values, timeVector):
-        Plots the curves of joint values x time for given values in time.
-    drawTrajectory(values, timeVector, pointsToMark=None):
+    curvesSamples(allCoeffs, times):
+        Yields the values in time of joint values curve one time step at a time (constant memory).
+    curvesValuesStream(allCoeffs, times):
+        Yields the values in time of joint values curve a few curves at a time (as many as fit in the memory budget).
+    curvesValuesChunks(allCoeffs, times, rate, chunkSize=65536):
+        Yields the joint values sampled at a fixed rate, one chunk of samples at a time.
+    exportTrajectory(allCoeffs, times, fileName, rate=1000, dtype=numpy.float64):
+        Writes the joint values sampled at a fixed rate to a trajectory file (see trajectoryFile).
+    curvesRates(allCoeffs, times):
+        Calculates joint values, velocities and accelerations in time for given polynomial coefficients and curve durations.
+    cartesianCurvesValues(allCoeffs, times):
+        Calculates the end-effector's cartesian velocity and acceleration in time for given polynomial coefficients and curve durations.
+    drawJointCurves(values, timeVector, fileName=None):
+        Plots the curves of joint values x time for given values in time (saved to fileName, if given).
+    drawTrajectory(values, timeVector, pointsToMark=None, fileName=None):
         Plots the trajectory of end-effector in 3D based on the joint values in time. Also highlights the start and end points of the trajectory. 
         If the argument pointsToMark is given, then highlights the points in pointsToMark.
-    """
+    animateManipulator(values, timeVector, fps=30, fileName=None):
+        Animates the whole manipulator following the joint values in time (rendered to fileName, if given).
 
-    _trajectoryDescription = "Curved trajectory through points"
-    _numberOfPointsPerStepForCurveDrawing = 100
+    The steps shared with the embedded planner (joint values at the points, durations from the speed, trajectoryFromPlan,
+    curvesSamples) are SplinePlanner's (splinePlanner.py).
+    """
 
-    def __init__(self, manip : Manipulator):
-        self._manip = manip
+    _minimumStepDuration = 0.01
+    _timeScalingTolerance = 1e-3
+    _timeScalingMargin = 1e-9
+    _maxTimeScalingIterations = 50
+    _factorizationCacheSize = 64
+    _factorizationCacheBytes = 64*2**20
+    _factorizationTimeQuantum = 1e-12
+    _solvesBeforeFactorizing = 2
+    _solveCountsSize = 256
+
+    def __init__(self, manip : Manipulator, memoryBudget:int = None, verbose:bool = True):
+        super().__init__(manip, verbose)
+        self._memoryBudget = memoryBudget
+        self._diagnostics = None
+        self._factorizations = OrderedDict()
+        self._factorizationBytes = 0
+        self._solveCounts = OrderedDict()
+
+    @property
+    def memoryBudget(self):
+        return self._memoryBudget
+
+    @property
+    def diagnostics(self):
+        return self._diagnostics
 
     def trajectoryThroughPoints(self, pathPoints:tuple[Point]):
         """
@@ -39,6 +94,10 @@ class TrajectoryPlanner:
         Defines a 3rd degree polynomial trajectory between the 2 points in each pair of points.
         Every trajectory is defined to have continuous acceleration and speed curves.
         By joining all of the curves, the total trajectory through all points is defined to have initial and final speeds of zero.
+        If the manipulator declares joint velocity limits (and optionally acceleration limits), each curve gets the minimum
+        duration that keeps every joint within them; otherwise durations come from the end-effector's average speed.
+        With a memory budget, the peak memory is estimated before any work and the curves are calculated from a banded
+        (tridiagonal) system instead of the dense one when the dense one would not fit; see diagnostics.
 
         Parameters
         ----------
@@ -58,24 +117,17 @@ class TrajectoryPlanner:
         if len(pathPoints) < 2:
             raise ValueError("Needs at least 2 points to calculate trajectory")
 
-        coeffs = [None] * self._manip.dof
-        times = [0] * (len(pathPoints) - 1)
-        if not self._manip.isInWorkspace(pathPoints):
-            print("Trajectory goes OUTSIDE the Workspace!!")
-            return False, coeffs, times
-
-        formattedPathJointVals = self._calculateJointValuesOnPathPoints(pathPoints)
-        times = self._estimateTrajectoryStepsDuration(pathPoints)
-
-        for jointIndex in range(self._manip.dof):
-            coeffs[jointIndex] = self._polynomialCurvesThroughJointValues(formattedPathJointVals[jointIndex], times)
-
-        return True, coeffs, times
+        if self._memoryBudget is None:
+            return self._planTrajectory(pathPoints, "dense")
+        return self._planTrajectoryWithinBudget(pathPoints)
 
     def curvesValues(self, allCoeffs:tuple[tuple[tuple[float]]], times:tuple[float]):
         """
         Calculates values in time of joint values curve for given polynomial coefficients and curve durations.
-        
+        With a memory budget, the values are calculated a few curves at a time (as curvesValuesStream does) straight
+        into the lists, so that little more than the lists themselves is in memory; if the lists for these curves would
+        not fit in the budget, MemoryError is raised: sample them with curvesValuesStream instead.
+
         Parameters
         ----------
         allCoeffs:tuple[tuple[tuple[float]]]
@@ -91,33 +143,246 @@ class TrajectoryPlanner:
             Times of each joint values. 
         """
 
-        formattedTimes = [0]
-        for timeIndex in range(len(times)):
-            formattedTimes.append(formattedTimes[timeIndex] + times[timeIndex])
-
-        timeVector = []
-        formattedTimeVector = []
-        for timeIndex in range(len(times)):
-            if timeIndex == len(times) - 1:
-                t = np.linspace(formattedTimes[timeIndex], formattedTimes[timeIndex+1], TrajectoryPlanner._numberOfPointsPerStepForCurveDrawing + 1, endpoint=True)
-            else:
-                t = np.linspace(formattedTimes[timeIndex], formattedTimes[timeIndex+1], TrajectoryPlanner._numberOfPointsPerStepForCurveDrawing, endpoint=False)
-            timeVector += [*t]
-            formattedTimeVector.append(t)
-
-        allValues = [None] * self._manip.dof
-        for jointIndex in range(len(allCoeffs)):
-            allValues[jointIndex] = []
-            for curveIndex in range(len(allCoeffs[jointIndex])):
-                for time in formattedTimeVector[curveIndex]:
-                    coeffs = allCoeffs[jointIndex][curveIndex]
-                    t = time - formattedTimes[curveIndex]
-                    value = coeffs[3]*(t**3) + coeffs[2]*(t**2) + coeffs[1]*(t) + coeffs[0]
-                    allValues[jointIndex].append(value)
+        if self._memoryBudget is not None:
+            return self._curvesValuesWithinBudget(allCoeffs, times)
+
+        with instrumentation.span("curvesValues", curves=len(times)):
+            formattedTimes = [0]
+            for timeIndex in range(len(times)):
+                formattedTimes.append(formattedTimes[timeIndex] + times[timeIndex])
+
+            timeVector = []
+            formattedTimeVector = []
+            for timeIndex in range(len(times)):
+                if timeIndex == len(times) - 1:
+                    t = np.linspace(formattedTimes[timeIndex], formattedTimes[timeIndex+1], TrajectoryPlanner._numberOfPointsPerStepForCurveDrawing + 1, endpoint=True)
+                else:
+                    t = np.linspace(formattedTimes[timeIndex], formattedTimes[timeIndex+1], TrajectoryPlanner._numberOfPointsPerStepForCurveDrawing, endpoint=False)
+                timeVector += [*t]
+                formattedTimeVector.append(t)
+
+            allValues = [None] * self._manip.dof
+            for jointIndex in range(len(allCoeffs)):
+                allValues[jointIndex] = []
+                for curveIndex in range(len(allCoeffs[jointIndex])):
+                    for time in formattedTimeVector[curveIndex]:
+                        coeffs = allCoeffs[jointIndex][curveIndex]
+                        t = time - formattedTimes[curveIndex]
+                        value = coeffs[3]*(t**3) + coeffs[2]*(t**2) + coeffs[1]*(t) + coeffs[0]
+                        allValues[jointIndex].append(value)
+
+        instrumentation.count("samples", len(timeVector))
+        return allValues, timeVector
+
+    def _curvesValuesWithinBudget(self, allCoeffs, times):
+        coeffs = np.asarray(allCoeffs, dtype=float)
+        estimate = estimatePlanMemory(len(times) + 1, len(coeffs), TrajectoryPlanner._numberOfPointsPerStepForCurveDrawing)
+        available = self._memoryBudget - coeffs.nbytes - estimate["samples"]
+        if available <= 0:
+            raise MemoryError("The samples of " + str(len(times)) + " curves need about " + str(estimate["samples"]) + " bytes as lists, more than the memory budget ("
+                              + str(self._memoryBudget) + " bytes): sample them with curvesValuesStream")
+
+        # The lists are filled a chunk of curves at a time, in what they leave of the budget
+        with instrumentation.span("curvesValues", curves=len(times), chunked=True):
+            allValues = [[] for _ in range(len(coeffs))]
+            timeVector = []
+            for values, chunkTimes in self._curvesValuesChunksOf(coeffs, times, self._curvesPerChunk(len(times), len(coeffs), available)):
+                for jointValues, chunkValues in zip(allValues, values.T):
+                    jointValues += chunkValues.tolist()
+                timeVector += chunkTimes.tolist()
 
         return allValues, timeVector
 
-    def drawJointCurves(self, values:tuple[tuple[float]], timeVector:tuple[float]):
+    def curvesValuesStream(self, allCoeffs:tuple[tuple[tuple[float]]], times:tuple[float]):
+        """
+        Yields the values in time of joint values curve (the same samples as curvesValues) a few curves at a time:
+        all of them at once without a memory budget, or as many as fit in the memory budget (at least one).
+
+        Parameters
+        ----------
+        allCoeffs:tuple[tuple[tuple[float]]]
+            curves coefficients to create values in time of joint values
+        times:tuple[float]
+            duration of each curve
+
+        Yields
+        ------
+        values : numpy.ndarray (samples x dof)
+            Values of each joint at each sample of the chunk.
+        timeVector : numpy.ndarray (samples)
+            Time of each sample of the chunk.
+        """
+
+        coeffs = np.asarray(allCoeffs, dtype=float)
+        if self._memoryBudget is None:
+            curvesPerChunk = len(times)
+        else:
+            curvesPerChunk = self._curvesPerChunk(len(times), len(coeffs), self._memoryBudget - coeffs.nbytes)
+        yield from self._curvesValuesChunksOf(coeffs, times, curvesPerChunk)
+
+    def _curvesPerChunk(self, numberOfCurves, dof, availableBytes):
+        # Curves whose chunk arrays (see _curvesValuesChunksOf) fit in the available bytes, at least one
+        bytesPerCurve = estimatePlanMemory(numberOfCurves + 1, dof, TrajectoryPlanner._numberOfPointsPerStepForCurveDrawing)["streamedCurve"]
+        return int(min(max(availableBytes//bytesPerCurve, 1), max(numberOfCurves, 1)))
+
+    def _curvesValuesChunksOf(self, coeffs, times, curvesPerChunk):
+        # Each chunk is evaluated in place in one (dof x curves x samples) array, so it only takes its values, the
+        # times of its samples and the offsets in its curves; the end of the last curve comes last, on its own
+        times = np.asarray(times, dtype=float)
+        startTimes = np.concatenate(([0], np.cumsum(times)[:-1]))
+        numberOfPoints = TrajectoryPlanner._numberOfPointsPerStepForCurveDrawing
+        fractions = np.arange(numberOfPoints)/numberOfPoints
+
+        for firstCurve in range(0, len(times), curvesPerChunk):
+            lastCurve = min(firstCurve + curvesPerChunk, len(times))
+            t = times[firstCurve:lastCurve, None]*fractions
+            instrumentation.count("samples", t.size)
+
+            curveCoeffs = coeffs[:, firstCurve:lastCurve, None, :]
+            values = curveCoeffs[..., 3]*t
+            for power in (2, 1):
+                values += curveCoeffs[..., power]
+                values *= t
+            values += curveCoeffs[..., 0]
+            t += startTimes[firstCurve:lastCurve, None]
+            yield values.reshape(len(coeffs), -1).T, t.ravel()
+
+        instrumentation.count("samples")
+        T = times[-1]
+        end = ((coeffs[:, -1, 3]*T + coeffs[:, -1, 2])*T + coeffs[:, -1, 1])*T + coeffs[:, -1, 0]
+        yield end[None, :], np.array([startTimes[-1] + T])
+
+    def curvesValuesChunks(self, allCoeffs:tuple[tuple[tuple[float]]], times:tuple[float], rate:float, chunkSize:int = 65536):
+        """
+        Yields the joint values sampled at a fixed rate (sample k at time k/rate, up to the end of the last curve),
+        one chunk of samples at a time, so that trajectories of any length can be sampled in bounded memory.
+
+        Parameters
+        ----------
+        allCoeffs:tuple[tuple[tuple[float]]]
+            curves coefficients to create values in time of joint values
+        times:tuple[float]
+            duration of each curve
+        rate:float
+            samples per second
+        chunkSize:int = 65536
+            maximum number of samples per chunk
+
+        Yields
+        ------
+        values : numpy.ndarray (chunkSize x dof)
+            Values of each joint at each sample of the chunk (the last chunk may be shorter).
+        """
+
+        coeffs = np.asarray(allCoeffs, dtype=float)
+        times = np.asarray(times, dtype=float)
+        endTimes = np.cumsum(times)
+        startTimes = endTimes - times
+        numberOfSamples = int(np.floor(endTimes[-1]*rate + 1e-9)) + 1
+
+        for first in range(0, numberOfSamples, chunkSize):
+            t = np.arange(first, min(first + chunkSize, numberOfSamples))/rate
+            instrumentation.count("samples", len(t))
+            curveIndexes = np.minimum(np.searchsorted(endTimes, t, side="right"), len(times) - 1)
+            t = t - startTimes[curveIndexes]
+            curveCoeffs = coeffs[:, curveIndexes]
+            yield (((curveCoeffs[..., 3]*t + curveCoeffs[..., 2])*t + curveCoeffs[..., 1])*t + curveCoeffs[..., 0]).T
+
+    def exportTrajectory(self, allCoeffs:tuple[tuple[tuple[float]]], times:tuple[float], fileName:str, rate:float = 1000, dtype = np.float64):
+        """
+        Writes the joint values sampled at a fixed rate to a trajectory file, streaming them chunk by chunk
+        (see trajectoryFile for the format and TrajectoryFile to read it back).
+
+        Parameters
+        ----------
+        allCoeffs:tuple[tuple[tuple[float]]]
+            curves coefficients to create values in time of joint values
+        times:tuple[float]
+            duration of each curve
+        fileName:str
+            file to write
+        rate:float = 1000
+            samples per second
+        dtype = numpy.float64
+            numpy.float64 or numpy.float32
+
+        Returns
+        -------
+        numberOfSamples : int
+            Number of samples written.
+        """
+
+        import trajectoryFile
+        return trajectoryFile.writeTrajectory(fileName, self._manip, rate, self.curvesValuesChunks(allCoeffs, times, rate), dtype)
+
+    def curvesRates(self, allCoeffs:tuple[tuple[tuple[float]]], times:tuple[float]):
+        """
+        Calculates joint values, velocities and accelerations in time for given polynomial coefficients and curve durations.
+        Uses the same time vector as curvesValues, but evaluates every curve of every joint at once.
+
+        Parameters
+        ----------
+        allCoeffs:tuple[tuple[tuple[float]]]
+            curves coefficients to create values in time of joint values
+        times:tuple[float]
+            duration of each curve
+
+        Returns
+        -------
+        values : numpy.ndarray (N x dof)
+            Joint values in time.
+        velocities : numpy.ndarray (N x dof)
+            Joint velocities in time.
+        accelerations : numpy.ndarray (N x dof)
+            Joint accelerations in time.
+        timeVector : numpy.ndarray (N)
+            Times of each sample.
+        """
+
+        coeffs = np.asarray(allCoeffs, dtype=float)
+        timeVector, curveIndexes, t = self._samplingGrid(times)
+        instrumentation.count("samples", len(timeVector))
+        c0, c1, c2, c3 = (coeffs[:, curveIndexes, power].T for power in range(4))
+        t = t[:, None]
+
+        values = ((c3*t + c2)*t + c1)*t + c0
+        velocities = (3*c3*t + 2*c2)*t + c1
+        accelerations = 6*c3*t + 2*c2
+
+        return values, velocities, accelerations, timeVector
+
+    def cartesianCurvesValues(self, allCoeffs:tuple[tuple[tuple[float]]], times:tuple[float]):
+        """
+        Calculates the end-effector's cartesian velocity and acceleration in time for given polynomial coefficients and curve durations.
+        Uses the manipulator's jacobian (v = J @ qd and a = J @ qdd + Jdot @ qd), so the manipulator must implement jacobian and jacobianDot.
+
+        Parameters
+        ----------
+        allCoeffs:tuple[tuple[tuple[float]]]
+            curves coefficients to create values in time of joint values
+        times:tuple[float]
+            duration of each curve
+
+        Returns
+        -------
+        velocities : numpy.ndarray (N x 3)
+            End-effector's cartesian velocity in time.
+        accelerations : numpy.ndarray (N x 3)
+            End-effector's cartesian acceleration in time.
+        timeVector : numpy.ndarray (N)
+            Times of each sample.
+        """
+
+        q, qd, qdd, timeVector = self.curvesRates(allCoeffs, times)
+        J = self._manip.jacobian(q)
+        Jdot = self._manip.jacobianDot(q, qd)
+
+        velocities = np.einsum("nij,nj->ni", J, qd)
+        accelerations = np.einsum("nij,nj->ni", J, qdd) + np.einsum("nij,nj->ni", Jdot, qd)
+
+        return velocities, accelerations, timeVector
+
+    def drawJointCurves(self, values:tuple[tuple[float]], timeVector:tuple[float], fileName:str = None):
         """
         Plots the curves of joint values x time for given values in time.
         
@@ -127,33 +392,19 @@ class TrajectoryPlanner:
             values of each joint values
         timeVector:tuple[float]
             times of each joint values
+        fileName:str = None
+            file to save the figure to (non-interactive); if not given, the figure is shown on screen
         
         Returns
         -------
         None
         """
-        
-        fig, axs = plt.subplots(2, 2)
-
-        for jointIndex in range(len(values)):
-            jointValues = None
-            ylabel = ""
-            if self._manip.jointTypes[jointIndex]:
-                jointValues = np.rad2deg(values[jointIndex])
-                ylabel = "Angle (º)"
-            else:
-                jointValues = np.array(values[jointIndex])
-                ylabel = "Length (m)"
 
-            axs[jointIndex//2, jointIndex%2].plot(timeVector, jointValues)
-            axs[jointIndex//2, jointIndex%2].set_title("Joint" + str(jointIndex+1))
-            axs[jointIndex//2, jointIndex%2].set(xlabel = "Time (s)", ylabel = ylabel)
-            axs[jointIndex//2, jointIndex%2].grid()
+        # Imported here so that planning alone never loads matplotlib
+        import trajectoryPlot
+        trajectoryPlot.drawJointCurves(self._manip, values, timeVector, fileName)
 
-        plt.tight_layout()
-        plt.show()
-
-    def drawTrajectory(self, values:tuple[tuple[float]], timeVector:tuple[float], pointsToMark:tuple[Point] = None):
+    def drawTrajectory(self, values:tuple[tuple[float]], timeVector:tuple[float], pointsToMark:tuple[Point] = None, fileName:str = None):
         """
         Plots the trajectory of end-effector in 3D based on the joint values in time. Also highlights the start and end points of the trajectory. 
         If the argument pointsToMark is given, then highlights the points in pointsToMark.
@@ -166,59 +417,237 @@ class TrajectoryPlanner:
             times of each joint values
         pointsToMark:tuple[Point] = None
             points to highlight, if no point is given, highlights the first and last point of trajectory
+        fileName:str = None
+            file to save the figure to (non-interactive); if not given, the figure is shown on screen
 
         Returns
         -------
         None 
         """
 
-        formattedValues = []
-        for timeIndex in range(len(timeVector)):
-            formattedValues.append(self._manip.Joints(*[values[jointIndex][timeIndex] for jointIndex in range(self._manip.dof)]))
-        
-        pathPoints = self._manip.fkine(tuple(formattedValues))
-
-        fig = plt.figure
-        axs = plt.axes(projection="3d")
-        axs.plot3D([point.x for point in pathPoints], [point.y for point in pathPoints], [point.z for point in pathPoints])
-        if pointsToMark == None:
-            pointsToMark = (pathPoints[0], pathPoints[-1])
-        for point in pointsToMark:
-            axs.scatter(point.x, point.y, point.z, color="red")
-            axs.text(point.x, point.y, point.z, str(point), color="red")
-        axs.set_title("Trajectory")
-        axs.set(xlabel = "x (m)", ylabel = "y (m)", zlabel = "z (m)")
-        plt.tight_layout
-        plt.show()
+        import trajectoryPlot
+        trajectoryPlot.drawTrajectory(self._manip, values, timeVector, pointsToMark, fileName)
+
+    def animateManipulator(self, values:tuple[tuple[float]], timeVector:tuple[float], fps:float = 30, fileName:str = None):
+        """
+        Animates the whole manipulator following the joint values in time, in real time.
+        The manipulator must implement framePositions.
+
+        Parameters
+        ----------
+        values:tuple[tuple[float]]
+            values of each joint values
+        timeVector:tuple[float]
+            times of each joint values
+        fps:float = 30
+            frames per second of the animation
+        fileName:str = None
+            file to render the animation to (.gif, video such as .mp4, or image sequence such as "arm_%04d.png");
+            if not given, the animation is shown on screen
+
+        Returns
+        -------
+        report : AnimationReport
+            Number of frames rendered and achieved frames per second.
+        """
+
+        import trajectoryAnimation
+        return trajectoryAnimation.animateManipulator(self._manip, values, timeVector, fps, fileName)
+
+    def _samplingGrid(self, times):
+        numberOfPoints = TrajectoryPlanner._numberOfPointsPerStepForCurveDrawing
+        times = np.asarray(times, dtype=float)
+        startTimes = np.concatenate(([0], np.cumsum(times)[:-1]))
+
+        curveIndexes = np.append(np.repeat(np.arange(len(times)), numberOfPoints), len(times) - 1)
+        fractions = np.append(np.tile(np.arange(numberOfPoints)/numberOfPoints, len(times)), 1)
+        t = fractions*times[curveIndexes]
+
+        return startTimes[curveIndexes] + t, curveIndexes, t
+
+    def _planTrajectoryWithinBudget(self, pathPoints):
+        numberOfPoints = TrajectoryPlanner._numberOfPointsPerStepForCurveDrawing
+        estimate = estimatePlanMemory(len(pathPoints), self._manip.dof, numberOfPoints)
+
+        # The dense system grows with the square of the number of curves: above the budget, the banded one is used
+        fixed = estimate["ikine"] + estimate["coeffs"]
+        solver = "dense" if fixed + estimate["denseSolve"] <= self._memoryBudget else "banded"
+
+        # curvesValues needs its lists in what the plan leaves of the budget, or the samples must be streamed
+        numberOfCurves = len(pathPoints) - 1
+        sampleBudget = self._memoryBudget - estimate["coeffs"]
+        sampling = "full" if estimate["samples"] < sampleBudget else "chunked"
+        curvesPerChunk = self._curvesPerChunk(numberOfCurves, self._manip.dof, sampleBudget)
+        self._diagnostics = PlanDiagnostics(self._memoryBudget, estimate, solver, sampling, curvesPerChunk)
+
+        # The peak is only measured if nobody else is tracing: resetting their peak would spoil their measurement
+        alreadyTracing = tracemalloc.is_tracing()
+        if not alreadyTracing:
+            tracemalloc.start()
+        memoryBefore = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        try:
+            return self._planTrajectory(pathPoints, solver)
+        finally:
+            peakBytes = None if alreadyTracing else tracemalloc.get_traced_memory()[1] - memoryBefore
+            self._diagnostics.recordUsage(peakBytes, time.perf_counter() - start)
+            if not alreadyTracing:
+                tracemalloc.stop()
+
+    def _span(self, name, **fields):
+        return instrumentation.span(name, **fields)
+
+    def _count(self, name, amount=1):
+        instrumentation.count(name, amount)
 
     def _calculateJointValuesOnPathPoints(self, pathPoints):
-        pathJointVals = self._manip.ikine(pathPoints)
+        instrumentation.count("ikCalls")
+        instrumentation.count("ikPoints", len(pathPoints))
+        with instrumentation.span("ikine", points=len(pathPoints)):
+            pathJointVals = self._manip.ikinePath(pathPoints)
         formattedPathJointVals = [None] * self._manip.dof
         for jointIndex in range(self._manip.dof):
             formattedPathJointVals[jointIndex] = [jointVals[jointIndex] for jointVals in pathJointVals]
 
         return formattedPathJointVals
 
-    def _estimateTrajectoryStepsDuration(self, pathPoints):
-        times = [0] * (len(pathPoints) - 1)
-        for pointIndex in range(len(pathPoints) - 1):
-            distance = (pathPoints[pointIndex + 1] - pathPoints[pointIndex]).dist()
-            times[pointIndex] = max((distance/self._manip.speed, 0.1))
-
-        return times
-
-    def _polynomialCurvesThroughJointValues(self, values, times):
-        numberOfCurves = len(values) - 1
-        
-        A, b = self._linearSystem(numberOfCurves, values, times)
-        x = np.linalg.solve(A, b)
-        coeffs = np.reshape(x, (numberOfCurves, 4))
-
-        return coeffs
+    def _estimateTrajectoryStepsDuration(self, pathPoints, formattedPathJointVals=None, solver="dense"):
+        if formattedPathJointVals is not None and self._manip.jointVelLims is not None:
+            return self._timeOptimalStepsDuration(formattedPathJointVals, solver)
+
+        return super()._estimateTrajectoryStepsDuration(pathPoints)
+
+    def _timeOptimalStepsDuration(self, formattedPathJointVals, solver="dense"):
+        values = np.array(formattedPathJointVals, dtype=float)
+        velLims = np.array(self._manip.jointVelLims, dtype=float)[:, None]
+        accLims = np.full_like(velLims, np.inf) if self._manip.jointAccLims is None else np.array(self._manip.jointAccLims, dtype=float)[:, None]
+
+        # No curve can be shorter than the time its slowest joint needs at full speed, so start from that lower bound
+        # and only stretch the curves whose peak rates violate a limit, until the whole spline is feasible
+        times = np.max(np.abs(np.diff(values, axis=1))/velLims, axis=0)
+        times = np.maximum(times, TrajectoryPlanner._minimumStepDuration)
+
+        # Each pass stretches only the curves that violate a limit. A curve whose violation is within the tolerance
+        # is stretched by the tolerance instead of its tiny ratio, so that the last violations, moved a little by the
+        # neighbours' changes, do not take a pass each; a feasible curve is never stretched
+        for _ in range(TrajectoryPlanner._maxTimeScalingIterations):
+            scale = self._stepsLimitsViolation(values, times, velLims, accLims, solver)
+            active = scale > 1
+            if not active.any():
+                return times.tolist()
+            times[active] *= np.maximum(scale[active], 1 + TrajectoryPlanner._timeScalingTolerance)
+
+        # Not settled (not seen in practice): stretching every curve by the same factor s divides all velocities by s
+        # and all accelerations by s², so this makes the limits hold, with the ratio rounded up past rounding errors
+        scale = self._stepsLimitsViolation(values, times, velLims, accLims, solver)
+        instrumentation.count("timeScalingFallbacks")
+        times *= max(scale.max()*(1 + TrajectoryPlanner._timeScalingMargin), 1)
+        return times.tolist()
+
+    def _stepsLimitsViolation(self, values, times, velLims, accLims, solver="dense"):
+        # Every pass has new durations, which would only count solves and evict the kept factorizations
+        coeffs = self._polynomialCurvesThroughJointValues(values, times, solver, cache=False)
+        peakVel, peakAcc = self._stepsPeakRates(coeffs, times)
+        return np.max(np.maximum(peakVel/velLims, np.sqrt(peakAcc/accLims)), axis=0)
+
+    def _stepsPeakRates(self, coeffs, times):
+        c1, c2, c3 = coeffs[..., 1], coeffs[..., 2], coeffs[..., 3]
+        T = np.asarray(times, dtype=float)
+
+        # Velocity is a parabola in each curve: its peak is at an end or at the vertex, if the vertex lies inside the curve
+        with np.errstate(divide="ignore", invalid="ignore"):
+            tVertex = np.where(c3 != 0, -c2/(3*c3), 0)
+        tVertex = np.clip(tVertex, 0, T)
+        peakVel = np.maximum.reduce([np.abs(c1),
+                                     np.abs(c1 + 2*c2*T + 3*c3*T**2),
+                                     np.abs(c1 + 2*c2*tVertex + 3*c3*tVertex**2)])
+
+        # Acceleration is linear in each curve, so its peak is always at one of the ends
+        peakAcc = np.maximum(np.abs(2*c2), np.abs(2*c2 + 6*c3*T))
+
+        return peakVel, peakAcc
+
+    def _polynomialCurvesThroughJointValues(self, values, times, solver="dense", cache=True):
+        # Values of one joint (N) or of several joints (dof x N): the joints share the matrix, so they are solved together
+        values = np.asarray(values, dtype=float)
+        if solver == "banded":
+            return self._bandedCurvesThroughJointValues(values, times)
+
+        numberOfCurves = values.shape[-1] - 1
+        numberOfJoints = values.shape[0] if values.ndim == 2 else 1
+        instrumentation.count("systemsSolved", numberOfJoints)
+        instrumentation.count("systemUnknowns", 4*numberOfCurves*numberOfJoints)
+        b = self._linearSystemVector(numberOfCurves, values.T)
+        factorization = self._cachedFactorization(numberOfCurves, times) if cache else None
+        if factorization is not None:
+            with instrumentation.span("backSubstitution", size=4*numberOfCurves):
+                x = lu_solve(factorization, b, check_finite=False)
+        else:
+            with instrumentation.span("linearSystem", size=4*numberOfCurves):
+                A = self._linearSystemMatrix(numberOfCurves, times)
+            with instrumentation.span("solve", size=4*numberOfCurves):
+                x = np.linalg.solve(A, b)
+
+        return np.reshape(x.T, values.shape[:-1] + (numberOfCurves, 4))
+
+    def _cachedFactorization(self, numberOfCurves, times):
+        # The matrix depends only on the durations, and routes often repeat them (equal segments of the linear planner,
+        # the same waypoint spacing, the same route planned again). Its LU factorization is kept for those durations, so
+        # that solving again only costs the two triangular solves, O(n^2) instead of O(n^3). A timing pattern is only
+        # factorized once it has already been solved _solvesBeforeFactorizing times; the solves are counted apart, so
+        # that patterns seen once do not evict factorizations. Durations are compared quantised (differences below
+        # 1e-12 s only change the coefficients by rounding errors). Needs scipy (numpy has no factorization that can be
+        # kept), and is not used with a memory budget, which does not account for the factorizations.
+        if lu_factor is None or self._memoryBudget is not None:
+            return None
+        factorizationBytes = 8*(4*numberOfCurves)**2 + 4*(4*numberOfCurves)
+        if factorizationBytes > TrajectoryPlanner._factorizationCacheBytes:
+            return None
+
+        key = np.round(np.asarray(times, dtype=float)/TrajectoryPlanner._factorizationTimeQuantum).astype(np.int64).tobytes()
+        factorization = self._factorizations.get(key)
+        if factorization is not None:
+            self._factorizations.move_to_end(key)
+            instrumentation.count("factorizationHits")
+            return factorization
+
+        instrumentation.count("factorizationMisses")
+        solves = self._solveCounts.pop(key, 0) + 1
+        if solves <= TrajectoryPlanner._solvesBeforeFactorizing:
+            self._solveCounts[key] = solves
+            if len(self._solveCounts) > TrajectoryPlanner._solveCountsSize:
+                self._solveCounts.popitem(last=False)
+            return None
+
+        with instrumentation.span("factorize", size=4*numberOfCurves):
+            factorization = lu_factor(self._linearSystemMatrix(numberOfCurves, times), check_finite=False)
+        self._factorizations[key] = factorization
+        self._factorizationBytes += factorizationBytes
+        while (len(self._factorizations) > TrajectoryPlanner._factorizationCacheSize
+               or self._factorizationBytes > TrajectoryPlanner._factorizationCacheBytes):
+            _, (lu, pivots) = self._factorizations.popitem(last=False)
+            self._factorizationBytes -= lu.nbytes + pivots.nbytes
+        return factorization
+
+    def _bandedCurvesThroughJointValues(self, values, times):
+        # Same curves as the dense system, from the tridiagonal system of the velocities at the points, solved in O(n)
+        # time and memory by backend.py (shared with the embedded planner)
+        values = np.asarray(values, dtype=float)
+        jointValues = values.reshape(-1, values.shape[-1])
+        numberOfCurves = len(times)
+        instrumentation.count("systemsSolved", len(jointValues))
+        instrumentation.count("systemUnknowns", (numberOfCurves - 1)*len(jointValues))
+
+        with instrumentation.span("solve", size=numberOfCurves - 1, banded=True):
+            coeffs = backend.splineCoefficients(jointValues, times)
+
+        return np.reshape(coeffs, values.shape[:-1] + (numberOfCurves, 4))
 
     def _linearSystem(self, numberOfCurves, values, times):
+        return self._linearSystemMatrix(numberOfCurves, times), self._linearSystemVector(numberOfCurves, values)
+
+    def _linearSystemMatrix(self, numberOfCurves, times):
         A = np.zeros((4*numberOfCurves, 4*numberOfCurves))
-        b = np.zeros(4*numberOfCurves)
 
         for index in range (0, numberOfCurves):
             A[4*index + 1, 4*index] = 1
@@ -229,8 +658,6 @@ class TrajectoryPlanner:
             A[4*index + 3, 4*index + 1] = 1
             A[4*index + 3, 4*index + 2] = 2*times[index]
             A[4*index + 3, 4*index + 3] = 3*times[index]**2
-            b[4*index + 1] = values[index]
-            b[4*index + 2] = values[index+1]
 
         for index in range (0, numberOfCurves-1):
             A[4*index + 3, 4*index + 5] = -1
@@ -240,4 +667,13 @@ class TrajectoryPlanner:
 
         A[0, 1] = 1
 
-        return A, b
\ No newline at end of file
+        return A
+
+    def _linearSystemVector(self, numberOfCurves, values):
+        # Values of the points (N), or of the points of several joints (N x joints) to solve them together
+        values = np.asarray(values, dtype=float)
+        b = np.zeros((4*numberOfCurves,) + values.shape[1:])
+        b[1::4] = values[:-1]
+        b[2::4] = values[1:]
+
+        return b
@@ -0,0 +1,207 @@
+"""
+TrajectoryPlot
+--------------
+
+Visualisation of planned trajectories, kept apart from the planners so that only processes that draw pay for matplotlib.
+TrajectoryPlanner imports this module the first time one of its drawing methods is called.
+
+Figures are shown on screen, or, when a file name is given, rendered by the non-interactive Agg canvas straight to
+the file (no window, no display and no pyplot needed, so it also works on headless machines).
+
+Long trajectories are decimated before plotting, so the number of plotted vertices stays capped however many samples
+there are: joint curves keep the minimum and maximum of each group of samples (so peaks are never lost) and the 3D path
+is simplified within a tolerance far below what a figure can show.
+"""
+
+import heapq
+from math import ceil
+import numpy as np
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from point import Point
+
+maxJointCurvePoints = 4000
+maxTrajectoryPoints = 5000
+trajectoryTolerance = 1e-4 ### Fraction of the size of the trajectory
+
+def drawJointCurves(manip, values, timeVector, fileName=None):
+    """
+    Plots the curves of joint values x time for given values in time.
+
+    Parameters
+    ----------
+    manip : Manipulator
+        manipulator whose joint values are plotted
+    values : tuple[tuple[float]]
+        values of each joint values
+    timeVector : tuple[float]
+        times of each joint values
+    fileName : string = None
+        file to save the figure to (format from the extension); if not given, the figure is shown on screen
+
+    Returns
+    -------
+    None
+    """
+
+    fig = _newFigure(fileName)
+    numberOfRows = ceil(len(values)/2)
+    timeVector = np.asarray(timeVector, dtype=float)
+
+    for jointIndex in range(len(values)):
+        if manip.jointTypes[jointIndex]:
+            jointValues = np.rad2deg(values[jointIndex])
+            ylabel = "Angle (º)"
+        else:
+            jointValues = np.asarray(values[jointIndex], dtype=float)
+            ylabel = "Length (m)"
+
+        kept = minMaxDecimation(jointValues, maxJointCurvePoints)
+        axs = fig.add_subplot(numberOfRows, 2, jointIndex + 1)
+        axs.plot(timeVector[kept], jointValues[kept])
+        axs.set_title("Joint" + str(jointIndex+1))
+        axs.set(xlabel = "Time (s)", ylabel = ylabel)
+        axs.grid()
+
+    fig.tight_layout()
+    _showFigure(fig, fileName)
+
+def drawTrajectory(manip, values, timeVector, pointsToMark=None, fileName=None):
+    """
+    Plots the trajectory of end-effector in 3D based on the joint values in time. Also highlights the start and end points of the trajectory.
+    If the argument pointsToMark is given, then highlights the points in pointsToMark.
+
+    Parameters
+    ----------
+    manip : Manipulator
+        manipulator whose end-effector trajectory is plotted
+    values : tuple[tuple[float]]
+        values of each joint values
+    timeVector : tuple[float]
+        times of each joint values
+    pointsToMark : tuple[Point] = None
+        points to highlight, if no point is given, highlights the first and last point of trajectory
+    fileName : string = None
+        file to save the figure to (format from the extension); if not given, the figure is shown on screen
+
+    Returns
+    -------
+    None
+    """
+
+    positions = np.asarray(manip.fkineBatch(np.transpose(values)), dtype=float)
+    diagonal = np.linalg.norm(positions.max(axis=0) - positions.min(axis=0))
+    kept = polylineSimplification(positions, trajectoryTolerance*diagonal, maxTrajectoryPoints)
+
+    fig = _newFigure(fileName)
+    axs = fig.add_subplot(projection="3d")
+    axs.plot3D(*positions[kept].T)
+    if pointsToMark == None:
+        pointsToMark = (Point(*positions[0]), Point(*positions[-1]))
+    for point in pointsToMark:
+        axs.scatter(point.x, point.y, point.z, color="red")
+        axs.text(point.x, point.y, point.z, str(point), color="red")
+    axs.set_title("Trajectory")
+    axs.set(xlabel = "x (m)", ylabel = "y (m)", zlabel = "z (m)")
+    fig.tight_layout()
+    _showFigure(fig, fileName)
+
+def minMaxDecimation(values, maxPoints):
+    """
+    Chooses at most maxPoints samples of a curve that keep its shape: the samples are split in groups and
+    the minimum and maximum of each group are kept (plus the first and last samples).
+
+    Parameters
+    ----------
+    values : numpy.ndarray (N)
+        values of the curve
+    maxPoints : int
+        maximum number of samples to keep
+
+    Returns
+    -------
+    indexes : numpy.ndarray
+        Sorted indexes of the samples to keep.
+    """
+
+    numberOfValues = len(values)
+    if numberOfValues <= maxPoints:
+        return np.arange(numberOfValues)
+
+    numberOfGroups = max(1, (maxPoints - 2)//2)
+    groupSize = ceil((numberOfValues - 2)/numberOfGroups)
+    inner = values[1:-1]
+    padded = np.pad(inner, (0, numberOfGroups*groupSize - len(inner)), mode="edge").reshape(numberOfGroups, groupSize)
+
+    groupStarts = 1 + np.arange(numberOfGroups)*groupSize
+    indexes = np.concatenate(([0, numberOfValues - 1], groupStarts + np.argmin(padded, axis=1), groupStarts + np.argmax(padded, axis=1)))
+    return np.unique(np.minimum(indexes, numberOfValues - 1))
+
+def polylineSimplification(points, tolerance, maxPoints):
+    """
+    Chooses at most maxPoints vertices of a polyline that keep every removed vertex within tolerance of the simplified
+    polyline (Ramer-Douglas-Peucker, always splitting at the farthest vertex first, so that the cap removes the least
+    visible detail if it is reached before the tolerance).
+
+    Parameters
+    ----------
+    points : numpy.ndarray (N x 3)
+        vertices of the polyline
+    tolerance : float
+        maximum distance of a removed vertex to the simplified polyline
+    maxPoints : int
+        maximum number of vertices to keep
+
+    Returns
+    -------
+    indexes : numpy.ndarray
+        Sorted indexes of the vertices to keep.
+    """
+
+    numberOfPoints = len(points)
+    if numberOfPoints <= 2:
+        return np.arange(numberOfPoints)
+
+    kept = [0, numberOfPoints - 1]
+    candidates = []
+    _pushFarthestVertex(candidates, points, 0, numberOfPoints - 1)
+    while candidates and len(kept) < maxPoints:
+        negativeDistance, start, end, farthest = heapq.heappop(candidates)
+        if -negativeDistance <= tolerance:
+            break
+        kept.append(farthest)
+        _pushFarthestVertex(candidates, points, start, farthest)
+        _pushFarthestVertex(candidates, points, farthest, end)
+
+    return np.sort(kept)
+
+def _pushFarthestVertex(candidates, points, start, end):
+    if end - start < 2:
+        return
+
+    # Distance of each inner vertex to the segment between the start and end vertices
+    segment = points[end] - points[start]
+    relative = points[start+1:end] - points[start]
+    squaredLength = segment @ segment
+    fraction = np.clip(relative @ segment/squaredLength, 0, 1) if squaredLength > 0 else np.zeros(len(relative))
+    distances = np.linalg.norm(relative - fraction[:, None]*segment, axis=1)
+
+    farthest = int(np.argmax(distances))
+    heapq.heappush(candidates, (-distances[farthest], start, end, start + 1 + farthest))
+
+def _newFigure(fileName):
+    if fileName is not None:
+        fig = Figure()
+        FigureCanvasAgg(fig)
+        return fig
+
+    import matplotlib.pyplot as plt
+    return plt.figure()
+
+def _showFigure(fig, fileName):
+    if fileName is not None:
+        fig.savefig(fileName)
+        return
+
+    import matplotlib.pyplot as plt
+    plt.show()